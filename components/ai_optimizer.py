@@ -2,10 +2,19 @@
 AI Route Optimizer using Google Gemini
 """
 
-import google.generativeai as genai
-import json
 import os
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Callable
+from components.route_solver import RouteSolver, UNASSIGNED_REASONS
+from components.route_simulator import RouteSimulator
+from components.coverage_index import CoverageIndex
+from components.order_clustering import OrderClusterer, DEFAULT_MAX_ORDERS_PER_CLUSTER
+from components.prompt_compiler import PromptCompiler, estimate_tokens
+from components.model_client import ModelClient
+from utils.json_extract import parse_partial_json, stream_handler
+
+# Follow-up requests for the orders a cut-off response never reached
+MAX_RESUME_REQUESTS = 1
 
 class AIOptimizer:
     
@@ -15,88 +24,309 @@ class AIOptimizer:
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment")
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.client = ModelClient()
+        self.last_prompt_tokens = 0
+    
+    @staticmethod
+    def relevant_drivers(orders: List[Dict], drivers: List[Dict]) -> List[Dict]:
+        """Drivers covering at least one order (all drivers if none do)"""
+        relevant = CoverageIndex.for_drivers(drivers).drivers_for_orders(orders)
+        return relevant or list(drivers)
+    
+    @staticmethod
+    def estimate_prompt_tokens(orders: List[Dict], drivers: List[Dict]) -> int:
+        """Estimated input tokens of the optimization prompt (before sending)"""
+        compiled = PromptCompiler.compile_optimization(orders, AIOptimizer.relevant_drivers(orders, drivers))
+        return estimate_tokens(AIOptimizer._build_prompt(compiled))
     
-    def optimize_routes(self, orders: List[Dict], drivers: List[Dict]) -> Dict:
+    def optimize_routes(self, orders: List[Dict], drivers: List[Dict],
+                        on_route: Optional[Callable[[str, Dict], None]] = None) -> Dict:
         """
         Optimize routes using AI
         
         Args:
             orders: List of order dicts
             drivers: List of available driver dicts
+            on_route: Stream the response and call this with (driver name, route) as
+                      each route arrives, before the whole result is ready
         
         Returns:
             Dict with optimized routes per driver
         """
+        self.last_prompt_tokens = 0
+        return self._optimize(orders, drivers, MAX_RESUME_REQUESTS, on_route)
+    
+    def _optimize(self, orders: List[Dict], drivers: List[Dict], resumes_left: int,
+                  on_route: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+        """One optimization request (see optimize_routes)"""
         
-        prompt = self._build_prompt(orders, drivers)
+        # Drivers who cannot serve any of these orders only cost tokens
+        drivers = self.relevant_drivers(orders, drivers)
+        compiled = PromptCompiler.compile_optimization(orders, drivers)
+        prompt = self._build_prompt(compiled)
+        self.last_prompt_tokens += estimate_tokens(prompt)
         
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text
-            
-            # Clean JSON markers
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0]
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0]
-            
-            result_text = result_text.strip()
-            # Handle potential double encoding or plain string response
+            feature = 'optimize' if resumes_left == MAX_RESUME_REQUESTS else 'optimize_resume'
+            result_text = self._generate(prompt, compiled, feature, on_route)
+            return self._complete_result(result_text, compiled, drivers, resumes_left)
+        except Exception as e:
+            raise Exception(f"AI optimization failed: {str(e)}")
+    
+    def _generate(self, prompt: str, compiled: Dict, feature: str,
+                  on_route: Optional[Callable[[str, Dict], None]] = None) -> str:
+        """Response text; streamed with routes reported as they complete when on_route is given"""
+        if on_route is None:
+            return self.client.generate(prompt, validate=parse_partial_json, feature=feature)
+        
+        def on_item(path: List, value) -> None:
+            if len(path) == 2 and path[0] == 'routes' and isinstance(value, dict):
+                expanded = PromptCompiler.expand_result({'routes': {path[1]: value}}, compiled)
+                for name, route_data in expanded['routes'].items():
+                    on_route(name, route_data)
+        
+        return self.client.generate(prompt, validate=parse_partial_json, on_chunk=stream_handler(2, on_item),
+                                    feature=feature)
+    
+    def _complete_result(self, result_text: str, compiled: Dict, drivers: List[Dict], resumes_left: int) -> Dict:
+        """
+        Parse an optimization response, salvaging one that was cut off
+        
+        Complete stops of a cut-off response are kept and only the orders it
+        never reached are requested again; routes that get resumed stops
+        appended are re-timed locally, since neither response's ETAs or
+        summary cover the merged sequence. Orders still missing after
+        resumes_left follow-up requests are returned as unassigned.
+        """
+        try:
+            result, complete = parse_partial_json(result_text)
+        except ValueError:
+            raise Exception(f"Failed to parse JSON response: {(result_text or '')[:100]}...")
+        
+        if not isinstance(result, dict):
+            raise Exception(f"AI returned {type(result)} instead of dict: {result}")
+        
+        if complete:
+            return PromptCompiler.expand_result(result, compiled)
+        
+        # Short ids the model got to before it was cut off
+        seen = set()
+        for route_data in (result.get('routes') or {}).values():
+            if isinstance(route_data, dict):
+                seen.update(str(s.get('order_id', '')).strip() for s in route_data.get('stops', []) if isinstance(s, dict))
+        seen.update(str(o.get('order_id', '')).strip() for o in result.get('unassigned_orders', []) if isinstance(o, dict))
+        missing = [order for short_id, order in compiled['order_ids'].items() if short_id not in seen]
+        
+        result = PromptCompiler.expand_result(result, compiled)
+        if not isinstance(result.get('warnings'), list):
+            result['warnings'] = []
+        if not missing:
+            return result
+        
+        if resumes_left > 0:
+            result['warnings'].append(f"AI response was cut off - {len(missing)} order(s) requested again")
             try:
-                result = json.loads(result_text)
-                if isinstance(result, str):
-                    # Try parsing again if it's a double-encoded string
-                    result = json.loads(result)
-            except json.JSONDecodeError:
-                raise Exception(f"Failed to parse JSON response: {result_text[:100]}...")
-            
-            if not isinstance(result, dict):
-                raise Exception(f"AI returned {type(result)} instead of dict: {result}")
-
+                rest = self._optimize(missing, drivers, resumes_left - 1)
+                merged = []
+                for name, route_data in rest.get('routes', {}).items():
+                    stops = [s for s in route_data.get('stops', []) if isinstance(s, dict)]
+                    if not stops:
+                        continue
+                    route = result['routes'].setdefault(name, {'stops': [], 'summary': {}})
+                    route.setdefault('stops', []).extend(stops)
+                    merged.append(name)
+                self._retime_routes(result['routes'], merged, drivers)
+                result['unassigned_orders'].extend(rest.get('unassigned_orders', []))
+                result['warnings'].extend(rest.get('warnings', []))
+                return result
+            except Exception as e:
+                result['warnings'].append(f"Follow-up request failed: {str(e)}")
+        else:
+            result['warnings'].append(f"AI response was cut off - {len(missing)} order(s) left unassigned")
+        
+        for order in missing:
+            left = dict(order)
+            left['unassigned_reason'] = "AI response was cut off before this order"
+            result['unassigned_orders'].append(left)
+        return result
+    
+    @staticmethod
+    def _retime_routes(routes: Dict, names: List[str], drivers: List[Dict]) -> None:
+        """Recompute stop numbers, ETAs and summaries of the named routes in their current order (in place)"""
+        simulator = RouteSimulator()
+        states = simulator.states_from_routes({name: routes[name] for name in names}, drivers)
+        for name in names:
+            state = states.get(name)
+            if state is None:
+                # Not one of this request's drivers - at least keep the stop numbers in sequence
+                for i, stop in enumerate(routes[name].get('stops', [])):
+                    if isinstance(stop, dict):
+                        stop['stop_number'] = i + 1
+                continue
+            routes[name] = dict(routes[name], **simulator.render_route(state))
+    
+    def optimize_routes_clustered(self, orders: List[Dict], drivers: List[Dict],
+                                  max_orders_per_cluster: int = DEFAULT_MAX_ORDERS_PER_CLUSTER,
+                                  max_workers: int = 4,
+                                  on_progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Optimize a large day as independent geographic clusters in parallel
+        
+        Orders are split into clusters that each own a subset of the drivers,
+        every cluster gets its own (smaller) Gemini call on a thread pool, and
+        the results are merged. Orders left unassigned by one cluster are then
+        offered to every other driver's route locally.
+        
+        Args:
+            orders: List of order dicts
+            drivers: List of available driver dicts
+            max_orders_per_cluster: Target size of each Gemini call
+            max_workers: Concurrent Gemini calls
+            on_progress: Called with (clusters_done, clusters_total); may raise to abort
+        
+        Returns:
+            Dict with optimized routes per driver (same shape as optimize_routes)
+        """
+        clusters = OrderClusterer(max_orders_per_cluster).cluster(orders, drivers)
+        if len(clusters) == 1:
+            return self.optimize_routes(orders, drivers)
+        
+        merged = {'routes': {}, 'unassigned_orders': [], 'warnings': []}
+        done = 0
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(self.optimize_routes, c['orders'], c['drivers']): c
+                for c in clusters
+            }
+            try:
+                for future in as_completed(futures):
+                    cluster = futures[future]
+                    try:
+                        result = future.result()
+                        merged['routes'].update(result.get('routes', {}))
+                        merged['unassigned_orders'].extend(result.get('unassigned_orders', []))
+                        merged['warnings'].extend(result.get('warnings', []))
+                    except Exception as e:
+                        names = ', '.join(d.get('driver_name', '') for d in cluster['drivers'])
+                        merged['warnings'].append(f"Cluster for {names} failed: {str(e)}")
+                        for order in cluster['orders']:
+                            failed = dict(order)
+                            failed['unassigned_reason'] = f"Optimization failed for this area: {str(e)}"
+                            merged['unassigned_orders'].append(failed)
+                    
+                    done += 1
+                    if on_progress:
+                        on_progress(done, len(clusters))
+            except BaseException:
+                # Caller aborted (e.g. job cancelled from on_progress) - skip clusters not started yet
+                for future in futures:
+                    future.cancel()
+                raise
+        
+        # Cross-cluster rebalancing: any driver may take leftovers
+        return RouteSolver().rebalance(merged, drivers)
+    
+    def optimize_routes_hybrid(self, orders: List[Dict], drivers: List[Dict], explain: bool = True) -> Dict:
+        """
+        Optimize routes with the local solver, using AI only for explanations
+        
+        The deterministic RouteSolver assigns and sequences every order. Gemini
+        is only sent a compact summary of the problem orders to write
+        dispatcher-friendly unassigned reasons and warnings.
+        
+        Args:
+            orders: List of order dicts
+            drivers: List of available driver dicts
+            explain: Ask Gemini to explain unassigned orders (False = local reasons only)
+        
+        Returns:
+            Dict with optimized routes per driver (same shape as optimize_routes)
+        """
+        result = RouteSolver().solve(orders, drivers)
+        
+        if not explain or not result['unassigned_orders']:
             return result
+        
+        prompt = self._build_explain_prompt(result, drivers)
+        
+        try:
+            explanation, _ = parse_partial_json(self.client.generate(prompt, validate=parse_partial_json, feature='explain'))
+            
+            reasons = explanation.get('reasons', {}) if isinstance(explanation, dict) else {}
+            for order in result['unassigned_orders']:
+                reason = reasons.get(str(order['order_id']))
+                if reason:
+                    order['unassigned_reason'] = reason
+            
+            result['warnings'].extend(explanation.get('warnings', []) if isinstance(explanation, dict) else [])
             
         except Exception as e:
-            # Fallback for Model Name Errors
-            if "404" in str(e) or "not found" in str(e).lower():
-                try:
-                    import streamlit as st
-                    st.warning("⚠️ Model 'gemini-2.5-flash' not found for optimization. Falling back to 'gemini-1.5-flash'...")
-                    fallback_model = genai.GenerativeModel('gemini-1.5-flash')
-                    response = fallback_model.generate_content(prompt)
-                    
-                    result_text = response.text
-                    if '```json' in result_text:
-                        result_text = result_text.split('```json')[1].split('```')[0]
-                    elif '```' in result_text:
-                        result_text = result_text.split('```')[1].split('```')[0]
-                    
-                    result_text = result_text.strip()
-                    result = json.loads(result_text)
-                    if isinstance(result, str):
-                        result = json.loads(result)
-                        
-                    if not isinstance(result, dict):
-                         raise Exception(f"Fallback AI returned {type(result)} instead of dict")
-                         
-                    return result
-                except Exception as fb_error:
-                    raise Exception(f"Fallback optimization failed: {str(fb_error)}")
-                    
-            raise Exception(f"AI optimization failed: {str(e)}")
+            # Routes are already complete - keep the local reasons
+            result['warnings'].append(f"AI explanations unavailable: {str(e)}")
+        
+        return result
     
-    def _build_prompt(self, orders: List[Dict], drivers: List[Dict]) -> str:
-        """Build optimization prompt"""
+    def _build_explain_prompt(self, result: Dict, drivers: List[Dict]) -> str:
+        """Build a compact prompt asking only for unassigned reasons and warnings"""
+        
+        driver_lines = []
+        for driver in drivers:
+            name = driver.get('driver_name', 'Unknown')
+            summary = result['routes'].get(name, {}).get('summary', {})
+            driver_lines.append(
+                f"{name} | cities: {driver.get('cities_covered', '')} | zips: {driver.get('zip_prefixes', '')} | "
+                f"start {driver.get('start_time', '')} | stops {summary.get('total_stops', 0)} | "
+                f"finish {summary.get('estimated_finish', '-')}"
+            )
+        
+        order_lines = []
+        for order in result['unassigned_orders']:
+            order_lines.append(
+                f"{order['order_id']} | {order.get('city', '')} {order.get('zip_code', '')} | "
+                f"{order.get('order_type', '')} | window {order.get('time_window') or 'any'} | code {order['reason_code']}"
+            )
+        
+        # Every code the solver can send, so the legend cannot fall behind it
+        code_lines = [f"{code} = {text}" for code, text in UNASSIGNED_REASONS.items()]
         
         return f"""
-You are a logistics expert optimizing DME delivery routes in Southern California.
+You explain DME delivery routing results to a dispatcher in Southern California.
+Routes are already built. Do NOT change them.
+
+DRIVERS (name | cities | zip prefixes | start | stops | finish):
+{chr(10).join(driver_lines)}
+
+UNASSIGNED ORDERS (id | location | type | window | solver code):
+{chr(10).join(order_lines)}
 
-AVAILABLE DRIVERS TODAY:
-{json.dumps(drivers, indent=2)}
+Solver codes:
+{chr(10).join(code_lines)}
 
-ORDERS TO ASSIGN AND ROUTE:
-{json.dumps(orders, indent=2)}
+For EVERY unassigned order write one CLEAR, SPECIFIC reason naming the locations, times or drivers involved.
+Add short warnings for anything the dispatcher should act on.
+
+Return ONLY this JSON:
+{{"reasons": {{"order id": "reason"}}, "warnings": ["warning"]}}
+"""
+    
+    @staticmethod
+    def _build_prompt(compiled: Dict) -> str:
+        """Build optimization prompt from compiled order/driver tables"""
+        
+        coverage = f"""
+COVERAGE AREAS (referenced by drivers):
+{compiled['coverage']}
+""" if compiled['coverage'] else ""
+        
+        return f"""
+You are a logistics expert optimizing DME delivery routes in Southern California.
+{coverage}
+AVAILABLE DRIVERS TODAY (start = start time, from = start location, coverage = ref above or "any"):
+{compiled['drivers']}
+
+ORDERS TO ASSIGN AND ROUTE (type D=Delivery P=Pickup E=Exchange, window = 24h HH:MM-HH:MM, empty = anytime):
+{compiled['orders']}
 
 TASKS:
 1. Assign each order to the BEST driver based on:
@@ -127,29 +357,23 @@ CONSTRAINTS:
 - Assume 30-60 min per stop (delivery/pickup/setup)
 - Use realistic Southern California drive times
 - Start times and locations per driver are specified
+- Exchanges (type E) deliver a replacement unit loaded at the start and take the old unit back
+- A delivery noted "after Ox" carries equipment picked up at Ox: same driver, after Ox
+- An order noted "usual Dx ~HH:MM" is a recurring customer: keep it with Dx near that time unless it costs much more driving
 
-RETURN THIS EXACT JSON FORMAT:
+RETURN THIS EXACT JSON FORMAT (use the short driver ids D1.. and order ids O1.. from the tables; do NOT repeat addresses or items):
 {{
   "routes": {{
-    "Driver Name": {{
+    "D1": {{
       "stops": [
         {{
           "stop_number": 1,
-          "order_id": "index or ID",
-          "address": "full address",
-          "city": "city",
-          "order_type": "Delivery/Pickup",
-          "items": "items list",
-          "time_window": "HH:MM AM/PM - HH:MM AM/PM",
+          "order_id": "O1",
           "eta": "HH:MM AM/PM",
           "drive_time_from_previous_min": 0,
           "stop_duration_min": 45,
           "time_window_ok": true,
-          "coordinates": {{
-            "lat": 34.0522,
-            "lng": -118.2437
-          }},
-          "special_notes": "notes if any"
+          "coordinates": {{"lat": 34.0522, "lng": -118.2437}}
         }}
       ],
       "summary": {{
@@ -165,13 +389,7 @@ RETURN THIS EXACT JSON FORMAT:
   }},
   "unassigned_orders": [
     {{
-      "order_id": "order ID or index",
-      "customer_name": "customer name",
-      "address": "full address",
-      "city": "city",
-      "order_type": "type",
-      "items": "items",
-      "time_window": "time window",
+      "order_id": "O7",
       "unassigned_reason": "CLEAR SPECIFIC REASON such as: 'Outside all driver coverage areas (order in San Diego, available drivers cover LA/OC only)' or 'Time window 8:00-9:00 AM conflicts with all drivers' start times' or 'All drivers at maximum capacity (8 stops each)'"
     }}
   ],
@@ -187,4 +405,4 @@ IMPORTANT:
 - Provide clear reasoning for any issues
 
 Begin optimization now.
-"""
+"""
\ No newline at end of file
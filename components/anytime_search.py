@@ -0,0 +1,232 @@
+"""
+Anytime Search - Improve a plan continuously and publish every better solution as it is found
+"""
+
+import random
+import time
+from typing import List, Dict, Optional, Callable, Tuple
+from components.route_solver import RouteSolver, UNASSIGNED_REASONS
+from components.coverage_index import CoverageIndex
+from components.capacity_checker import RouteLoad
+from components.multi_start import WORKDAY_END_MIN, PROGRESS_INTERVAL_SEC
+
+DEFAULT_TIME_BUDGET_SEC = 30
+
+# Probability of keeping a perturbed solution that is not better (escapes local optima)
+ACCEPT_WORSE_PROBABILITY = 0.05
+
+
+class AnytimeOptimizer:
+
+    def __init__(self, time_budget_sec: float = DEFAULT_TIME_BUDGET_SEC, seed: int = 0):
+        """
+        Args:
+            time_budget_sec: Search stops after this many seconds (or when stopped earlier)
+            seed: Random seed for the perturbations
+        """
+        self.time_budget_sec = max(float(time_budget_sec), 1.0)
+        self.rng = random.Random(seed)
+        self.solver = RouteSolver()
+
+    def optimize(self, orders: List[Dict], drivers: List[Dict], initial_result: Optional[Dict] = None,
+                 on_update: Optional[Callable[[Dict], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None) -> Dict:
+        """
+        Iterated local search that streams best-so-far solutions
+
+        Args:
+            orders: List of order dicts (used when there is no initial result)
+            drivers: Prepared driver dicts
+            initial_result: Plan to start from (e.g. the Gemini result); None = quick local construction
+            on_update: Called with a status dict (elapsed_sec, iterations, improved,
+                best, history, result) on every improvement and about once a second;
+                'result' is only set when the solution improved
+            should_stop: Polled between iterations; True returns the current best
+
+        Returns:
+            Best result found, with a 'search' entry describing the run
+        """
+        started = time.time()
+        deadline = started + self.time_budget_sec
+
+        if initial_result is None:
+            initial_result = self.solver.solve(orders, drivers, deadline=deadline)
+        states, unassigned = self._load(initial_result, drivers)
+
+        best_cost = self._cost(states, unassigned)
+        best = self._snapshot(states, unassigned)
+        current_cost = best_cost
+        history = [self._history_entry(0.0, 0, best_cost)]
+        iterations = 0
+        reported = 0.0
+
+        def search_info() -> Dict:
+            return {
+                'mode': 'anytime',
+                'iterations': iterations,
+                'elapsed_sec': round(time.time() - started, 2),
+                'history': list(history),
+            }
+
+        def publish(improved: bool) -> None:
+            result = None
+            if improved:
+                result = self._render(states, unassigned, best)
+                result['search'] = search_info()
+            on_update({
+                'elapsed_sec': time.time() - started,
+                'iterations': iterations,
+                'improved': improved,
+                'best': history[-1],
+                'history': list(history),
+                'result': result,
+            })
+
+        if on_update:
+            publish(True)
+
+        while time.time() < deadline and not (should_stop and should_stop()):
+            iterations += 1
+            before = self._snapshot(states, unassigned)
+
+            self._perturb(states, unassigned)
+            for state in states:
+                self.solver._improve_route(state, deadline)
+            self.solver._relocate_between_routes(states, deadline)
+
+            cost = self._cost(states, unassigned)
+            if cost < best_cost:
+                best_cost, current_cost = cost, cost
+                best = self._snapshot(states, unassigned)
+                history.append(self._history_entry(time.time() - started, iterations, cost))
+                if on_update:
+                    reported = time.time() - started
+                    publish(True)
+            elif cost < current_cost or self.rng.random() < ACCEPT_WORSE_PROBABILITY:
+                current_cost = cost
+            else:
+                self._restore(states, unassigned, before)
+
+            if on_update and time.time() - started - reported >= PROGRESS_INTERVAL_SEC:
+                reported = time.time() - started
+                publish(False)
+
+        result = self._render(states, unassigned, best)
+        result['search'] = search_info()
+        return result
+
+    # ------------------------------------------------------------------
+    # Solution state
+    # ------------------------------------------------------------------
+
+    def _load(self, result: Dict, drivers: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, str]]]:
+        """Driver states (in driver order) and unassigned (node, reason) pairs from a result"""
+        by_name = self.solver.simulator.states_from_routes(result.get('routes') or {}, drivers)
+        states = [by_name[d.get('driver_name', 'Unknown')] for d in drivers]
+        index = CoverageIndex.for_drivers(drivers)
+
+        for state in states:
+            for node in state['route']:
+                node['candidates'] = list(index.candidate_indexes(node['order']))
+
+        # Stops given to drivers that are not selected must be placed again
+        entries = list(result.get('unassigned_orders') or [])
+        for name, route_data in (result.get('routes') or {}).items():
+            if name not in by_name and isinstance(route_data, dict):
+                entries.extend(route_data.get('stops', []))
+
+        unassigned = []
+        for i, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            node = self.solver.simulator.make_node(i, entry)
+            if node['coords'] is None:
+                unassigned.append((node, 'no_location'))
+                continue
+            node['candidates'] = list(index.candidate_indexes(entry))
+            # Keep the starting solution's reason (vehicle load, precedence, ...); guess only when it has none
+            reason = entry.get('reason_code')
+            if reason not in UNASSIGNED_REASONS:
+                reason = 'time_window' if node['candidates'] else 'no_coverage'
+            unassigned.append((node, reason))
+        return states, unassigned
+
+    @staticmethod
+    def _snapshot(states: List[Dict], unassigned: List[Tuple[Dict, str]]) -> Tuple:
+        return [list(s['route']) for s in states], list(unassigned)
+
+    @staticmethod
+    def _restore(states: List[Dict], unassigned: List[Tuple[Dict, str]], snapshot: Tuple) -> None:
+        routes, saved_unassigned = snapshot
+        for state, route in zip(states, routes):
+            state['route'] = list(route)
+        unassigned[:] = saved_unassigned
+
+    def _render(self, states: List[Dict], unassigned: List[Tuple[Dict, str]], snapshot: Tuple) -> Dict:
+        """Result dict for a snapshot (without disturbing the working solution)"""
+        routes, saved_unassigned = snapshot
+        copies = [dict(state, route=list(route)) for state, route in zip(states, routes)]
+        return self.solver._build_result(copies, saved_unassigned)
+
+    def _cost(self, states: List[Dict], unassigned: List[Tuple[Dict, str]]) -> Tuple[int, int, int, float]:
+        """Same ordering as multi_start.solution_cost, computed without rendering"""
+        late = 0
+        overtime = 0
+        drive = 0.0
+        for state in states:
+            if not state['route']:
+                continue
+            route_late, route_drive, timings = self.solver.simulator.schedule(state, state['route'])
+            late += route_late
+            drive += route_drive
+            finish = timings[-1]['service_start'] + state['route'][-1]['duration']
+            overtime += max(0, finish - WORKDAY_END_MIN)
+        return len(unassigned), late, round(overtime), drive
+
+    @staticmethod
+    def _history_entry(elapsed: float, iteration: int, cost: Tuple) -> Dict:
+        return {
+            'elapsed_sec': round(elapsed, 2),
+            'iteration': iteration,
+            'unassigned': cost[0],
+            'late_stops': cost[1],
+            'overtime_min': round(cost[2]),
+            'drive_min': round(cost[3]),
+        }
+
+    # ------------------------------------------------------------------
+    # Moves
+    # ------------------------------------------------------------------
+
+    def _perturb(self, states: List[Dict], unassigned: List[Tuple[Dict, str]]) -> None:
+        """Pull a few random stops out and re-insert them (plus retry unassigned orders) cheapest-first"""
+        routed = []
+        for k, state in enumerate(states):
+            load = RouteLoad(state['route'])
+            # Reloads and linked pickup/delivery pairs stay where they are
+            routed.extend((k, i) for i, node in enumerate(state['route'])
+                          if not node['after'] and load.after_remove(i) is not None)
+        count = min(len(routed), self.rng.randint(1, max(1, min(5, len(routed) // 5))))
+
+        removed = []
+        for k, i in sorted(self.rng.sample(routed, count), reverse=True):
+            removed.append(states[k]['route'].pop(i))
+
+        retry = [node for node, reason in unassigned if reason == 'time_window']
+        unassigned[:] = [(node, reason) for node, reason in unassigned if reason != 'time_window']
+
+        pool = removed + retry
+        self.rng.shuffle(pool)
+        for node in pool:
+            best = None
+            for k in node['candidates']:
+                state = states[k]
+                if self.solver.max_stops_per_driver and len(state['route']) >= self.solver.max_stops_per_driver:
+                    continue
+                insertion = self.solver._best_insertion(state, node)
+                if insertion and (best is None or insertion[1] < best[1]):
+                    best = (k, insertion[1], insertion[0])
+            if best is None:
+                unassigned.append((node, 'time_window'))
+            else:
+                states[best[0]]['route'].insert(best[2], node)
@@ -0,0 +1,333 @@
+"""
+Benchmark - Reproducible synthetic Southern California days and a harness that runs any optimizer on them
+
+Every backend takes (orders, drivers, time_budget) and returns a result in
+the AIOptimizer format. Each run happens in a fresh worker process so its
+memory can be measured on its own, and every result is re-timed with the
+local simulator so lateness is comparable across backends (the model's own
+ETAs are not trusted).
+"""
+
+import copy
+import csv
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional, Callable
+from utils.geo import CITY_COORDINATES
+from utils.time_windows import normalize_order_window
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Cities and ZIP prefixes per region (DRIVERS-style coverage)
+REGIONS = {
+    'Los Angeles': {
+        'hub': 'Los Angeles',
+        'zip_prefixes': ['900', '902', '903', '905', '906', '907', '910', '911', '912', '913', '914', '915', '916', '918'],
+        'cities': ['los angeles', 'long beach', 'pasadena', 'glendale', 'burbank', 'torrance', 'inglewood',
+                   'downey', 'norwalk', 'whittier', 'lakewood', 'el monte', 'alhambra', 'arcadia',
+                   'san gabriel', 'hawthorne', 'gardena', 'van nuys', 'northridge', 'west covina'],
+    },
+    'Orange County': {
+        'hub': 'Santa Ana',
+        'zip_prefixes': ['926', '927', '928'],
+        'cities': ['anaheim', 'santa ana', 'irvine', 'huntington beach', 'garden grove', 'orange', 'fullerton',
+                   'costa mesa', 'mission viejo', 'westminster', 'newport beach', 'buena park', 'tustin',
+                   'yorba linda', 'lake forest', 'laguna niguel'],
+    },
+    'Inland Empire': {
+        'hub': 'Ontario',
+        'zip_prefixes': ['917', '923', '924', '925'],
+        'cities': ['riverside', 'san bernardino', 'fontana', 'moreno valley', 'rancho cucamonga', 'ontario',
+                   'corona', 'temecula', 'murrieta', 'chino', 'upland', 'rialto', 'redlands', 'pomona'],
+    },
+}
+
+# Share of orders per region
+REGION_WEIGHTS = {'Los Angeles': 0.5, 'Orange County': 0.3, 'Inland Empire': 0.2}
+
+# Time windows as written in TEST_ORDERS.txt ('' = any time)
+WINDOW_TEMPLATES = [
+    '', '', '',
+    '8:00 AM - 12:00 PM', '9:00 AM - 12:00 PM', '10:00 AM - 2:00 PM', '11:00 AM - 3:00 PM',
+    '12:00 PM - 4:00 PM', '1:00 PM - 5:00 PM', '3:00 PM - 5:00 PM', '10:00 AM - 4:00 PM',
+]
+
+ITEM_SETS = {
+    'Delivery': [
+        'Hospital Bed, Bedside Table, Patient Lift', 'Oxygen Concentrator 5L, Wheelchair',
+        'Hospital Bed, Wheelchair, Walker', 'CPAP Machine, Full Face Mask, Heated Humidifier',
+        'Knee Scooter, Crutches, Ice Machine', 'Power Wheelchair, 24ft Portable Ramp',
+        'Walker, Shower Chair', 'Commode, Raised Toilet Seat', 'Nebulizer',
+    ],
+    'Pickup': ['Hospital Bed, Overbed Table', 'Wheelchair', 'Walker', 'Patient Lift', 'Oxygen Concentrator'],
+    'Exchange': ['Oxygen Concentrator', 'CPAP Machine', 'Wheelchair'],
+}
+ORDER_TYPES = ['Delivery'] * 7 + ['Pickup'] * 2 + ['Exchange']
+
+FIRST_NAMES = ['Maria', 'Robert', 'Patricia', 'James', 'Linda', 'Michael', 'Susan', 'David', 'Karen', 'Jose',
+               'Nancy', 'Daniel', 'Lisa', 'Kevin', 'Angela', 'Thomas', 'Rosa', 'Steven', 'Helen', 'Carlos']
+LAST_NAMES = ['Rodriguez', 'Chen', 'Williams', 'Thompson', 'Martinez', 'Anderson', 'Davis', 'Kim', 'Nguyen',
+              'Garcia', 'Lopez', 'Patel', 'Johnson', 'Hernandez', 'Lee', 'Brown']
+STREETS = ['Atlantic Ave', 'San Gabriel Blvd', 'Foothill Blvd', 'Alessandro Blvd', 'Country Club Dr',
+           'Main St', 'Central Ave', 'Harbor Blvd', 'Beach Blvd', 'Valley Blvd', 'Magnolia Ave', 'Euclid Ave']
+
+VEHICLE_TYPES = ['Van', 'Van', 'Cargo Van', 'Box Truck']
+
+# Coordinate jitter around a city center (degrees, about 2 miles)
+CITY_JITTER_DEG = 0.03
+
+CSV_FIELDS = ['created_at', 'label', 'backend', 'instance', 'seed', 'orders', 'drivers', 'time_budget_sec',
+              'solve_sec', 'total_miles', 'drive_min', 'late_stops', 'late_min', 'unassigned',
+              'peak_mem_mb', 'error']
+
+
+# ----------------------------------------------------------------------
+# Instances
+# ----------------------------------------------------------------------
+
+def generate_orders(count: int, seed: int) -> List[Dict]:
+    """Orders spread over LA/OC/IE with TEST_ORDERS-style windows, same seed = same orders"""
+    rng = random.Random(seed)
+    regions = list(REGION_WEIGHTS)
+    weights = [REGION_WEIGHTS[r] for r in regions]
+    orders = []
+
+    for i in range(count):
+        region = REGIONS[rng.choices(regions, weights)[0]]
+        city = rng.choice(region['cities'])
+        lat, lng = CITY_COORDINATES[city]
+        order_type = rng.choice(ORDER_TYPES)
+
+        order = {
+            'order_id': f"BENCH-{seed}-{i + 1:04d}",
+            'customer_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'customer_phone': f"{rng.choice(['562', '626', '909', '951', '714', '213'])}-555-{rng.randint(1000, 9999)}",
+            'address': f"{rng.randint(100, 99999)} {rng.choice(STREETS)}",
+            'city': city.title(),
+            'zip_code': f"{rng.choice(region['zip_prefixes'])}{rng.randint(0, 99):02d}",
+            'order_type': order_type,
+            'items': rng.choice(ITEM_SETS[order_type]),
+            'time_window': rng.choice(WINDOW_TEMPLATES),
+            'special_notes': '',
+            'lat': round(lat + rng.uniform(-CITY_JITTER_DEG, CITY_JITTER_DEG), 5),
+            'lng': round(lng + rng.uniform(-CITY_JITTER_DEG, CITY_JITTER_DEG), 5),
+            'status': 'pending',
+        }
+        if order['time_window']:
+            order['time_window_start'], order['time_window_end'] = order['time_window'].split(' - ')
+        orders.append(normalize_order_window(order))
+
+    return orders
+
+
+def generate_drivers(count: int, seed: int) -> List[Dict]:
+    """Prepared drivers shaped like DRIVERS rows, spread over the regions by order share"""
+    rng = random.Random(seed + 7919)
+    regions = sorted(REGION_WEIGHTS, key=REGION_WEIGHTS.get, reverse=True)
+    drivers = []
+
+    for i in range(count):
+        name = regions[i % len(regions)]
+        region = REGIONS[name]
+        drivers.append({
+            'driver_id': f"DRV-{i + 1:03d}",
+            'driver_name': f"{rng.choice(FIRST_NAMES)} {name.split()[0]}{i + 1}",
+            'status': 'active',
+            'primary_areas': name,
+            'cities_covered': ', '.join(c.title() for c in region['cities']),
+            'zip_prefixes': ', '.join(region['zip_prefixes']),
+            'vehicle_type': rng.choice(VEHICLE_TYPES),
+            'start_location': region['hub'],
+            'start_time': rng.choice(['07:00 AM', '08:00 AM', '08:00 AM', '09:00 AM']),
+        })
+
+    return drivers
+
+
+def generate_instance(orders: int, drivers: int, seed: int) -> Dict:
+    """Named, reproducible benchmark day"""
+    return {
+        'name': f"socal-{orders}x{drivers}-s{seed}",
+        'seed': seed,
+        'orders': generate_orders(orders, seed),
+        'drivers': generate_drivers(drivers, seed),
+    }
+
+
+# ----------------------------------------------------------------------
+# Backends: (orders, drivers, time_budget) -> result
+# ----------------------------------------------------------------------
+
+def _solve_local(orders: List[Dict], drivers: List[Dict], time_budget: float) -> Dict:
+    from components.route_solver import RouteSolver
+    return RouteSolver().solve(orders, drivers)
+
+
+def _solve_multistart(orders: List[Dict], drivers: List[Dict], time_budget: float) -> Dict:
+    from components.multi_start import MultiStartOptimizer
+    return MultiStartOptimizer(time_budget).optimize(orders, drivers)
+
+
+def _solve_anytime(orders: List[Dict], drivers: List[Dict], time_budget: float) -> Dict:
+    from components.anytime_search import AnytimeOptimizer
+    return AnytimeOptimizer(time_budget).optimize(orders, drivers)
+
+
+def _solve_lns(orders: List[Dict], drivers: List[Dict], time_budget: float) -> Dict:
+    from components.lns_solver import LNSOptimizer
+    return LNSOptimizer(time_budget).optimize(orders, drivers)
+
+
+def _solve_gemini(orders: List[Dict], drivers: List[Dict], time_budget: float) -> Dict:
+    # Needs GEMINI_API_KEY; imported here so local-only runs never need the SDK
+    from components.ai_optimizer import AIOptimizer
+    return AIOptimizer().optimize_routes(orders, drivers)
+
+
+BACKENDS: Dict[str, Callable[[List[Dict], List[Dict], float], Dict]] = {
+    'local': _solve_local,
+    'multistart': _solve_multistart,
+    'anytime': _solve_anytime,
+    'lns': _solve_lns,
+    'gemini': _solve_gemini,
+}
+
+
+# ----------------------------------------------------------------------
+# Measurement
+# ----------------------------------------------------------------------
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def score_result(result: Dict, orders: List[Dict], drivers: List[Dict]) -> Dict:
+    """Miles, drive time, lateness and unassigned count, re-timed locally"""
+    from components.route_simulator import RouteSimulator
+
+    simulated = RouteSimulator().simulate(copy.deepcopy(result), drivers, repair=False)
+    routed = set()
+    miles = 0.0
+    drive = 0
+    late_stops = 0
+    late_min = 0
+    for route_data in (simulated.get('routes') or {}).values():
+        if not isinstance(route_data, dict):
+            continue
+        summary = route_data.get('summary', {})
+        miles += summary.get('total_distance_miles', 0) or 0
+        drive += summary.get('total_drive_time_min', 0) or 0
+        for stop in route_data.get('stops', []):
+            routed.add(str(stop.get('order_id', '')))
+            if not stop.get('time_window_ok', True):
+                late_stops += 1
+                late_min += stop.get('late_min', 0) or 0
+
+    # Orders the backend silently dropped count as unassigned too
+    unassigned = sum(1 for o in orders if str(o.get('order_id', '')) not in routed)
+    return {
+        'total_miles': round(miles, 1),
+        'drive_min': drive,
+        'late_stops': late_stops,
+        'late_min': late_min,
+        'unassigned': unassigned,
+    }
+
+
+def run_once(backend: str, instance: Dict, time_budget: float) -> Dict:
+    """Run one backend on one instance (in a fresh worker process) and measure it"""
+    row = {
+        'backend': backend,
+        'instance': instance['name'],
+        'seed': instance['seed'],
+        'orders': len(instance['orders']),
+        'drivers': len(instance['drivers']),
+        'time_budget_sec': time_budget,
+        'error': '',
+    }
+    memory_before = _peak_rss_mb()
+    started = time.time()
+    try:
+        result = BACKENDS[backend](copy.deepcopy(instance['orders']), copy.deepcopy(instance['drivers']), time_budget)
+    except Exception as e:
+        row['solve_sec'] = round(time.time() - started, 3)
+        row['error'] = str(e)
+        return row
+
+    row['solve_sec'] = round(time.time() - started, 3)
+    memory_after = _peak_rss_mb()
+    row['peak_mem_mb'] = round(memory_after - memory_before, 1) if memory_before is not None else ''
+    row.update(score_result(result, instance['orders'], instance['drivers']))
+    return row
+
+
+class BenchmarkRunner:
+
+    def __init__(self, output_path: str = os.path.join('benchmarks', 'results.csv'), label: Optional[str] = None):
+        """
+        Args:
+            output_path: CSV file results are appended to
+            label: Release/prompt label stored with every row (default: today's date)
+        """
+        self.output_path = output_path
+        self.label = label or datetime.now().strftime('%Y-%m-%d')
+
+    def run(self, backends: List[str], sizes: List[tuple], seeds: List[int], time_budget: float = 10.0,
+            on_row: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """
+        Run every backend on every (orders, drivers) size and seed
+
+        Args:
+            backends: Names from BACKENDS
+            sizes: (order count, driver count) pairs
+            seeds: Instance seeds (same seed = same instance on every release)
+            time_budget: Seconds for the search backends
+            on_row: Called with each result row as it is written
+
+        Returns:
+            All result rows
+        """
+        unknown = [b for b in backends if b not in BACKENDS]
+        if unknown:
+            raise Exception(f"Unknown benchmark backend(s): {', '.join(unknown)}")
+
+        rows = []
+        for order_count, driver_count in sizes:
+            for seed in seeds:
+                instance = generate_instance(order_count, driver_count, seed)
+                for backend in backends:
+                    # Fresh process per run: memory is measured in isolation and crashes stay contained
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        try:
+                            row = pool.submit(run_once, backend, instance, time_budget).result()
+                        except Exception as e:
+                            row = {'backend': backend, 'instance': instance['name'], 'seed': seed,
+                                   'orders': order_count, 'drivers': driver_count, 'error': str(e)}
+                    row['created_at'] = datetime.now().isoformat(timespec='seconds')
+                    row['label'] = self.label
+                    self._append(row)
+                    rows.append(row)
+                    if on_row:
+                        on_row(row)
+        return rows
+
+    def _append(self, row: Dict) -> None:
+        """Append one row, writing the header for a new file"""
+        folder = os.path.dirname(self.output_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        is_new = not os.path.exists(self.output_path)
+        with open(self.output_path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            if is_new:
+                writer.writeheader()
+            writer.writerow(row)
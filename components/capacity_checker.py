@@ -0,0 +1,516 @@
+"""
+Capacity Checker - Vehicle load along each route (deliveries leave the van, pickups come back on)
+
+The van leaves the depot with every delivery of its first load on board.
+Each stop drops its deliveries and takes its pickups, so the load after a
+stop is the start load minus what was dropped plus what was picked up so
+far. A reload stop at the depot unloads the pickups and loads the
+deliveries of the next trip. A delivery linked to a pickup carries that
+pickup's equipment, so it must come after the pickup in the same trip.
+A route is feasible when no trip exceeds the vehicle's volume and weight
+capacity and every linked pair is in order.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Optional, Tuple
+from components.route_simulator import RouteSimulator
+from components.coverage_index import CoverageIndex
+
+# Load dimensions: cubic feet, pounds
+DIMENSIONS = 2
+
+# Moves tried per repair pass before giving up on a route
+MAX_REPAIR_MOVES = 200
+
+# Reload stops added to one route at most
+MAX_RELOADS = 3
+
+_NONE = float('-inf')
+
+
+class LoadProfile:
+
+    def __init__(self, route: List[Dict]):
+        """
+        Loads at every point of one trip with O(1) range maximum queries
+
+        Point 0 is leaving the depot, point k is leaving the k-th stop.
+
+        Args:
+            route: Simulator nodes (with 'board', 'drop' and 'pick' loads), no reloads
+        """
+        self.route = route
+        self.size = len(route)
+        self.tables = []
+
+        for dim in range(DIMENSIONS):
+            load = sum(node['board'][dim] for node in route)
+            points = [load]
+            for node in route:
+                load += node['pick'][dim] - node['drop'][dim]
+                points.append(load)
+
+            # Sparse table: table[k][i] = max(points[i : i + 2**k])
+            table = [points]
+            width = 1
+            while width * 2 <= len(points):
+                prev = table[-1]
+                table.append([max(prev[i], prev[i + width]) for i in range(len(points) - width * 2 + 1)])
+                width *= 2
+            self.tables.append(table)
+
+        self.peak = tuple(self._range_max(dim, 0, self.size) for dim in range(DIMENSIONS))
+
+    def _range_max(self, dim: int, a: int, b: int) -> float:
+        """Highest load over points a..b (inclusive); -inf for an empty range"""
+        if a < 0:
+            a = 0
+        if b > self.size:
+            b = self.size
+        if a > b:
+            return _NONE
+        table = self.tables[dim]
+        k = (b - a + 1).bit_length() - 1
+        return max(table[k][a], table[k][b - (1 << k) + 1])
+
+    # ------------------------------------------------------------------
+    # Peak load after a move, each in O(1)
+    # ------------------------------------------------------------------
+
+    def after_insert(self, node: Dict, position: int) -> Tuple[float, ...]:
+        """Peak load if node becomes stop number `position` (0-based)"""
+        return tuple(
+            max(self._range_max(dim, 0, position) + node['board'][dim],
+                self._range_max(dim, position, self.size)
+                + node['board'][dim] - node['drop'][dim] + node['pick'][dim])
+            for dim in range(DIMENSIONS)
+        )
+
+    def after_remove(self, i: int) -> Tuple[float, ...]:
+        """Peak load without stop i (0-based)"""
+        node = self.route[i]
+        return tuple(
+            max(self._range_max(dim, 0, i) - node['board'][dim],
+                self._range_max(dim, i + 2, self.size)
+                - (node['board'][dim] - node['drop'][dim] + node['pick'][dim]))
+            for dim in range(DIMENSIONS)
+        )
+
+    def after_relocate(self, i: int, j: int) -> Tuple[float, ...]:
+        """Peak load if stop i moves to position j (as in route.pop(i); route.insert(j, ...))"""
+        if i == j:
+            return self.peak
+        node = self.route[i]
+        peaks = []
+        for dim in range(DIMENSIONS):
+            delta = node['pick'][dim] - node['drop'][dim]
+            if j > i:
+                # Stops i+1..j move one place earlier and no longer carry the moved stop's change
+                peak = max(self._range_max(dim, 0, i),
+                           self._range_max(dim, i + 2, j + 1) - delta,
+                           self._range_max(dim, j + 1, self.size))
+            else:
+                # Stops j..i-1 move one place later and now carry the moved stop's change
+                peak = max(self._range_max(dim, 0, j),
+                           self._range_max(dim, j, i) + delta,
+                           self._range_max(dim, i + 2, self.size))
+            peaks.append(peak)
+        return tuple(peaks)
+
+    @staticmethod
+    def fits(peak: Optional[Tuple[float, ...]], capacity: Tuple[float, ...]) -> bool:
+        """Whether a peak load fits (None = move not allowed)"""
+        return peak is not None and all(p <= c + 1e-9 for p, c in zip(peak, capacity))
+
+    @staticmethod
+    def excess(peak: Tuple[float, ...], capacity: Tuple[float, ...]) -> float:
+        """Overload as a fraction of capacity, summed over dimensions (0 = fits)"""
+        return sum(max(0.0, p - c) / c for p, c in zip(peak, capacity) if c > 0)
+
+
+class RouteLoad:
+
+    def __init__(self, route: List[Dict]):
+        """
+        Trips of a route (split at reload stops) plus pickup/delivery positions
+
+        Move checks return the route's peak load after the move, or None when
+        the move breaks a pickup-before-delivery pair or moves a reload stop.
+        Each check is O(1) for the usual handful of trips.
+
+        Args:
+            route: Simulator nodes
+        """
+        self.route = route
+        self.size = len(route)
+        self.reloads = [k for k, node in enumerate(route) if node.get('reload')]
+        bounds = [-1] + self.reloads + [self.size]
+        self.trip_starts = [b + 1 for b in bounds[:-1]]
+        self.trips = [LoadProfile(route[bounds[t] + 1:bounds[t + 1]]) for t in range(len(bounds) - 1)]
+        self.peak = self._combine(trip.peak for trip in self.trips)
+
+        # Positions of linked pickups and their deliveries
+        self.index_of = {}
+        self.dependent_of = {}
+        for k, node in enumerate(route):
+            if not node.get('reload'):
+                self.index_of[str(node['order'].get('order_id', ''))] = k
+        for k, node in enumerate(route):
+            if node.get('after'):
+                self.dependent_of.setdefault(node['after'], []).append(k)
+
+        self.broken_pairs = [
+            route[k]['order'].get('order_id', '') for pickup_id, deliveries in self.dependent_of.items()
+            for k in deliveries if not self._pair_ok(self.index_of.get(pickup_id), k, self.reloads)
+        ]
+
+    @staticmethod
+    def _combine(peaks) -> Tuple[float, ...]:
+        peaks = list(peaks)
+        return tuple(max(p[dim] for p in peaks) for dim in range(DIMENSIONS))
+
+    @staticmethod
+    def _pair_ok(pickup: Optional[int], delivery: Optional[int], reloads: List[int]) -> bool:
+        """Pickup before its delivery with no reload in between"""
+        if pickup is None or delivery is None or pickup >= delivery:
+            return False
+        return bisect_right(reloads, pickup) == bisect_left(reloads, delivery)
+
+    def _trip_of_position(self, position: int) -> int:
+        """Trip an inserted stop joins when placed before route[position]"""
+        return bisect_left(self.reloads, position)
+
+    def _others(self, *skip: int) -> List[Tuple[float, ...]]:
+        return [trip.peak for t, trip in enumerate(self.trips) if t not in skip]
+
+    # ------------------------------------------------------------------
+    # Move checks
+    # ------------------------------------------------------------------
+
+    def after_insert(self, node: Dict, position: int) -> Optional[Tuple[float, ...]]:
+        """Peak load if node becomes stop number `position`, None if not allowed"""
+        if node.get('reload'):
+            return None
+
+        if node.get('after'):
+            pickup = self.index_of.get(node['after'])
+            if pickup is None or pickup >= position or self._trip_of_position(position) != bisect_right(self.reloads, pickup):
+                return None
+        for delivery in self.dependent_of.get(str(node['order'].get('order_id', '')), []):
+            if position > delivery or self._trip_of_position(position) != bisect_right(self.reloads, delivery):
+                return None
+
+        t = self._trip_of_position(position)
+        peak = self.trips[t].after_insert(node, position - self.trip_starts[t])
+        return self._combine([peak] + self._others(t))
+
+    def after_remove(self, i: int) -> Optional[Tuple[float, ...]]:
+        """Peak load without stop i, None if a linked delivery still needs it (or it is a reload)"""
+        node = self.route[i]
+        if node.get('reload') or str(node['order'].get('order_id', '')) in self.dependent_of:
+            return None
+        t = bisect_right(self.reloads, i)
+        peak = self.trips[t].after_remove(i - self.trip_starts[t])
+        return self._combine([peak] + self._others(t))
+
+    def after_relocate(self, i: int, j: int) -> Optional[Tuple[float, ...]]:
+        """Peak load if stop i moves to position j (pop then insert), None if not allowed"""
+        node = self.route[i]
+        if node.get('reload'):
+            return None
+        if i == j:
+            return self.peak
+
+        def moved(k: int) -> int:
+            k -= 1 if k > i else 0
+            return k + (1 if k >= j else 0)
+
+        reloads = [moved(r) for r in self.reloads]
+        if node.get('after'):
+            pickup = self.index_of.get(node['after'])
+            if not self._pair_ok(None if pickup is None else moved(pickup), j, reloads):
+                return None
+        for delivery in self.dependent_of.get(str(node['order'].get('order_id', '')), []):
+            if not self._pair_ok(j, moved(delivery), reloads):
+                return None
+
+        ti = bisect_right(self.reloads, i)
+        tj = bisect_left(reloads, j)
+        if ti == tj:
+            start = self.trip_starts[ti]
+            peak = self.trips[ti].after_relocate(i - start, j - start)
+            return self._combine([peak] + self._others(ti))
+
+        # Start of trip tj in the route without stop i
+        start_j = self.trip_starts[tj] - (1 if tj > ti else 0)
+        removed = self.trips[ti].after_remove(i - self.trip_starts[ti])
+        inserted = self.trips[tj].after_insert(node, j - start_j)
+        return self._combine([removed, inserted] + self._others(ti, tj))
+
+
+class CapacityChecker:
+
+    def __init__(self, simulator: Optional[RouteSimulator] = None):
+        self.simulator = simulator or RouteSimulator()
+
+    def enforce(self, result: Dict, drivers: List[Dict], repair: bool = True) -> Dict:
+        """
+        Check every route against its vehicle's capacity and linked pickups, and repair
+
+        Deliveries linked to a pickup are moved after it (onto the pickup's
+        route if needed). Overloaded routes are then re-sequenced (e.g. pickups
+        moved after deliveries), stops are moved to another covering driver
+        with room to spare, and as a last resort a depot reload splits the
+        route into two loads. Reloads that are no longer needed are removed.
+        Moves never add late stops. Every route summary gets its peak load,
+        vehicle capacity and reload count; remaining problems become warnings.
+
+        Args:
+            result: Optimization result (routes, unassigned_orders, warnings)
+            drivers: Prepared driver dicts
+            repair: Move stops to fix overloads and broken pairs
+
+        Returns:
+            The same result dict, updated in place
+        """
+        routes = result.get('routes') or {}
+        warnings = result.setdefault('warnings', [])
+        states = self.simulator.states_from_routes(routes, drivers)
+        routed = {name: state for name, state in states.items() if name in routes}
+        overloaded = [
+            name for name, state in routed.items()
+            if not LoadProfile.fits(RouteLoad(state['route']).peak, state['capacity'])
+        ]
+
+        changed = set()
+        if repair:
+            changed.update(self._fix_pairs(states))
+
+            index = CoverageIndex.for_drivers(drivers)
+            positions = {d.get('driver_name', 'Unknown'): i for i, d in enumerate(drivers)}
+            for name in overloaded:
+                state = states[name]
+                if self._resequence(state):
+                    changed.add(name)
+                moved_to = self._move_out(name, states, index, positions)
+                if moved_to:
+                    changed.add(name)
+                    changed.update(moved_to)
+                if self._add_reloads(state):
+                    changed.add(name)
+
+            for name, state in states.items():
+                if self.drop_reloads(state):
+                    changed.add(name)
+
+        for name in changed:
+            if states[name]['route']:
+                routes[name] = self.simulator.render_route(states[name])
+            else:
+                routes.pop(name, None)
+
+        for name, route_data in routes.items():
+            state = states.get(name)
+            if state is None or not isinstance(route_data, dict):
+                continue
+            load = RouteLoad(state['route'])
+            capacity = state['capacity']
+            route_data.setdefault('summary', {}).update({
+                'peak_load_cuft': round(load.peak[0], 1),
+                'peak_load_lb': round(load.peak[1]),
+                'vehicle_capacity_cuft': capacity[0],
+                'vehicle_capacity_lb': capacity[1],
+                'reloads': len(load.reloads),
+            })
+            if not LoadProfile.fits(load.peak, capacity):
+                warnings.append(
+                    f"{name}: load peaks at {load.peak[0]:.0f} cu ft / {load.peak[1]:.0f} lb, "
+                    f"over the {state['driver'].get('vehicle_type') or 'vehicle'} capacity "
+                    f"({capacity[0]:.0f} cu ft / {capacity[1]:.0f} lb)"
+                )
+            elif name in overloaded:
+                reload_text = f" ({len(load.reloads)} depot reload(s))" if load.reloads else ""
+                warnings.append(f"{name}: stops moved to fit the vehicle load{reload_text}")
+            for order_id in load.broken_pairs:
+                warnings.append(f"{name}: delivery {order_id} is not after its linked pickup in the same load")
+
+        return result
+
+    # ------------------------------------------------------------------
+    # Repair
+    # ------------------------------------------------------------------
+
+    def _fix_pairs(self, states: Dict[str, Dict]) -> set:
+        """Move linked deliveries after their pickup (onto the pickup's route if needed)"""
+        changed = set()
+        pickups = {}
+        for name, state in states.items():
+            for node in state['route']:
+                if not node.get('reload'):
+                    pickups[str(node['order'].get('order_id', ''))] = name
+
+        for name, state in states.items():
+            for node in list(state['route']):
+                if not node.get('after') or node['after'] not in pickups:
+                    continue
+                load = RouteLoad(state['route'])
+                k = state['route'].index(node)
+                if pickups[node['after']] == name and node['order'].get('order_id', '') not in load.broken_pairs:
+                    continue
+
+                target = states[pickups[node['after']]]
+                state['route'].pop(k)
+                insertion = self._fitting_insertion(target, node)
+                if insertion is None:
+                    state['route'].insert(k, node)
+                    continue
+                target['route'].insert(insertion[0], node)
+                changed.update({name, pickups[node['after']]})
+
+        return changed
+
+    def _resequence(self, state: Dict) -> bool:
+        """Relocate stops within the route while the overload shrinks (no new late stops)"""
+        route = state['route']
+        capacity = state['capacity']
+        changed = False
+
+        for _ in range(MAX_REPAIR_MOVES):
+            load = RouteLoad(route)
+            current = LoadProfile.excess(load.peak, capacity)
+            if current == 0:
+                break
+            base_late = self.simulator.schedule(state, route)[0]
+
+            # O(1) load and pair check for every move first; time windows only for moves that help
+            moves = []
+            for i in range(len(route)):
+                for j in range(len(route)):
+                    peak = load.after_relocate(i, j) if i != j else None
+                    if peak is not None:
+                        excess = LoadProfile.excess(peak, capacity)
+                        if excess < current - 1e-9:
+                            moves.append((excess, i, j))
+            moves.sort()
+
+            applied = False
+            for _, i, j in moves:
+                candidate = list(route)
+                candidate.insert(j, candidate.pop(i))
+                if self.simulator.schedule(state, candidate)[0] <= base_late:
+                    route[:] = candidate
+                    changed = applied = True
+                    break
+            if not applied:
+                break
+
+        return changed
+
+    def _move_out(self, name: str, states: Dict[str, Dict], index: CoverageIndex,
+                  positions: Dict[str, int]) -> set:
+        """Move stops to other covering drivers with spare capacity until the route fits"""
+        source = states[name]
+        capacity = source['capacity']
+        receivers = set()
+
+        for _ in range(MAX_REPAIR_MOVES):
+            load = RouteLoad(source['route'])
+            current = LoadProfile.excess(load.peak, capacity)
+            if current == 0:
+                break
+
+            # Stops whose removal helps most first (linked pairs and reloads stay)
+            options = []
+            for i, node in enumerate(source['route']):
+                peak = load.after_remove(i)
+                if peak is not None and not node.get('after'):
+                    excess = LoadProfile.excess(peak, capacity)
+                    if excess < current - 1e-9:
+                        options.append((excess, i))
+            options.sort()
+
+            move = None
+            for _, i in options:
+                node = source['route'][i]
+                covering = set(index.candidate_indexes(node['order']))
+                for target_name, target in states.items():
+                    if target_name == name or positions.get(target_name) not in covering:
+                        continue
+                    insertion = self._fitting_insertion(target, node)
+                    if insertion and (move is None or insertion[1] < move[3]):
+                        move = (i, target_name, insertion[0], insertion[1])
+                if move:
+                    break
+
+            if move is None:
+                break
+            i, target_name, position, _ = move
+            states[target_name]['route'].insert(position, source['route'].pop(i))
+            receivers.add(target_name)
+
+        return receivers
+
+    def _add_reloads(self, state: Dict) -> bool:
+        """Split an overloaded route with depot reloads where that adds the least driving"""
+        route = state['route']
+        capacity = state['capacity']
+        changed = False
+
+        while len(RouteLoad(route).reloads) < MAX_RELOADS:
+            current = LoadProfile.excess(RouteLoad(route).peak, capacity)
+            if current == 0:
+                break
+            base_late, base_drive, _ = self.simulator.schedule(state, route)
+            reload = self.simulator.make_reload_node(state)
+
+            best = None
+            for split in range(1, len(route)):
+                if route[split - 1].get('reload') or route[split].get('reload'):
+                    continue
+                candidate = route[:split] + [reload] + route[split:]
+                load = RouteLoad(candidate)
+                if load.broken_pairs:
+                    continue
+                excess = LoadProfile.excess(load.peak, capacity)
+                if excess >= current - 1e-9:
+                    continue
+                late, drive, _ = self.simulator.schedule(state, candidate)
+                if late <= base_late and (best is None or (excess, drive) < best[0]):
+                    best = ((excess, drive), candidate)
+
+            if best is None:
+                break
+            route[:] = best[1]
+            changed = True
+
+        return changed
+
+    def drop_reloads(self, state: Dict) -> bool:
+        """Remove reload stops the route no longer needs"""
+        route = state['route']
+        changed = False
+        for k in range(len(route) - 1, -1, -1):
+            if not route[k].get('reload'):
+                continue
+            base_late = self.simulator.schedule(state, route)[0]
+            candidate = route[:k] + route[k + 1:]
+            load = RouteLoad(candidate)
+            if (LoadProfile.fits(load.peak, state['capacity']) and not load.broken_pairs
+                    and self.simulator.schedule(state, candidate)[0] <= base_late):
+                route[:] = candidate
+                changed = True
+        return changed
+
+    def _fitting_insertion(self, state: Dict, node: Dict) -> Optional[Tuple[int, float]]:
+        """Cheapest (position, added drive minutes) that fits the vehicle, keeps pairs and adds no late stop"""
+        route = state['route']
+        load = RouteLoad(route)
+        base_late, base_drive, _ = self.simulator.schedule(state, route)
+        best = None
+        for position in range(len(route) + 1):
+            if not LoadProfile.fits(load.after_insert(node, position), state['capacity']):
+                continue
+            late, drive, _ = self.simulator.schedule(state, route[:position] + [node] + route[position:])
+            if late <= base_late and (best is None or drive - base_drive < best[1]):
+                best = (position, drive - base_drive)
+        return best
@@ -0,0 +1,136 @@
+"""
+Coverage Index - Precomputed driver coverage (ZIP prefix trie + city map) for constant time lookups
+"""
+
+import copy
+import hashlib
+import json
+from typing import List, Dict, Tuple
+from utils.geo import normalize_city, split_list
+
+# Driver fields that define coverage
+COVERAGE_FIELDS = ('driver_name', 'primary_areas', 'cities_covered', 'zip_prefixes')
+
+# Indexes kept for recently seen driver lists (lookup structures only, no driver dicts)
+MAX_CACHED_INDEXES = 8
+
+_INDEXES: Dict[str, 'CoverageIndex'] = {}
+
+# Trie node key holding the drivers whose prefix ends at that node
+_END = '$'
+
+
+class CoverageIndex:
+
+    def __init__(self, drivers: List[Dict]):
+        """
+        Args:
+            drivers: Driver dicts (DRIVERS sheet rows or prepared drivers)
+        """
+        self.drivers = list(drivers)
+        self._zip_trie: Dict = {}
+        self._cities: Dict[str, set] = {}
+        self._universal: set = set()
+        self._lookups: Dict[Tuple[str, str], Tuple[int, ...]] = {}
+
+        for i, driver in enumerate(self.drivers):
+            zip_prefixes = [p for p in split_list(driver.get('zip_prefixes')) if p.isdigit()]
+            cities = split_list(driver.get('cities_covered')) + split_list(driver.get('primary_areas'))
+
+            if not (zip_prefixes or cities):
+                # No coverage data = covers everything
+                self._universal.add(i)
+                continue
+
+            for prefix in zip_prefixes:
+                node = self._zip_trie
+                for digit in prefix:
+                    node = node.setdefault(digit, {})
+                node.setdefault(_END, set()).add(i)
+
+            for city in cities:
+                self._cities.setdefault(normalize_city(city), set()).add(i)
+
+    @classmethod
+    def for_drivers(cls, drivers: List[Dict]) -> 'CoverageIndex':
+        """Index for a driver list, rebuilt only when coverage data changes"""
+        # Only the lookup structures are shared; lookups return the caller's own
+        # driver dicts so edited start times, locations and vehicles are kept
+        key = cls.fingerprint(drivers)
+        shared = _INDEXES.get(key)
+        if shared is None:
+            index = cls(drivers)
+            _INDEXES[key] = index._with_drivers([])
+            while len(_INDEXES) > MAX_CACHED_INDEXES:
+                _INDEXES.pop(next(iter(_INDEXES)))
+            return index
+        return shared._with_drivers(drivers)
+
+    def _with_drivers(self, drivers: List[Dict]) -> 'CoverageIndex':
+        """Same lookup structures bound to another driver list with the same coverage"""
+        index = copy.copy(self)
+        index.drivers = list(drivers)
+        return index
+
+    @staticmethod
+    def fingerprint(drivers: List[Dict]) -> str:
+        """Hash of the coverage fields of every driver, in order"""
+        payload = [[str(d.get(f, '')) for f in COVERAGE_FIELDS] for d in drivers]
+        return hashlib.sha1(json.dumps(payload).encode('utf-8')).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def candidate_indexes(self, order: Dict) -> Tuple[int, ...]:
+        """Positions (in self.drivers) of every driver covering the order"""
+        zip_code = str(order.get('zip_code', '')).strip()[:5]
+        city = normalize_city(order.get('city', ''))
+        key = (zip_code, city)
+
+        cached = self._lookups.get(key)
+        if cached is not None:
+            return cached
+
+        found = set(self._universal)
+        if city:
+            found |= self._cities.get(city, set())
+
+        # A ZIP has at most 5 digits, so the walk is bounded
+        node = self._zip_trie
+        for digit in zip_code:
+            node = node.get(digit)
+            if node is None:
+                break
+            found |= node.get(_END, set())
+
+        result = tuple(sorted(found))
+        self._lookups[key] = result
+        return result
+
+    def candidates(self, order: Dict) -> List[Dict]:
+        """Drivers that can serve the order"""
+        return [self.drivers[i] for i in self.candidate_indexes(order)]
+
+    def candidate_names(self, order: Dict) -> set:
+        """Names of the drivers that can serve the order"""
+        return {self.drivers[i].get('driver_name', 'Unknown') for i in self.candidate_indexes(order)}
+
+    def covers(self, driver_position: int, order: Dict) -> bool:
+        """Whether the driver at this position covers the order"""
+        return driver_position in self.candidate_indexes(order)
+
+    # ------------------------------------------------------------------
+    # Batch helpers
+    # ------------------------------------------------------------------
+
+    def drivers_for_orders(self, orders: List[Dict]) -> List[Dict]:
+        """Drivers covering at least one of the orders (original order kept)"""
+        used = set()
+        for order in orders:
+            used.update(self.candidate_indexes(order))
+        return [self.drivers[i] for i in sorted(used)]
+
+    def uncovered(self, orders: List[Dict]) -> List[Dict]:
+        """Orders no driver covers"""
+        return [o for o in orders if not self.candidate_indexes(o)]
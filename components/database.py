@@ -10,6 +10,10 @@ import pickle
 import os
 from datetime import datetime
 from typing import List, Dict, Optional
+from utils.time_windows import (
+    parse_order_window, normalize_order_windows, format_clock, DAY_START_MIN, DAY_END_MIN
+)
+from components.route_simulator import PICKUP_LINK_FIELD
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
@@ -160,11 +164,14 @@ class Database:
                     "customer_name", "customer_phone", "address", "city", "zip_code", 
                     "items", "time_window_start", "time_window_end", "special_notes", 
                     "assigned_driver", "route_id", "stop_number", "eta", 
-                    "updated_at", "lat", "lng", "parsed_at"
+                    "updated_at", "lat", "lng", "parsed_at", PICKUP_LINK_FIELD
                 ]
                 final_rows = [headers]
             else:
                 headers = all_values[0]
+                # Sheets created before linked pickups existed get the column appended
+                if PICKUP_LINK_FIELD not in headers:
+                    headers.append(PICKUP_LINK_FIELD)
                 # Filter OUT rows for the target date (Keep everything else)
                 # We assume date is in column index 1 (B)
                 final_rows = [all_values[0]] # Keep headers
@@ -196,6 +203,9 @@ class Database:
                 coords = order.get('coordinates', {})
                 if not isinstance(coords, dict): coords = {}
 
+                # Free-text windows ("10 AM - 2 PM") are written as start/end columns
+                window_start, window_end = parse_order_window(order)
+
                 row = [
                     order_id,
                     date,
@@ -208,8 +218,10 @@ class Database:
                     order.get('city', ''),
                     order.get('zip_code', ''),
                     clean_items,
-                    order.get('time_window_start', '') or order.get('time_start', ''),
-                    order.get('time_window_end', '') or order.get('time_end', ''),
+                    order.get('time_window_start', '') or order.get('time_start', '') or
+                    (format_clock(window_start) if window_start != DAY_START_MIN else ''),
+                    order.get('time_window_end', '') or order.get('time_end', '') or
+                    (format_clock(window_end) if window_end != DAY_END_MIN else ''),
                     order.get('special_notes', ''),
                     order.get('assigned_driver', ''), # Ensure driver maps correctly
                     order.get('route_id', ''),
@@ -218,7 +230,8 @@ class Database:
                     datetime.now().isoformat(), # updated_at
                     coords.get('lat', ''),
                     coords.get('lng', ''),
-                    order.get('parsed_at', '')
+                    order.get('parsed_at', ''),
+                    order.get(PICKUP_LINK_FIELD, '')
                 ]
                 new_rows.append(row)
             
@@ -237,13 +250,18 @@ class Database:
             st.error(f"❌ DATABASE ERROR: {str(e)}")
             raise Exception(f"Error saving orders: {str(e)}")
     
+    @staticmethod
+    def make_route_id(driver_name: str, date: str) -> str:
+        """Route ID of a driver's route on a date (ROUTES column A, ORDERS route_id)"""
+        return f"ROUTE-{date.replace('-', '')}-{driver_name.split()[0].upper()}"
+    
     def save_routes(self, routes: Dict, date: str) -> None:
         """Save routes to ROUTES sheet"""
         try:
             ws = self.spreadsheet.worksheet('ROUTES')
             
             for driver_name, route_data in routes.items():
-                route_id = f"ROUTE-{date.replace('-', '')}-{driver_name.split()[0].upper()}"
+                route_id = self.make_route_id(driver_name, date)
                 summary = route_data.get('summary', {})
                 
                 row = [
@@ -265,6 +283,74 @@ class Database:
         except Exception as e:
             raise Exception(f"Error saving routes: {str(e)}")
     
+    def save_driver_route(self, driver_name: str, route_data: Dict, date: str,
+                          order_status: Optional[str] = 'sent_to_driver', route_status: str = 'planned') -> int:
+        """
+        Save ONE driver's route - touches only that driver's ROUTES row and order rows
+        
+        Uses a single read and a single batch write on ORDERS instead of
+        rewriting the day or updating cells one by one.
+        
+        Args:
+            order_status: Status written to every stop's order (None = keep each order's status)
+            route_status: ROUTES route_status value
+        
+        Returns:
+            Number of order rows updated
+        """
+        try:
+            route_id = self.make_route_id(driver_name, date)
+            summary = route_data.get('summary', {})
+            
+            # 1. ROUTES: update this route's row in place (or append it)
+            routes_ws = self.spreadsheet.worksheet('ROUTES')
+            route_row = [
+                route_id,
+                date,
+                driver_name,
+                summary.get('start_location', ''),
+                summary.get('total_stops', 0),
+                summary.get('total_distance_miles', 0),
+                summary.get('total_drive_time_min', 0),
+                summary.get('estimated_finish', ''),
+                route_status,
+                '',
+                datetime.now().isoformat()
+            ]
+            cell = routes_ws.find(route_id, in_column=1)
+            if cell:
+                routes_ws.update(f"A{cell.row}:K{cell.row}", [route_row])
+            else:
+                routes_ws.append_row(route_row)
+            
+            # 2. ORDERS: locate this driver's orders by order_id (column A)
+            orders_ws = self.spreadsheet.worksheet('ORDERS')
+            order_ids = orders_ws.col_values(1)
+            row_by_id = {oid: i + 1 for i, oid in enumerate(order_ids) if oid}
+            
+            updates = []
+            updated = 0
+            for stop in route_data.get('stops', []):
+                row_num = row_by_id.get(stop.get('order_id'))
+                if not row_num:
+                    continue
+                # Column 4 = status, Columns 15-18 = assigned_driver, route_id, stop_number, eta
+                if order_status:
+                    updates.append({'range': f"D{row_num}", 'values': [[order_status]]})
+                updates.append({
+                    'range': f"O{row_num}:R{row_num}",
+                    'values': [[driver_name, route_id, str(stop.get('stop_number', '')), stop.get('eta', '')]]
+                })
+                updated += 1
+            
+            if updates:
+                orders_ws.batch_update(updates)
+            
+            return updated
+            
+        except Exception as e:
+            raise Exception(f"Error saving route for {driver_name}: {str(e)}")
+    
     def get_routes(self, date: Optional[str] = None) -> List[Dict]:
         """Query routes from ROUTES sheet"""
         try:
@@ -326,7 +412,7 @@ class Database:
             if status:
                 records = [r for r in records if str(r.get('status', '')).lower() == status.lower()]
             
-            return records
+            return normalize_order_windows(records)
             
         except Exception as e:
             raise Exception(f"Error reading orders: {str(e)}")
@@ -0,0 +1,181 @@
+"""
+Job Runner - Background jobs with persisted status, progress events and cancellation
+"""
+
+import json
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Callable
+
+DEFAULT_JOBS_DIR = os.path.join('.cache', 'jobs')
+MAX_WORKERS = 2
+MAX_EVENTS = 50
+MAX_JOB_FILES = 50
+
+# Shared by every Streamlit session in this server process
+_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='route-job')
+_CANCEL_FLAGS: Dict[str, threading.Event] = {}
+_LOCK = threading.Lock()
+
+ACTIVE_STATUSES = ('queued', 'running', 'cancelling')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when the dispatcher cancelled it"""
+
+
+class JobContext:
+    """Handle passed to a job function for reporting progress and checking cancellation"""
+
+    def __init__(self, runner: 'JobRunner', job_id: str):
+        self.runner = runner
+        self.job_id = job_id
+
+    def report(self, progress: float, message: str = '', **extra) -> None:
+        """Record a progress event (0.0 - 1.0); extra keys are stored on the job"""
+        self.runner._update(self.job_id, progress=progress, message=message, event=True, **extra)
+
+    def cancelled(self) -> bool:
+        """Whether cancellation was requested"""
+        flag = _CANCEL_FLAGS.get(self.job_id)
+        return bool(flag and flag.is_set())
+
+    def check_cancelled(self) -> None:
+        """Stop the job here if cancellation was requested"""
+        if self.cancelled():
+            raise JobCancelled()
+
+
+class JobRunner:
+
+    def __init__(self, jobs_dir: str = DEFAULT_JOBS_DIR):
+        self.jobs_dir = jobs_dir
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _write(self, job: Dict) -> None:
+        try:
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            tmp_path = self._path(job['job_id']) + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(job, f, default=str)
+            os.replace(tmp_path, self._path(job['job_id']))
+        except (IOError, OSError, PermissionError):
+            pass
+
+    def _read(self, job_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(job_id), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _update(self, job_id: str, event: bool = False, only_statuses: Optional[tuple] = None, **fields) -> bool:
+        """
+        Merge fields into a job's persisted state
+
+        Args:
+            only_statuses: Only write while the job's status is one of these (checked under the lock)
+
+        Returns:
+            Whether the job was updated
+        """
+        with _LOCK:
+            job = self._read(job_id)
+            if job is None:
+                return False
+            if only_statuses is not None and job.get('status') not in only_statuses:
+                return False
+            job.update(fields)
+            job['updated_at'] = datetime.now().isoformat(timespec='seconds')
+            if event:
+                job['events'] = (job.get('events', []) + [{
+                    'at': job['updated_at'],
+                    'progress': fields.get('progress', job.get('progress', 0)),
+                    'message': fields.get('message', ''),
+                }])[-MAX_EVENTS:]
+            self._write(job)
+            return True
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> str:
+        """
+        Run fn(job_context, *args, **kwargs) in the background
+
+        Returns:
+            job_id used to poll, attach to and cancel the job
+        """
+        job_id = f"{kind}-{uuid.uuid4().hex[:10]}"
+        now = datetime.now().isoformat(timespec='seconds')
+        self._write({
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'progress': 0.0,
+            'message': 'Waiting for a free worker...',
+            'events': [],
+            'created_at': now,
+            'updated_at': now,
+            'result': None,
+            'error': None,
+            'traceback': None,
+        })
+        _CANCEL_FLAGS[job_id] = threading.Event()
+        self._prune()
+        _EXECUTOR.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable, args, kwargs) -> None:
+        context = JobContext(self, job_id)
+        try:
+            context.check_cancelled()
+            self._update(job_id, status='running', message='Started', event=True)
+            result = fn(context, *args, **kwargs)
+            context.check_cancelled()
+            self._update(job_id, status='done', progress=1.0, message='Finished', result=result, event=True)
+        except JobCancelled:
+            self._update(job_id, status='cancelled', message='Cancelled by dispatcher', event=True)
+        except Exception as e:
+            self._update(job_id, status='failed', message=str(e), error=str(e),
+                         traceback=traceback.format_exc(), event=True)
+        finally:
+            _CANCEL_FLAGS.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Current persisted state of a job (None if unknown)"""
+        job = self._read(job_id)
+        if job and job.get('status') in ACTIVE_STATUSES and job_id not in _CANCEL_FLAGS:
+            # The worker is gone (server restarted) - the job can never finish.
+            # Re-checked under the lock: the worker may have just finished and dropped its flag.
+            self._update(job_id, only_statuses=ACTIVE_STATUSES, status='failed', error='Interrupted by a server restart',
+                         message='Interrupted by a server restart', event=True)
+            job = self._read(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> None:
+        """Request cancellation (takes effect at the job's next checkpoint)"""
+        flag = _CANCEL_FLAGS.get(job_id)
+        # A job that already finished keeps its final status
+        if flag and self._update(job_id, only_statuses=ACTIVE_STATUSES, status='cancelling',
+                                 message='Cancelling...', event=True):
+            flag.set()
+
+    def _prune(self) -> None:
+        """Keep only the most recent job files"""
+        try:
+            files = [os.path.join(self.jobs_dir, n) for n in os.listdir(self.jobs_dir) if n.endswith('.json')]
+        except OSError:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:-MAX_JOB_FILES]:
+            job_id = os.path.basename(path)[:-5]
+            if job_id in _CANCEL_FLAGS:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
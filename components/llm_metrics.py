@@ -0,0 +1,164 @@
+"""
+LLM Metrics - Local sqlite log of Gemini calls (latency, tokens, cost, outcome) per feature
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+
+DEFAULT_DB_PATH = os.path.join('.cache', 'llm_metrics.sqlite')
+
+# Calls older than this are deleted as new ones are recorded
+RETENTION_DAYS = 90
+
+# USD per million (input, output) tokens, for the spend estimate
+MODEL_PRICES = {
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-1.5-flash': (0.075, 0.30),
+}
+
+# Call outcomes
+OUTCOMES = ('ok', 'invalid', 'error', 'timeout', 'unavailable')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    at TEXT NOT NULL,
+    day TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    model TEXT,
+    latency_ms INTEGER NOT NULL,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    retries INTEGER NOT NULL DEFAULT 0,
+    hedged INTEGER NOT NULL DEFAULT 0,
+    streamed INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS llm_calls_day ON llm_calls (day);
+"""
+
+
+def estimate_cost(model: Optional[str], input_tokens: Optional[int], output_tokens: Optional[int]) -> float:
+    """Estimated USD for one call (0 for unknown models or token counts)"""
+    price_in, price_out = MODEL_PRICES.get(model or '', (0.0, 0.0))
+    return ((input_tokens or 0) * price_in + (output_tokens or 0) * price_out) / 1_000_000
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+class LLMMetrics:
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        """
+        Args:
+            db_path: sqlite file (created on first write)
+        """
+        self.db_path = db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(_SCHEMA)
+        return conn
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def record(self, feature: str, model: Optional[str], latency_sec: float, outcome: str,
+               input_tokens: Optional[int] = None, output_tokens: Optional[int] = None,
+               retries: int = 0, hedged: bool = False, streamed: bool = False,
+               error: str = '') -> None:
+        """
+        Log one model call; never raises (metrics must not break a parse or optimization)
+
+        Args:
+            feature: What the call was for ('parse_text', 'parse_image', 'optimize', 'explain', ...)
+            model: Model that answered (or the last one tried when the call failed)
+            latency_sec: Wall time of the whole call, hedges included
+            outcome: One of OUTCOMES
+            input_tokens / output_tokens: From the response usage metadata (None = unknown)
+            retries: Extra model requests made (hedges and replacements for failed requests)
+        """
+        now = datetime.now()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO llm_calls (at, day, feature, model, latency_ms, input_tokens, output_tokens, "
+                    "retries, hedged, streamed, outcome, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (now.strftime('%Y-%m-%d %H:%M:%S'), now.strftime('%Y-%m-%d'), feature or 'other', model,
+                     int(latency_sec * 1000), input_tokens, output_tokens, retries, int(hedged), int(streamed),
+                     outcome, (error or '')[:500]),
+                )
+                oldest = (now - timedelta(days=RETENTION_DAYS)).strftime('%Y-%m-%d')
+                conn.execute("DELETE FROM llm_calls WHERE day < ?", (oldest,))
+        except (sqlite3.Error, OSError):
+            pass
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def calls(self, days: int = 7) -> List[Dict]:
+        """Calls of the last `days` days, newest first"""
+        since = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        try:
+            with self._connect() as conn:
+                rows = conn.execute("SELECT * FROM llm_calls WHERE day >= ? ORDER BY id DESC", (since,)).fetchall()
+        except (sqlite3.Error, OSError):
+            return []
+        calls = []
+        for row in rows:
+            call = dict(row)
+            call['cost_usd'] = estimate_cost(call['model'], call['input_tokens'], call['output_tokens'])
+            calls.append(call)
+        return calls
+
+    @staticmethod
+    def latency_by_feature(calls: List[Dict]) -> List[Dict]:
+        """Calls, success rate and p50/p95 latency of successful calls per feature and model"""
+        groups = {}
+        for call in calls:
+            groups.setdefault((call['feature'], call['model'] or '-'), []).append(call)
+
+        rows = []
+        for (feature, model), group in sorted(groups.items()):
+            latencies = [c['latency_ms'] / 1000 for c in group if c['outcome'] == 'ok']
+            rows.append({
+                'feature': feature,
+                'model': model,
+                'calls': len(group),
+                'ok_pct': round(100 * len(latencies) / len(group)),
+                'p50_sec': percentile(latencies, 50),
+                'p95_sec': percentile(latencies, 95),
+                'retries': sum(c['retries'] for c in group),
+                'hedged': sum(c['hedged'] for c in group),
+            })
+        return rows
+
+    @staticmethod
+    def daily_spend(calls: List[Dict]) -> List[Dict]:
+        """Input/output tokens and estimated USD per day and feature, oldest day first"""
+        days = {}
+        for call in calls:
+            day = days.setdefault((call['day'], call['feature']), {
+                'day': call['day'], 'feature': call['feature'],
+                'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost_usd': 0.0,
+            })
+            day['calls'] += 1
+            day['input_tokens'] += call['input_tokens'] or 0
+            day['output_tokens'] += call['output_tokens'] or 0
+            day['cost_usd'] += call['cost_usd']
+        return [days[key] for key in sorted(days)]
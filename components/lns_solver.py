@@ -0,0 +1,517 @@
+"""
+LNS Solver - Large-neighbourhood search (destroy and repair) for very large days
+
+Routes are plain lists of node numbers backed by flat travel time arrays,
+with per-route service start and latest start arrays, so checking one
+insertion position is O(1) and an iteration never copies order dicts.
+Travel times are taken at the slowest hour of each trip's region, so a
+plan that is on time here stays on time when the simulator re-times it
+with time-of-day speeds (it can only arrive earlier). Each route also keeps a RouteLoad, so insertions fit the vehicle and a
+linked delivery only goes after its pickup on the same route.
+"""
+
+import heapq
+import random
+import time
+from array import array
+from typing import List, Dict, Optional, Callable, Tuple
+from components.route_solver import RouteSolver
+from components.capacity_checker import LoadProfile, RouteLoad
+from components.coverage_index import CoverageIndex
+from components.multi_start import WORKDAY_END_MIN, PROGRESS_INTERVAL_SEC
+from utils.geo import slowest_travel_minutes
+from utils.time_windows import DAY_END_MIN
+
+DEFAULT_TIME_BUDGET_SEC = 60
+
+# Cost of leaving an order unassigned, in drive minutes
+UNASSIGNED_PENALTY = 1000.0
+
+# Nearest orders remembered per order for related removal
+NEIGHBOURS = 30
+
+# Orders removed per iteration
+MIN_REMOVE = 4
+MAX_REMOVE = 30
+
+# Regret insertion looks at the k cheapest routes of each order
+REGRET_K = 3
+
+# Adaptive operator weights: smoothing factor and scores per outcome
+REACTION = 0.2
+SCORE_NEW_BEST = 3.0
+SCORE_IMPROVED = 2.0
+SCORE_ACCEPTED = 1.0
+
+# Record-to-record acceptance: worse solutions within this fraction of the best are kept
+# (shrinks to zero over the time budget)
+START_THRESHOLD = 0.02
+
+# Worst removal picks from the top of the list with this bias (higher = greedier)
+WORST_REMOVAL_BIAS = 3
+
+_INF = float('inf')
+
+
+class LNSOptimizer:
+
+    REMOVALS = ('random', 'related', 'worst')
+
+    def __init__(self, time_budget_sec: float = DEFAULT_TIME_BUDGET_SEC, seed: int = 0,
+                 balance_weight: float = 10.0, max_stops_per_driver: Optional[int] = None,
+                 shift_end_min: Optional[int] = None):
+        """
+        Args:
+            time_budget_sec: Wall-clock budget including setup
+            seed: Random seed
+            balance_weight: Extra minutes charged per existing stop (same meaning as RouteSolver)
+            max_stops_per_driver: Hard cap on stops per route (None = no cap)
+            shift_end_min: Latest finish of the last stop in minutes of the day (None = midnight)
+        """
+        self.time_budget_sec = max(float(time_budget_sec), 1.0)
+        self.rng = random.Random(seed)
+        self.balance_weight = balance_weight
+        self.max_stops_per_driver = max_stops_per_driver
+        self.shift_end_min = DAY_END_MIN if shift_end_min is None else shift_end_min
+        self.solver = RouteSolver(max_stops_per_driver=max_stops_per_driver, balance_weight=balance_weight)
+
+    def optimize(self, orders: List[Dict], drivers: List[Dict],
+                 on_update: Optional[Callable[[Dict], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None) -> Dict:
+        """
+        Construct greedily, then destroy and repair until the time budget is spent
+
+        Args:
+            orders: List of order dicts
+            drivers: Prepared driver dicts
+            on_update: Called with a status dict (elapsed_sec, iterations, improved,
+                best, history, result) about once a second; 'result' holds the best
+                solution when it changed since the previous call
+            should_stop: Polled between iterations; True returns the current best
+
+        Returns:
+            Best result, with a 'search' entry describing the run
+        """
+        started = time.time()
+        deadline = started + self.time_budget_sec
+
+        self._setup(orders, drivers)
+        self._construct()
+
+        best_cost = current_cost = self._total_cost()
+        best = self._snapshot()
+        history = [self._history_entry(time.time() - started, 0)]
+        weights = {name: 1.0 for name in self.REMOVALS}
+        usage = {name: {'used': 0, 'improved': 0} for name in self.REMOVALS}
+        iterations = 0
+        reported = -_INF
+        unpublished = True
+
+        def search_info() -> Dict:
+            return {
+                'mode': 'lns',
+                'orders': self.n,
+                'iterations': iterations,
+                'elapsed_sec': round(time.time() - started, 2),
+                'operators': usage,
+                'history': list(history),
+            }
+
+        def publish() -> None:
+            result = None
+            if unpublished:
+                result = self._render(best)
+                result['search'] = search_info()
+            on_update({
+                'elapsed_sec': time.time() - started,
+                'iterations': iterations,
+                'improved': unpublished,
+                'best': history[-1],
+                'history': list(history),
+                'result': result,
+            })
+
+        while self.n and time.time() < deadline and not (should_stop and should_stop()):
+            iterations += 1
+            saved = self._snapshot()
+
+            removal = self._choose(weights)
+            usage[removal]['used'] += 1
+            removed = getattr(self, f"_remove_{removal}")(self._removal_count())
+            retry = self.rng.sample(sorted(self.pool), min(len(self.pool), MAX_REMOVE))
+            self.pool.difference_update(retry)
+            self._repair(removed + retry)
+
+            cost = self._total_cost()
+            progress = (time.time() - started) / self.time_budget_sec
+            threshold = START_THRESHOLD * max(0.0, 1.0 - progress)
+
+            if cost < best_cost - 1e-6:
+                score = SCORE_NEW_BEST
+                best_cost = current_cost = cost
+                best = self._snapshot()
+                history.append(self._history_entry(time.time() - started, iterations))
+                usage[removal]['improved'] += 1
+                unpublished = True
+            elif cost < current_cost - 1e-6:
+                score = SCORE_IMPROVED
+                current_cost = cost
+            elif cost <= best_cost * (1 + threshold):
+                score = SCORE_ACCEPTED
+                current_cost = cost
+            else:
+                score = 0.0
+                self._restore(saved)
+
+            weights[removal] = max(0.1, (1 - REACTION) * weights[removal] + REACTION * score)
+
+            if on_update and time.time() - started - reported >= PROGRESS_INTERVAL_SEC:
+                reported = time.time() - started
+                publish()
+                unpublished = False
+
+        result = self._render(best)
+        result['search'] = search_info()
+        return result
+
+    # ------------------------------------------------------------------
+    # Problem data
+    # ------------------------------------------------------------------
+
+    def _setup(self, orders: List[Dict], drivers: List[Dict]) -> None:
+        """Flatten orders and drivers into arrays"""
+        simulator = self.solver.simulator
+        index = CoverageIndex.for_drivers(drivers)
+
+        self.states = [simulator.make_driver_state(d) for d in drivers]
+        self.nodes = []
+        self.skipped = []
+        for i, order in enumerate(orders):
+            node = simulator.make_node(i, order)
+            if node['coords'] is None:
+                self.skipped.append((node, 'no_location'))
+                continue
+            node['candidates'] = list(index.candidate_indexes(order))
+            if not node['candidates']:
+                self.skipped.append((node, 'no_coverage'))
+                continue
+            self.nodes.append(node)
+
+        # Linked deliveries can only ride with their pickup
+        pickups = {str(node['order'].get('order_id', '')): node for node in self.nodes if not node['after']}
+        for node in [node for node in self.nodes if node['after']]:
+            pickup = pickups.get(node['after'])
+            if pickup is None:
+                self.nodes.remove(node)
+                self.skipped.append((node, 'precedence'))
+            else:
+                node['candidates'] = list(pickup['candidates'])
+
+        n = self.n = len(self.nodes)
+        position = {id(node): u for u, node in enumerate(self.nodes)}
+        self.pickup_of = [position[id(pickups[node['after']])] if node['after'] else -1 for node in self.nodes]
+        self.dependents: List[List[int]] = [[] for _ in range(n)]
+        for u, pickup in enumerate(self.pickup_of):
+            if pickup >= 0:
+                self.dependents[pickup].append(u)
+        self.ready = [node['window'][0] for node in self.nodes]
+        self.due = [node['window'][1] for node in self.nodes]
+        self.duration = [node['duration'] for node in self.nodes]
+        self.candidates = [node['candidates'] for node in self.nodes]
+        self.start_min = [s['start_min'] for s in self.states]
+        self.capacity = [s['capacity'] for s in self.states]
+
+        # travel[i * n + j]: rush-hour drive minutes from node i (orders, then driver starts) to order j
+        points = [node['coords'] for node in self.nodes] + [s['start_coords'] for s in self.states]
+        self.travel = array('d', (slowest_travel_minutes(a, b) for a in points for b in points[:n]))
+
+        self.neighbours = []
+        for u in range(n):
+            row = self.travel[u * n:(u + 1) * n]
+            nearest = heapq.nsmallest(NEIGHBOURS + 1, range(n), key=row.__getitem__)
+            self.neighbours.append([v for v in nearest if v != u][:NEIGHBOURS])
+
+        m = len(self.states)
+        self.routes: List[List[int]] = [[] for _ in range(m)]
+        self.begin: List[List[float]] = [[] for _ in range(m)]
+        self.latest: List[List[float]] = [[] for _ in range(m)]
+        self.loads = [RouteLoad([]) for _ in range(m)]
+        self.drive = [0.0] * m
+        self.where = [-1] * n
+        self.pool = set()
+
+    def _update_route(self, r: int) -> None:
+        """Recompute service starts, latest feasible starts and drive time of route r"""
+        route = self.routes[r]
+        travel, n = self.travel, self.n
+        prev = n + r
+        clock = self.start_min[r]
+        drive = 0.0
+        begin = []
+        for u in route:
+            leg = travel[prev * n + u]
+            drive += leg
+            clock = max(clock + leg, self.ready[u])
+            begin.append(clock)
+            clock += self.duration[u]
+            prev = u
+            self.where[u] = r
+
+        latest = [0.0] * len(route)
+        nxt = None
+        for i in range(len(route) - 1, -1, -1):
+            u = route[i]
+            if nxt is None:
+                bound = self.shift_end_min - self.duration[u]
+            else:
+                bound = latest[i + 1] - travel[u * n + nxt] - self.duration[u]
+            latest[i] = min(self.due[u], bound)
+            nxt = u
+
+        self.begin[r] = begin
+        self.latest[r] = latest
+        self.loads[r] = RouteLoad([self.nodes[u] for u in route])
+        self.drive[r] = drive
+
+    def _insertion(self, u: int, r: int) -> Optional[Tuple[float, int]]:
+        """Cheapest feasible (cost, position) for order u in route r (time, load and pairs), None if it cannot fit"""
+        route = self.routes[r]
+        size = len(route)
+        if self.max_stops_per_driver and size >= self.max_stops_per_driver:
+            return None
+
+        travel, n = self.travel, self.n
+        begin, latest = self.begin[r], self.latest[r]
+        load, capacity, node = self.loads[r], self.capacity[r], self.nodes[u]
+        ready, due, duration = self.ready[u], self.due[u], self.duration[u]
+        prev = n + r
+        depart = self.start_min[r]
+        best = None
+
+        for p in range(size + 1):
+            to_u = travel[prev * n + u]
+            arrival = depart + to_u
+            if arrival < ready:
+                arrival = ready
+            if arrival > due:
+                # Later positions arrive even later (travel times nearly obey the triangle inequality;
+                # where they do not, a feasible position is skipped, never an infeasible one taken)
+                break
+            if p < size:
+                nxt = route[p]
+                from_u = travel[u * n + nxt]
+                if arrival + duration + from_u <= latest[p]:
+                    delta = to_u + from_u - travel[prev * n + nxt]
+                    if (best is None or delta < best[0]) and LoadProfile.fits(load.after_insert(node, p), capacity):
+                        best = (delta, p)
+                prev = nxt
+                depart = begin[p] + self.duration[nxt]
+            elif arrival + duration <= self.shift_end_min:
+                if (best is None or to_u < best[0]) and LoadProfile.fits(load.after_insert(node, p), capacity):
+                    best = (to_u, p)
+
+        if best is None:
+            return None
+        return best[0] + self.balance_weight * size, best[1]
+
+    def _total_cost(self) -> float:
+        balance = sum(len(route) * (len(route) - 1) / 2 for route in self.routes)
+        return sum(self.drive) + self.balance_weight * balance + UNASSIGNED_PENALTY * len(self.pool)
+
+    def _snapshot(self) -> Tuple:
+        return [list(route) for route in self.routes], set(self.pool)
+
+    def _restore(self, snapshot: Tuple) -> None:
+        routes, pool = snapshot
+        for r, route in enumerate(routes):
+            if route != self.routes[r]:
+                self.routes[r] = list(route)
+                self._update_route(r)
+        for u in pool:
+            self.where[u] = -1
+        self.pool = set(pool)
+
+    # ------------------------------------------------------------------
+    # Construction and repair
+    # ------------------------------------------------------------------
+
+    def _construct(self) -> None:
+        """Greedy cheapest insertion, tightest windows first (linked deliveries after every pickup)"""
+        order = sorted(range(self.n), key=lambda u: (self.pickup_of[u] >= 0, self.due[u] - self.ready[u], self.due[u]))
+        for u in order:
+            best = None
+            for r in self.candidates[u]:
+                option = self._insertion(u, r)
+                if option and (best is None or option[0] < best[0]):
+                    best = (option[0], option[1], r)
+            if best is None:
+                self.pool.add(u)
+                continue
+            self.routes[best[2]].insert(best[1], u)
+            self._update_route(best[2])
+
+    def _repair(self, pending: List[int]) -> None:
+        """Regret-k insertion: place the order that loses most by waiting first"""
+        options = {}
+        for u in pending:
+            options[u] = {}
+            for r in self.candidates[u]:
+                option = self._insertion(u, r)
+                if option:
+                    options[u][r] = option
+
+        while options:
+            chosen, chosen_key = None, None
+            for u, by_route in options.items():
+                if not by_route:
+                    continue
+                costs = sorted(c for c, _ in by_route.values())
+                regret = sum(
+                    (costs[i] if i < len(costs) else costs[0] + UNASSIGNED_PENALTY) - costs[0]
+                    for i in range(1, REGRET_K)
+                )
+                key = (regret, -costs[0])
+                if chosen_key is None or key > chosen_key:
+                    chosen, chosen_key = u, key
+            if chosen is None:
+                break
+
+            by_route = options.pop(chosen)
+            r = min(by_route, key=lambda r: by_route[r][0])
+            self.routes[r].insert(by_route[r][1], chosen)
+            self._update_route(r)
+
+            # Only route r changed, so only its options need a refresh
+            for v, v_options in options.items():
+                if r in v_options or r in self.candidates[v]:
+                    option = self._insertion(v, r)
+                    if option:
+                        v_options[r] = option
+                    else:
+                        v_options.pop(r, None)
+
+        for u in options:
+            self.where[u] = -1
+            self.pool.add(u)
+
+    # ------------------------------------------------------------------
+    # Removal operators
+    # ------------------------------------------------------------------
+
+    def _choose(self, weights: Dict[str, float]) -> str:
+        """Roulette-wheel choice of a removal operator"""
+        pick = self.rng.random() * sum(weights.values())
+        for name, weight in weights.items():
+            pick -= weight
+            if pick <= 0:
+                return name
+        return self.REMOVALS[-1]
+
+    def _removal_count(self) -> int:
+        routed = self.n - len(self.pool)
+        upper = min(MAX_REMOVE, max(MIN_REMOVE, routed // 5), routed)
+        return self.rng.randint(min(MIN_REMOVE, upper), upper) if upper > 0 else 0
+
+    def _take(self, removed: List[int]) -> List[int]:
+        """Pull the given orders (and deliveries linked to them) out of their routes"""
+        removed = list(removed)
+        gone = set(removed)
+        for u in removed:
+            for v in self.dependents[u]:
+                if v not in gone and self.where[v] >= 0:
+                    removed.append(v)
+                    gone.add(v)
+        touched = set()
+        for u in removed:
+            touched.add(self.where[u])
+            self.where[u] = -1
+        for r in touched:
+            self.routes[r] = [u for u in self.routes[r] if u not in gone]
+            self._update_route(r)
+        return removed
+
+    def _routed(self) -> List[int]:
+        return [u for route in self.routes for u in route]
+
+    def _remove_random(self, count: int) -> List[int]:
+        routed = self._routed()
+        return self._take(self.rng.sample(routed, min(count, len(routed))))
+
+    def _remove_related(self, count: int) -> List[int]:
+        """A seed order plus orders near the ones already removed"""
+        routed = self._routed()
+        if not routed:
+            return []
+        removed = [self.rng.choice(routed)]
+        chosen = set(removed)
+        while len(removed) < min(count, len(routed)):
+            anchor = self.rng.choice(removed)
+            nearby = [v for v in self.neighbours[anchor] if v not in chosen and self.where[v] >= 0]
+            u = nearby[0] if nearby else self.rng.choice([v for v in routed if v not in chosen])
+            removed.append(u)
+            chosen.add(u)
+        return self._take(removed)
+
+    def _remove_worst(self, count: int) -> List[int]:
+        """Orders whose detour costs the most, with some randomness"""
+        travel, n = self.travel, self.n
+        gains = []
+        for r, route in enumerate(self.routes):
+            prev = n + r
+            for i, u in enumerate(route):
+                gain = travel[prev * n + u]
+                if i + 1 < len(route):
+                    nxt = route[i + 1]
+                    gain += travel[u * n + nxt] - travel[prev * n + nxt]
+                gains.append((gain, u))
+                prev = u
+        gains.sort(reverse=True)
+
+        removed = []
+        while gains and len(removed) < count:
+            pick = int(len(gains) * self.rng.random() ** WORST_REMOVAL_BIAS)
+            removed.append(gains.pop(pick)[1])
+        return self._take(removed)
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    def _history_entry(self, elapsed: float, iteration: int) -> Dict:
+        """Progress entry with late stops, overtime and drive time as the rendered schedule will show them"""
+        simulator = self.solver.simulator
+        late = 0
+        overtime = 0.0
+        drive = 0.0
+        for state, route in zip(self.states, self.routes):
+            if not route:
+                continue
+            nodes = [self.nodes[u] for u in route]
+            route_late, route_drive, timings = simulator.schedule(state, nodes)
+            late += route_late
+            drive += route_drive
+            overtime += max(0.0, timings[-1]['service_start'] + nodes[-1]['duration'] - WORKDAY_END_MIN)
+        return {
+            'elapsed_sec': round(elapsed, 2),
+            'iteration': iteration,
+            'unassigned': len(self.pool) + len(self.skipped),
+            'late_stops': late,
+            'overtime_min': round(overtime),
+            'drive_min': round(drive),
+        }
+
+    def _render(self, snapshot: Tuple) -> Dict:
+        """Result dict (same shape as RouteSolver.solve) for a snapshot"""
+        routes, pool = snapshot
+        states = [dict(state, route=[self.nodes[u] for u in route]) for state, route in zip(self.states, routes)]
+        unassigned = self.skipped + [(self.nodes[u], self._reason(u, pool)) for u in sorted(pool)]
+        return self.solver._build_result(states, unassigned)
+
+    def _reason(self, u: int, pool: set) -> str:
+        """Unassigned reason code for an order left in the pool"""
+        if self.pickup_of[u] in pool:
+            return 'precedence'
+        alone = LoadProfile([self.nodes[u]]).peak
+        if not any(LoadProfile.fits(alone, self.capacity[r]) for r in self.candidates[u]):
+            return 'vehicle_load'
+        return 'capacity' if self.max_stops_per_driver else 'time_window'
@@ -0,0 +1,306 @@
+"""
+Model Client - Gemini calls with timeouts, hedging, bounded concurrency and a circuit breaker
+
+A call goes to the first available model. If no answer (or, when
+streaming, no first chunk) has arrived by the model's p95 latency, the
+next model is asked as well and the first valid answer wins. A model that
+errors is replaced by the next one right away instead of after the full
+wait. Models that report "not found" or keep failing are skipped for a
+while by every client in the process.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from components.llm_metrics import LLMMetrics
+
+# Models in order of preference
+DEFAULT_MODELS = ('gemini-2.5-flash', 'gemini-1.5-flash')
+
+# Give up on a call after this long
+CALL_TIMEOUT_SEC = 120.0
+
+# Hedge delay until a model has enough recorded latencies for a p95
+DEFAULT_HEDGE_AFTER_SEC = 20.0
+MIN_LATENCY_SAMPLES = 10
+LATENCY_WINDOW = 50
+
+# Model requests in flight across the whole process (hedges included)
+MAX_CONCURRENT_CALLS = 4
+
+# Circuit breaker: consecutive failures that open it, and for how long
+BREAKER_FAILURES = 3
+BREAKER_COOLDOWN_SEC = 60.0
+
+# A model the API says does not exist is skipped for longer
+MODEL_MISSING_COOLDOWN_SEC = 3600.0
+
+# Shared by every client in this server process
+_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_CALLS)
+_LATENCIES: Dict[tuple, deque] = {}
+_BREAKERS: Dict[str, Dict] = {}
+_LOCK = threading.Lock()
+
+
+class ModelUnavailable(Exception):
+    """Every model is failing or has its circuit breaker open"""
+
+
+def _default_factory(name: str):
+    # Imported here so callers with an injected factory never need the Gemini SDK
+    import google.generativeai as genai
+    api_key = os.getenv('GEMINI_API_KEY')
+    if api_key:
+        genai.configure(api_key=api_key)
+    return genai.GenerativeModel(name)
+
+
+def _is_missing_model(error: Exception) -> bool:
+    return "404" in str(error) or "not found" in str(error).lower()
+
+
+class ModelClient:
+
+    def __init__(self, models: Sequence[str] = DEFAULT_MODELS,
+                 model_factory: Optional[Callable[[str], Any]] = None,
+                 timeout_sec: float = CALL_TIMEOUT_SEC,
+                 hedge_after_sec: Optional[float] = None,
+                 metrics: Optional[LLMMetrics] = None):
+        """
+        Args:
+            models: Model names in order of preference
+            model_factory: Builds a model object (with generate_content) from a name;
+                           defaults to genai.GenerativeModel - inject a fake for testing
+            timeout_sec: Seconds before a call fails
+            hedge_after_sec: Fixed hedge delay (default: p95 latency of the model)
+            metrics: Where every call is logged (default: the local LLMMetrics store)
+        """
+        self.models = list(models)
+        self.model_factory = model_factory or _default_factory
+        self.timeout_sec = timeout_sec
+        self.hedge_after_sec = hedge_after_sec
+        self.metrics = metrics or LLMMetrics()
+        self._instances: Dict[str, Any] = {}
+        self.last_call: Dict = {}
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def generate(self, contents: Any, validate: Optional[Callable[[str], Any]] = None,
+                 on_chunk: Optional[Callable[[str], None]] = None, feature: str = 'other') -> str:
+        """
+        Response text of the first model to give a valid answer
+
+        Args:
+            contents: Prompt (text, or a list of parts such as [prompt, image])
+            validate: Raises (e.g. ValueError) if a response text is unusable;
+                      the call then waits for or starts another model
+            on_chunk: Stream the response and call this with each piece of text.
+                      The first model to produce a chunk is kept; the others are dropped
+            feature: Label the call is logged under in LLMMetrics
+
+        Returns:
+            Full response text
+
+        Raises:
+            ModelUnavailable: No model is available, or all of them failed
+            TimeoutError: No valid answer within timeout_sec
+        """
+        started = time.time()
+        call = {'models': [], 'hedged': False, 'outcome': 'error', 'usage': None}
+        self.last_call = call
+        try:
+            text = self._run(call, started, contents, validate, on_chunk)
+            call['outcome'] = 'ok'
+            return text
+        finally:
+            call['latency_sec'] = round(time.time() - started, 2)
+            usage = call.pop('usage')
+            call['input_tokens'] = getattr(usage, 'prompt_token_count', None)
+            call['output_tokens'] = getattr(usage, 'candidates_token_count', None)
+            self.metrics.record(
+                feature, call.get('model') or (call['models'][-1] if call['models'] else None),
+                call['latency_sec'], call['outcome'],
+                input_tokens=call['input_tokens'], output_tokens=call['output_tokens'],
+                retries=max(len(call['models']) - 1, 0), hedged=call['hedged'],
+                streamed=on_chunk is not None, error=call.get('error', ''),
+            )
+
+    def _run(self, call: Dict, started: float, contents: Any, validate: Optional[Callable[[str], Any]],
+             on_chunk: Optional[Callable[[str], None]]) -> str:
+        """Request/hedge/replace loop of generate; fills in the call record"""
+        deadline = started + self.timeout_sec
+        events: queue.Queue = queue.Queue()
+        candidates = [m for m in self.models if self.is_available(m)]
+        if not candidates:
+            call['outcome'] = 'unavailable'
+            raise ModelUnavailable(f"All models are temporarily unavailable: {', '.join(self.models)}")
+
+        streaming = on_chunk is not None
+        pending = set()
+        errors = []
+        winner = None
+        chunks: List[str] = []
+
+        def launch() -> None:
+            model = candidates.pop(0)
+            attempt = len(call['models'])
+            call['models'].append(model)
+            pending.add(attempt)
+            threading.Thread(
+                target=self._attempt, args=(attempt, model, contents, streaming, events), daemon=True
+            ).start()
+
+        launch()
+        while True:
+            now = time.time()
+            if now >= deadline:
+                call.update(outcome='timeout', error=f"timed out after {self.timeout_sec:g}s")
+                raise TimeoutError(f"No model answered within {self.timeout_sec:g}s")
+
+            # Hedge: the only request in flight is slower than usual
+            first_model = call['models'][0]
+            hedge_at = started + self.hedge_delay(first_model, streaming)
+            can_hedge = candidates and len(pending) == 1 and winner is None
+            wait = min(deadline, hedge_at) - now if can_hedge else deadline - now
+            if can_hedge and wait <= 0:
+                call['hedged'] = True
+                launch()
+                continue
+
+            try:
+                kind, attempt, payload = events.get(timeout=max(wait, 0.01))
+            except queue.Empty:
+                continue
+
+            model = call['models'][attempt]
+            if kind == 'chunk':
+                if winner is None:
+                    winner = attempt
+                if attempt == winner:
+                    chunks.append(payload)
+                    on_chunk(payload)
+                continue
+
+            pending.discard(attempt)
+            if winner is not None and attempt != winner:
+                continue
+
+            if kind == 'done':
+                text, usage = payload
+                text = ''.join(chunks) if streaming else text
+                try:
+                    if validate:
+                        validate(text)
+                    call.update(model=model, usage=usage)
+                    return text
+                except Exception as e:
+                    errors.append(f"{model}: invalid response ({str(e)})")
+                    call.update(outcome='invalid', error=errors[-1])
+            else:
+                errors.append(f"{model}: {str(payload)}")
+                call.update(outcome='error', error=errors[-1])
+
+            if winner is not None:
+                # Part of this answer was already streamed to the caller
+                raise ModelUnavailable(f"Streamed response failed - {'; '.join(errors)}")
+
+            # Replace the failed request now rather than waiting for a hedge
+            candidates = [m for m in candidates if self.is_available(m)]
+            if candidates and not pending:
+                launch()
+            elif not pending:
+                raise ModelUnavailable(f"All models failed - {'; '.join(errors)}")
+
+    # ------------------------------------------------------------------
+    # Latency statistics and circuit breaker (process-wide)
+    # ------------------------------------------------------------------
+
+    def hedge_delay(self, model: str, streaming: bool = False) -> float:
+        """Seconds to wait for a model before hedging: its p95 latency, or the default"""
+        if self.hedge_after_sec is not None:
+            return self.hedge_after_sec
+        with _LOCK:
+            samples = sorted(_LATENCIES.get((model, streaming), ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return DEFAULT_HEDGE_AFTER_SEC
+        return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+    @staticmethod
+    def is_available(model: str) -> bool:
+        """False while the model's circuit breaker is open"""
+        with _LOCK:
+            breaker = _BREAKERS.get(model)
+            return not breaker or breaker['open_until'] <= time.time()
+
+    @staticmethod
+    def breaker_status() -> Dict[str, Dict]:
+        """Circuit breaker state by model (consecutive failures, seconds until it closes)"""
+        now = time.time()
+        with _LOCK:
+            return {
+                model: {'failures': b['failures'], 'open_for_sec': max(round(b['open_until'] - now), 0)}
+                for model, b in _BREAKERS.items()
+            }
+
+    @staticmethod
+    def _record_success(model: str, streaming: bool, latency_sec: float) -> None:
+        with _LOCK:
+            _LATENCIES.setdefault((model, streaming), deque(maxlen=LATENCY_WINDOW)).append(latency_sec)
+            _BREAKERS.pop(model, None)
+
+    @staticmethod
+    def _record_failure(model: str, error: Exception) -> None:
+        with _LOCK:
+            breaker = _BREAKERS.setdefault(model, {'failures': 0, 'open_until': 0.0})
+            breaker['failures'] += 1
+            if _is_missing_model(error):
+                breaker['open_until'] = time.time() + MODEL_MISSING_COOLDOWN_SEC
+            elif breaker['failures'] >= BREAKER_FAILURES:
+                breaker['open_until'] = time.time() + BREAKER_COOLDOWN_SEC
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _model(self, name: str):
+        if name not in self._instances:
+            self._instances[name] = self.model_factory(name)
+        return self._instances[name]
+
+    def _attempt(self, attempt: int, model: str, contents: Any, streaming: bool, events: queue.Queue) -> None:
+        """One request on a worker thread; reports ('chunk'|'done'|'error', attempt, payload) events"""
+        with _SLOTS:
+            started = time.time()
+            try:
+                instance = self._model(model)
+                if not streaming:
+                    response = instance.generate_content(contents)
+                    text = response.text
+                    self._record_success(model, False, time.time() - started)
+                    events.put(('done', attempt, (text, getattr(response, 'usage_metadata', None))))
+                    return
+
+                first = True
+                usage = None
+                for chunk in instance.generate_content(contents, stream=True):
+                    # Token counts come with the chunks (complete on the last one)
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk without text parts (e.g. only a finish reason)
+                        continue
+                    if first:
+                        # Streaming calls hedge on time to first chunk
+                        self._record_success(model, True, time.time() - started)
+                        first = False
+                    events.put(('chunk', attempt, text))
+                events.put(('done', attempt, (None, usage)))
+            except Exception as e:
+                self._record_failure(model, e)
+                events.put(('error', attempt, e))
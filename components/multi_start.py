@@ -0,0 +1,167 @@
+"""
+Multi-Start Search - Randomized constructions + local search on every CPU core under a time budget
+"""
+
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional, Callable, Tuple
+from components.route_solver import RouteSolver
+from utils.time_windows import parse_clock
+
+DEFAULT_TIME_BUDGET_SEC = 10
+MAX_TIME_BUDGET_SEC = 120
+
+# Routes finishing after this count as overtime
+WORKDAY_END_MIN = 18 * 60
+
+# Minimum seconds between progress callbacks that carry no improvement
+PROGRESS_INTERVAL_SEC = 1.0
+
+
+def solution_cost(result: Dict) -> Tuple[int, int, int, float]:
+    """
+    Comparable cost of an optimization result (lower is better)
+
+    Returns:
+        (unassigned orders, late stops, overtime minutes, total drive minutes)
+    """
+    late = 0
+    overtime = 0
+    drive = 0.0
+    for route_data in (result.get('routes') or {}).values():
+        late += sum(1 for s in route_data.get('stops', []) if not s.get('time_window_ok', True))
+        summary = route_data.get('summary', {})
+        drive += summary.get('total_drive_time_min', 0) or 0
+        finish = parse_clock(summary.get('estimated_finish', ''))
+        if finish is not None and finish > WORKDAY_END_MIN:
+            overtime += finish - WORKDAY_END_MIN
+    return len(result.get('unassigned_orders') or []), late, overtime, drive
+
+
+def run_start(orders: List[Dict], drivers: List[Dict], seed: int, deadline: float) -> Tuple[Tuple, Dict, int]:
+    """
+    One construction + local search (runs in a worker process)
+
+    Seed 0 is the deterministic solver, so the search never does worse than it.
+    """
+    if seed == 0:
+        solver = RouteSolver()
+    else:
+        rng = random.Random(seed)
+        solver = RouteSolver(balance_weight=rng.uniform(0.0, 20.0), rng=rng)
+    result = solver.solve(orders, drivers, deadline=deadline)
+    return solution_cost(result), result, seed
+
+
+class MultiStartOptimizer:
+
+    def __init__(self, time_budget_sec: float = DEFAULT_TIME_BUDGET_SEC, max_workers: Optional[int] = None):
+        """
+        Args:
+            time_budget_sec: Wall-clock budget shared by all starts
+            max_workers: Worker processes (None = all CPU cores, 1 = run in this process)
+        """
+        self.time_budget_sec = min(max(float(time_budget_sec), 1.0), MAX_TIME_BUDGET_SEC)
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def optimize(self, orders: List[Dict], drivers: List[Dict],
+                 on_update: Optional[Callable[[Dict], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None) -> Dict:
+        """
+        Keep the best of many randomized solutions found within the time budget
+
+        Args:
+            orders: List of order dicts
+            drivers: Prepared driver dicts
+            on_update: Called with a status dict (elapsed_sec, starts, improved,
+                best, history, result) on every improvement and about once a second
+            should_stop: Polled between starts; True ends the search early
+
+        Returns:
+            Best result, with a 'search' entry describing the run and its
+            improvement history
+        """
+        started = time.time()
+        deadline = started + self.time_budget_sec
+        progress = {'best': None, 'starts': 0, 'history': [], 'reported': 0.0}
+
+        def record(cost: Tuple, result: Dict, seed: int) -> None:
+            progress['starts'] += 1
+            elapsed = time.time() - started
+            improved = progress['best'] is None or cost < progress['best'][0]
+            if improved:
+                progress['best'] = (cost, result, seed)
+                progress['history'].append({
+                    'elapsed_sec': round(elapsed, 2),
+                    'start': progress['starts'],
+                    'unassigned': cost[0],
+                    'late_stops': cost[1],
+                    'overtime_min': round(cost[2]),
+                    'drive_min': round(cost[3]),
+                })
+            if on_update and (improved or elapsed - progress['reported'] >= PROGRESS_INTERVAL_SEC):
+                progress['reported'] = elapsed
+                on_update({
+                    'elapsed_sec': elapsed,
+                    'starts': progress['starts'],
+                    'improved': improved,
+                    'best': progress['history'][-1],
+                    'history': list(progress['history']),
+                    'result': progress['best'][1],
+                })
+
+        def stopping() -> bool:
+            return time.time() >= deadline or bool(should_stop and should_stop())
+
+        if self.max_workers <= 1:
+            seed = 0
+            while progress['best'] is None or not stopping():
+                record(*run_start(orders, drivers, seed, deadline))
+                seed += 1
+        else:
+            self._run_parallel(orders, drivers, deadline, record, stopping)
+
+        if progress['best'] is None:
+            return {'routes': {}, 'unassigned_orders': [], 'warnings': ["Search stopped before any solution was found"]}
+
+        cost, result, seed = progress['best']
+        result['search'] = {
+            'mode': 'multistart',
+            'starts': progress['starts'],
+            'workers': self.max_workers,
+            'time_budget_sec': self.time_budget_sec,
+            'elapsed_sec': round(time.time() - started, 2),
+            'best_seed': seed,
+            'history': progress['history'],
+        }
+        return result
+
+    def _run_parallel(self, orders: List[Dict], drivers: List[Dict], deadline: float,
+                      record: Callable, stopping: Callable[[], bool]) -> None:
+        """Keep every worker busy with a new seed until the budget is spent"""
+        pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        next_seed = 0
+        pending = set()
+        try:
+            for _ in range(self.max_workers):
+                pending.add(pool.submit(run_start, orders, drivers, next_seed, deadline))
+                next_seed += 1
+
+            while pending:
+                done, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(*future.result())
+
+                if stopping():
+                    # Cancelled: drop unfinished starts; out of time: let them finish their last pass
+                    if time.time() < deadline:
+                        break
+                    continue
+
+                for _ in done:
+                    pending.add(pool.submit(run_start, orders, drivers, next_seed, deadline))
+                    next_seed += 1
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,138 @@
+"""
+Optimization Jobs - Route optimization tasks that run on the background JobRunner
+"""
+
+from typing import List, Dict, Optional
+from components.job_runner import JobContext
+from components.route_solver import RouteSolver
+from components.route_simulator import RouteSimulator
+from components.capacity_checker import CapacityChecker
+from components.multi_start import MultiStartOptimizer, DEFAULT_TIME_BUDGET_SEC
+from components.anytime_search import AnytimeOptimizer
+from components.lns_solver import LNSOptimizer
+from components.result_cache import ResultCache
+
+
+def run_optimization(job: JobContext, orders: List[Dict], drivers: List[Dict],
+                     settings: Dict, cache_key: Optional[str] = None) -> Dict:
+    """
+    Optimize routes for the given settings, reporting progress on the job
+
+    Args:
+        job: Progress/cancellation handle from JobRunner
+        orders: Snapshot of the orders to route
+        drivers: Prepared driver dicts
+        settings: {'mode': 'ai'|'hybrid'|'multistart'|'anytime'|'lns', 'explain': bool, 'clusters': bool,
+                   'validate': bool, 'time_budget': seconds, 'ai_start': bool}
+        cache_key: Store the result in the ResultCache under this key
+
+    Returns:
+        Optimization result dict (routes, unassigned_orders, warnings)
+    """
+    mode = settings.get('mode', 'ai')
+
+    if mode == 'multistart':
+        budget = settings.get('time_budget', DEFAULT_TIME_BUDGET_SEC)
+        optimizer = MultiStartOptimizer(budget)
+        job.report(0.0, f"🧮 Searching on {optimizer.max_workers} CPU cores for {budget}s...")
+
+        def on_update(status: Dict) -> None:
+            best = status['best']
+            job.report(
+                min(status['elapsed_sec'] / optimizer.time_budget_sec, 0.99),
+                f"🧮 {status['starts']} starts - best: {best['unassigned']} unassigned, {best['drive_min']} min driving",
+                search_history=status['history'],
+            )
+
+        result = optimizer.optimize(orders, drivers, on_update=on_update, should_stop=job.cancelled)
+    elif mode == 'anytime':
+        budget = settings.get('time_budget', DEFAULT_TIME_BUDGET_SEC)
+        initial = None
+        if settings.get('ai_start'):
+            from components.ai_optimizer import AIOptimizer
+            job.report(0.0, "🤖 Getting the Gemini plan to start from...")
+            initial = AIOptimizer().optimize_routes(orders, drivers)
+            job.check_cancelled()
+
+        def on_update(status: Dict) -> None:
+            best = status['best']
+            extra = {'search_history': status['history']}
+            if status['result'] is not None:
+                # Latest best-so-far plan, the dispatcher can accept it at any time
+                extra['best_result'] = status['result']
+            job.report(
+                min(status['elapsed_sec'] / budget, 0.99),
+                f"♾️ {status['iterations']} iterations - best: {best['unassigned']} unassigned, {best['drive_min']} min driving",
+                **extra,
+            )
+
+        result = AnytimeOptimizer(budget).optimize(
+            orders, drivers, initial_result=initial, on_update=on_update, should_stop=job.cancelled
+        )
+    elif mode == 'lns':
+        budget = settings.get('time_budget', DEFAULT_TIME_BUDGET_SEC)
+        job.report(0.0, f"🧱 Building routes for {len(orders)} orders, then searching for {budget}s...")
+
+        def on_update(status: Dict) -> None:
+            best = status['best']
+            extra = {'search_history': status['history']}
+            if status['result'] is not None:
+                extra['best_result'] = status['result']
+            job.report(
+                min(status['elapsed_sec'] / budget, 0.99),
+                f"🧱 {status['iterations']} iterations - best: {best['unassigned']} unassigned, {best['drive_min']} min driving",
+                **extra,
+            )
+
+        result = LNSOptimizer(budget).optimize(orders, drivers, on_update=on_update, should_stop=job.cancelled)
+    elif mode == 'hybrid' and not settings.get('explain', True):
+        job.report(0.1, "⚡ Solving routes locally...")
+        result = RouteSolver().solve(orders, drivers)
+    else:
+        # Imported here so local-only jobs never need the Gemini SDK
+        from components.ai_optimizer import AIOptimizer
+        optimizer = AIOptimizer()
+
+        if mode == 'hybrid':
+            job.report(0.1, "⚡ Solving routes locally, AI is explaining unassigned orders...")
+            result = optimizer.optimize_routes_hybrid(orders, drivers)
+        elif settings.get('clusters'):
+            job.report(0.05, "🧩 Splitting orders into geographic clusters...")
+
+            def on_progress(done: int, total: int) -> None:
+                job.check_cancelled()
+                job.report(0.05 + 0.9 * done / total, f"🧩 {done}/{total} clusters optimized")
+
+            result = optimizer.optimize_routes_clustered(orders, drivers, on_progress=on_progress)
+        else:
+            job.report(0.1, "🤖 AI is optimizing routes... This may take 10-30 seconds...")
+            streamed = {'routes': {}, 'unassigned_orders': []}
+
+            def on_route(name: str, route_data: Dict) -> None:
+                # Routes arrive one by one; show them on the job before the whole answer is in
+                streamed['routes'][name] = route_data
+                placed = sum(len(r.get('stops', [])) for r in streamed['routes'].values())
+                job.report(
+                    0.1 + 0.8 * min(placed / max(len(orders), 1), 1.0),
+                    f"🤖 Received {len(streamed['routes'])} route(s), {placed}/{len(orders)} orders placed...",
+                    streamed_result=streamed,
+                )
+
+            result = optimizer.optimize_routes(orders, drivers, on_route=on_route)
+
+        if mode == 'ai' and settings.get('validate'):
+            job.check_cancelled()
+            job.report(0.95, "🧪 Checking AI routes against local travel times...")
+            RouteSimulator().simulate(result, drivers)
+
+    if mode != 'ai' or settings.get('validate'):
+        job.check_cancelled()
+        job.report(0.97, "📦 Checking vehicle loads...")
+        CapacityChecker().enforce(result, drivers)
+
+    job.check_cancelled()
+
+    if cache_key:
+        ResultCache().put(cache_key, result, settings)
+
+    return result
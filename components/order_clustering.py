@@ -0,0 +1,144 @@
+"""
+Order Clustering - Split a large day into geographic clusters with their own drivers
+"""
+
+import math
+from typing import List, Dict, Tuple
+from components.coverage_index import CoverageIndex
+from utils.geo import DEFAULT_CENTER, lookup_location, resolve_coordinates, haversine_miles
+
+# Orders per cluster that a single Gemini call handles reliably
+DEFAULT_MAX_ORDERS_PER_CLUSTER = 25
+
+
+class OrderClusterer:
+
+    def __init__(self, max_orders_per_cluster: int = DEFAULT_MAX_ORDERS_PER_CLUSTER):
+        self.max_orders_per_cluster = max_orders_per_cluster
+
+    def cluster(self, orders: List[Dict], drivers: List[Dict]) -> List[Dict]:
+        """
+        Partition orders and drivers into independent sub-problems
+
+        Each driver belongs to exactly one cluster, so per-cluster routes can
+        be merged without conflicts. Orders follow the cluster holding most
+        of the drivers that cover them.
+
+        Returns:
+            List of {'orders': [...], 'drivers': [...]} dicts
+        """
+        k = min(len(drivers), math.ceil(len(orders) / self.max_orders_per_cluster)) if orders else 0
+        if k <= 1:
+            return [{'orders': list(orders), 'drivers': list(drivers)}]
+
+        coords = [resolve_coordinates(o) for o in orders]
+        located = [c for c in coords if c]
+        if len(located) < k:
+            return [{'orders': list(orders), 'drivers': list(drivers)}]
+
+        centroids = self._kmeans(located, k)
+        membership = [self._nearest(c, centroids) if c else None for c in coords]
+
+        index = CoverageIndex.for_drivers(drivers)
+        driver_cluster = self._assign_drivers(orders, membership, drivers, centroids, index)
+
+        clusters = [{'orders': [], 'drivers': []} for _ in centroids]
+        for driver, c in zip(drivers, driver_cluster):
+            clusters[c]['drivers'].append(driver)
+
+        for order, c in zip(orders, membership):
+            covering = [driver_cluster[j] for j in index.candidate_indexes(order)]
+            if covering and (c is None or c not in covering):
+                # Move to the cluster holding most of the order's covering drivers
+                c = max(set(covering), key=covering.count)
+            elif c is None:
+                c = max(range(len(clusters)), key=lambda i: len(clusters[i]['drivers']))
+            clusters[c]['orders'].append(order)
+
+        busy = [c for c in clusters if c['orders']]
+        # Drivers left in a cluster without orders help the busiest cluster
+        for idle in (c for c in clusters if not c['orders']):
+            for driver in idle['drivers']:
+                target = max(busy, key=lambda c: len(c['orders']) / max(len(c['drivers']), 1))
+                target['drivers'].append(driver)
+        return busy
+
+    @staticmethod
+    def _nearest(point: Tuple[float, float], centroids: List[Tuple[float, float]]) -> int:
+        """Index of the closest centroid"""
+        return min(range(len(centroids)), key=lambda i: haversine_miles(point[0], point[1], *centroids[i]))
+
+    def _kmeans(self, points: List[Tuple[float, float]], k: int, iterations: int = 20) -> List[Tuple[float, float]]:
+        """Deterministic k-means (farthest-point seeding) on lat/lng"""
+        centroids = [points[0]]
+        while len(centroids) < k:
+            farthest = max(points, key=lambda p: min(haversine_miles(p[0], p[1], *c) for c in centroids))
+            centroids.append(farthest)
+
+        for _ in range(iterations):
+            groups = [[] for _ in centroids]
+            for p in points:
+                groups[self._nearest(p, centroids)].append(p)
+            updated = [
+                (sum(p[0] for p in g) / len(g), sum(p[1] for p in g) / len(g)) if g else centroids[i]
+                for i, g in enumerate(groups)
+            ]
+            if updated == centroids:
+                break
+            centroids = updated
+
+        return centroids
+
+    def _assign_drivers(self, orders: List[Dict], membership: List, drivers: List[Dict],
+                        centroids: List[Tuple[float, float]], index: CoverageIndex) -> List[int]:
+        """
+        Give each cluster drivers in proportion to its order count
+
+        Drivers prefer clusters where they cover the most orders, then the
+        cluster nearest their start location.
+        """
+        k = len(centroids)
+        sizes = [membership.count(i) for i in range(k)]
+        total = sum(sizes) or 1
+        quota = [max(1, round(len(drivers) * s / total)) for s in sizes]
+
+        covered = [[0] * k for _ in drivers]
+        for order, c in zip(orders, membership):
+            if c is not None:
+                for j in index.candidate_indexes(order):
+                    covered[j][c] += 1
+
+        affinity = []
+        for j, driver in enumerate(drivers):
+            start = lookup_location(driver.get('start_location', '')) or DEFAULT_CENTER
+            for i in range(k):
+                distance = haversine_miles(start[0], start[1], *centroids[i])
+                affinity.append((-covered[j][i], distance, j, i))
+        affinity.sort()
+
+        assigned = [None] * len(drivers)
+        filled = [0] * k
+
+        # Every non-empty cluster gets its best driver first
+        for i in sorted(range(k), key=lambda i: -sizes[i]):
+            if sizes[i] == 0:
+                continue
+            for _, _, j, ci in affinity:
+                if ci == i and assigned[j] is None:
+                    assigned[j] = i
+                    filled[i] += 1
+                    break
+
+        for _, _, j, i in affinity:
+            if assigned[j] is None and filled[i] < quota[i]:
+                assigned[j] = i
+                filled[i] += 1
+
+        # Any leftover driver joins the cluster with the most orders per driver
+        for j in range(len(drivers)):
+            if assigned[j] is None:
+                i = max(range(k), key=lambda i: sizes[i] / (filled[i] or 0.5))
+                assigned[j] = i
+                filled[i] += 1
+
+        return assigned
@@ -2,95 +2,211 @@
 Order Input Component - Parse and validate orders from multiple sources
 """
 
-import google.generativeai as genai
 import pandas as pd
 from PIL import Image
 import io
 import os
-from typing import List, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Callable
+from components.prompt_compiler import compact_text, estimate_tokens, IMAGE_TOKENS
+from components.model_client import ModelClient
+from utils.json_extract import parse_partial_json, stream_handler
+from utils.order_text import parse_order_text, split_order_blocks, PICKUP_REF_FIELD
+from components.route_simulator import PICKUP_LINK_FIELD
+from utils.time_windows import (
+    add_window_columns, normalize_order_windows, WINDOW_START_FIELD, WINDOW_END_FIELD
+)
+
+# Compact JSON shape shared by the text and image parsing prompts
+ORDER_SCHEMA = """[{"order_type": "Delivery|Pickup|Exchange", "customer_name": "", "customer_phone": "xxx-xxx-xxxx",
+"address": "street number and name", "city": "", "zip_code": "5 digits", "items": "comma separated",
+"time_window": "e.g. 10:00 AM - 2:00 PM", "special_notes": "gate codes, instructions",
+"pickup_ref": "deliveries only: customer name or order ID of the pickup whose equipment it carries, else \"\""}]"""
+
+# Follow-up requests for the orders after the point where a response was cut off
+MAX_RESUME_REQUESTS = 1
+
+# Order blocks per AI call when a large paste is split up
+BLOCKS_PER_CHUNK = 8
+
+# AI calls in flight for one paste (ModelClient also caps calls process-wide)
+MAX_PARALLEL_CHUNKS = 4
+
+# Extra attempts for a chunk whose AI call failed
+CHUNK_RETRIES = 1
 
 class OrderInput:
     
     def __init__(self):
         """Initialize with Gemini API for text parsing"""
         api_key = os.getenv('GEMINI_API_KEY')
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        else:
-            self.model = None
+        self.client = ModelClient() if api_key else None
+        self.last_prompt_tokens = 0
+        self.last_warnings: List[str] = []
+        self.last_parse_stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
     
-    def parse_text(self, text: str) -> List[Dict]:
-        """Parse order text using AI"""
-        if not self.model:
-            raise ValueError("GEMINI_API_KEY not configured")
-        
-        prompt = f"""
+    @staticmethod
+    def _build_text_prompt(text: str) -> str:
+        """Build the text parsing prompt (pasted text is whitespace-compacted)"""
+        return f"""
 Extract DME delivery/pickup orders from this text.
 
 TEXT:
-{text}
+{compact_text(text)}
 
-Return a JSON array of orders with this EXACT structure (use these specific keys):
-[
-  {{
-    "order_type": "Delivery" or "Pickup" or "Exchange",
-    "customer_name": "Full Name (look for names after 'to' or 'for', use proper capitalization)",
-    "customer_phone": "Phone Number (extract any 10-digit number, format: xxx-xxx-xxxx)",
-    "address": "Street Address (number and street name)",
-    "city": "City Name",
-    "zip_code": "Zip Code (5 digits)",
-    "items": "Comma separated equipment list (e.g., Hospital Bed, Oxygen Concentrator)",
-    "time_window": "Single string combining start and end time (e.g., '10:00 AM - 2:00 PM')",
-    "special_notes": "Any special instructions, gate codes, or delivery notes"
-  }}
-]
+Return a JSON array using EXACTLY these keys:
+{ORDER_SCHEMA}
 
-IMPORTANT:
-- Extract customer name from patterns like "Delivery to [NAME]" or "Pickup for [NAME]"
-- Always include both first and last name when available
-- Format phone as xxx-xxx-xxxx
+RULES:
+- Customer name follows "Delivery to"/"Pickup for"; keep first and last name, proper capitalization
+- Phone: any 10-digit number, formatted xxx-xxx-xxxx
 - Combine time window start/end into one field
-- If a field is missing, use empty string ""
+- pickup_ref only when the text says the delivery takes equipment collected at a pickup
+- Missing field = ""
 
 Return ONLY the JSON array, no other text.
 """
+    
+    @staticmethod
+    def estimate_text_tokens(text: str, use_rules: bool = True) -> int:
+        """Estimated input tokens for parsing this text (before sending); 0 when no AI call is needed"""
+        blocks = parse_order_text(text)['uncertain'] if use_rules else split_order_blocks(text)
+        return sum(
+            estimate_tokens(OrderInput._build_text_prompt('\n\n'.join(blocks[i:i + BLOCKS_PER_CHUNK])))
+            for i in range(0, len(blocks), BLOCKS_PER_CHUNK)
+        )
+    
+    def parse_text(self, text: str, on_order: Optional[Callable[[Dict], None]] = None,
+                   use_rules: bool = True) -> List[Dict]:
+        """
+        Parse order text, locally where the usual templates allow
+        
+        The text is split into order blocks. Blocks the rule parser reads
+        confidently (see utils/order_text) are parsed in microseconds; the
+        rest go to AI in chunks of BLOCKS_PER_CHUNK, parsed concurrently.
+        Orders come back in paste order.
+        
+        Args:
+            text: Pasted order text
+            on_order: Called with each order as soon as it is ready
+            use_rules: False = every block goes to AI
+        """
+        self.last_prompt_tokens = 0
+        self.last_warnings = []
+        
+        if use_rules:
+            parsed = parse_order_text(text)
+        else:
+            blocks = split_order_blocks(text)
+            parsed = {'blocks': [{'text': b, 'order': None, 'confidence': 0.0} for b in blocks],
+                      'uncertain': blocks, 'skipped': []}
+        
+        local = normalize_order_windows([b['order'] for b in parsed['blocks'] if b['order']])
+        self.last_parse_stats = {
+            'local': len(local), 'ai_blocks': len(parsed['uncertain']), 'skipped': len(parsed['skipped'])
+        }
+        if on_order:
+            for order in local:
+                on_order(order)
+        if not parsed['uncertain']:
+            return local
         
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Clean JSON markers
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0]
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0]
-            
-            import json
-            orders = json.loads(result_text.strip())
-            return orders
-            
+            ai_orders = iter(self._parse_blocks_ai(parsed['uncertain'], on_order))
         except Exception as e:
-            # Fallback for Model Name Errors (like 404 for gemini-2.5)
-            if "404" in str(e) or "not found" in str(e).lower():
+            if not local:
+                raise
+            # Keep what was parsed locally
+            self.last_warnings.append(f"{len(parsed['uncertain'])} block(s) could not be parsed: {str(e)}")
+            return local
+        
+        orders = []
+        for block in parsed['blocks']:
+            orders.extend([block['order']] if block['order'] else next(ai_orders))
+        return orders
+    
+    def _parse_blocks_ai(self, blocks: List[str], on_order: Optional[Callable[[Dict], None]] = None) -> List[List[Dict]]:
+        """
+        Parse order blocks with AI, in concurrent chunks
+        
+        Callbacks run on the calling thread: a single chunk is streamed, while
+        several chunks report their orders as each chunk completes.
+        
+        Returns:
+            Orders per block, aligned with blocks (when a chunk's orders cannot
+            be matched to its blocks one-to-one they all go with its first block)
+        
+        Raises:
+            Exception: Every chunk failed
+        """
+        chunks = [blocks[i:i + BLOCKS_PER_CHUNK] for i in range(0, len(blocks), BLOCKS_PER_CHUNK)]
+        if len(chunks) == 1:
+            return self._align(chunks[0], self._parse_chunk(chunks[0], on_order))
+        
+        results: List[List[Dict]] = [[] for _ in chunks]
+        failed = []
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_CHUNKS, len(chunks))) as pool:
+            futures = {pool.submit(self._parse_chunk, chunk): k for k, chunk in enumerate(chunks)}
+            for future in as_completed(futures):
+                k = futures[future]
                 try:
-                    import streamlit as st
-                    st.warning("⚠️ Model 'gemini-2.5-flash' not found. Falling back to 'gemini-1.5-flash'...")
-                    fallback_model = genai.GenerativeModel('gemini-1.5-flash')
-                    response = fallback_model.generate_content(prompt)
-                    # Process fallback response
-                    result_text = response.text.strip()
-                    if '```json' in result_text:
-                         result_text = result_text.split('```json')[1].split('```')[0]
-                    elif '```' in result_text:
-                        result_text = result_text.split('```')[1].split('```')[0]
-                    import json
-                    return json.loads(result_text.strip())
-                except Exception as fallback_error:
-                    raise Exception(f"Fallback failed too: {str(fallback_error)}")
-            
+                    results[k] = future.result()
+                except Exception as e:
+                    first_line = chunks[k][0].splitlines()[0][:40]
+                    failed.append(str(e))
+                    self.last_warnings.append(
+                        f"{len(chunks[k])} order block(s) starting at '{first_line}' could not be parsed: {str(e)}"
+                    )
+                    continue
+                if on_order:
+                    for order in results[k]:
+                        on_order(order)
+        
+        if len(failed) == len(chunks):
+            raise Exception(failed[0])
+        
+        aligned = []
+        for chunk, orders in zip(chunks, results):
+            aligned.extend(self._align(chunk, orders))
+        return aligned
+    
+    def _parse_chunk(self, blocks: List[str], on_order: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """One AI call for a chunk of blocks, retried up to CHUNK_RETRIES times"""
+        for attempt in range(CHUNK_RETRIES + 1):
+            try:
+                # Only the first attempt streams, so a retry does not show orders twice
+                return self._parse_text_ai('\n\n'.join(blocks), on_order if attempt == 0 else None)
+            except Exception:
+                if attempt == CHUNK_RETRIES:
+                    raise
+    
+    @staticmethod
+    def _align(blocks: List[str], orders: List[Dict]) -> List[List[Dict]]:
+        """Orders per block: one each when the counts match, else all with the first block"""
+        if len(orders) == len(blocks):
+            return [[order] for order in orders]
+        return [orders] + [[] for _ in blocks[1:]]
+    
+    def _parse_text_ai(self, text: str, on_order: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """Parse order text with one AI call"""
+        if not self.client:
+            raise ValueError("GEMINI_API_KEY not configured")
+        
+        prompt = self._build_text_prompt(text)
+        self._count_tokens(estimate_tokens(prompt))
+        
+        try:
+            return normalize_order_windows(self._extract_orders([prompt], 'parse_text', on_order=on_order))
+        except Exception as e:
             raise Exception(f"Failed to parse text: {str(e)}")
     
+    def _count_tokens(self, tokens: int) -> None:
+        # Chunks are parsed on several threads
+        with self._lock:
+            self.last_prompt_tokens += tokens
+    
     def parse_file(self, uploaded_file) -> List[Dict]:
         """Parse CSV or Excel file"""
         try:
@@ -102,6 +218,9 @@ Return ONLY the JSON array, no other text.
             else:
                 raise ValueError("Unsupported file type. Use CSV or Excel.")
             
+            # Parse every time window column in one pass
+            df = add_window_columns(df)
+            
             # Convert to list of dicts
             orders = df.to_dict('records')
             
@@ -117,8 +236,16 @@ Return ONLY the JSON array, no other text.
                     'zip_code': str(order.get('zip_code', '')),
                     'items': order.get('items', ''),
                     'time_window': order.get('time_window', ''),
-                    'special_notes': order.get('special_notes', order.get('notes', ''))
+                    WINDOW_START_FIELD: int(order[WINDOW_START_FIELD]),
+                    WINDOW_END_FIELD: int(order[WINDOW_END_FIELD]),
+                    'special_notes': order.get('special_notes', order.get('notes', '')),
+                    # The file's own IDs only serve to link deliveries to pickups (new IDs are assigned on add)
+                    'source_order_id': order.get('order_id', ''),
+                    PICKUP_REF_FIELD: order.get(PICKUP_REF_FIELD, order.get(PICKUP_LINK_FIELD, '')),
                 }
+                for field in ('source_order_id', PICKUP_REF_FIELD):
+                    value = flattened_order[field]
+                    flattened_order[field] = '' if pd.isna(value) else str(value).strip()
                 normalized.append(flattened_order)
             
             return normalized
@@ -126,59 +253,153 @@ Return ONLY the JSON array, no other text.
         except Exception as e:
             raise Exception(f"Failed to parse file: {str(e)}")
 
-    def parse_image(self, uploaded_file) -> List[Dict]:
-        """Parse order data from an image using Gemini Vision"""
-        if not self.model:
+    def parse_image(self, uploaded_file, on_order: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """
+        Parse order data from an image using Gemini Vision
+        
+        Args:
+            uploaded_file: Image file
+            on_order: Stream the response and call this with each order as soon as it is complete
+        """
+        if not self.client:
             raise ValueError("GEMINI_API_KEY not configured")
             
         try:
             # Open the image using Pillow
             image = Image.open(uploaded_file)
             
-            prompt = """
-            Look at this image containing delivery or pickup orders.
-            Extract all order details into a structured JSON format.
-            
-            Return a JSON array of orders with these EXACT field names:
-            - If multiple orders are visible, extract all of them.
-            - If a field is missing, use an empty string "".
-            - Infer 'order_type' as 'Delivery' unless 'Pickup' or 'Exchange' is mentioned.
-            
-            JSON Structure (Use these EXACT keys):
-            [
-              {
-                "order_type": "Delivery" or "Pickup" or "Exchange",
-                "customer_name": "Full Customer Name",
-                "customer_phone": "Phone Number (format xxx-xxx-xxxx)",
-                "address": "Street address",
-                "city": "City name",
-                "zip_code": "5-digit zip code",
-                "items": "Items list comma separated",
-                "time_window": "Combined time window (e.g., '10:00 AM - 2:00 PM')",
-                "special_notes": "Special instructions"
-              }
-            ]
-            
-            Return ONLY the valid JSON array. No markdown code blocks, no extra text.
-            """
+            prompt = f"""
+Extract all DME delivery/pickup orders visible in this image.
+Infer order_type as Delivery unless Pickup or Exchange is mentioned. Missing field = "".
+
+Return a JSON array using EXACTLY these keys:
+{ORDER_SCHEMA}
+
+Return ONLY the valid JSON array. No markdown code blocks, no extra text.
+"""
+            self.last_prompt_tokens = estimate_tokens(prompt) + IMAGE_TOKENS
+            self.last_warnings = []
             
             # Send both prompt and image to the model
-            response = self.model.generate_content([prompt, image])
-            result_text = response.text.strip()
+            orders = self._extract_orders([prompt, image], 'parse_image', on_order=on_order)
+            return normalize_order_windows(orders)
             
-            # Clean JSON markers (Gemini loves markdown)
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0]
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0]
+        except Exception as e:
+            raise Exception(f"Failed to parse image: {str(e)}")
+    
+    def _extract_orders(self, contents: List, feature: str, resumes_left: int = MAX_RESUME_REQUESTS,
+                        on_order: Optional[Callable[[Dict], None]] = None,
+                        seen: Optional[set] = None) -> List[Dict]:
+        """
+        Orders in the model's response, salvaging one that was cut off
+        
+        Complete orders of a cut-off response are kept and the model is asked
+        again (same text or image) for only the orders after them.
+        
+        Args:
+            contents: Prompt parts (prompt text, and the image for image parsing)
+            feature: Label for LLMMetrics ('parse_text' or 'parse_image')
+            resumes_left: Follow-up requests allowed
+            on_order: Stream the response, calling this with each new order as it completes
+            seen: Keys of orders already extracted (not reported to on_order again)
+        
+        Returns:
+            List of raw order dicts
+        """
+        label = feature if resumes_left == MAX_RESUME_REQUESTS else f"{feature}_resume"
+        if on_order is None:
+            result_text = self.client.generate(contents, validate=parse_partial_json, feature=label)
+        else:
+            streamed = set(seen or ())
             
-            import json
-            orders = json.loads(result_text.strip())
-            return orders
+            def on_item(path: List, value) -> None:
+                if isinstance(value, dict) and self._order_key(value) not in streamed:
+                    streamed.add(self._order_key(value))
+                    on_order(normalize_order_windows([value])[0])
             
+            result_text = self.client.generate(contents, validate=parse_partial_json,
+                                               on_chunk=stream_handler(1, on_item), feature=label)
+        orders, complete = parse_partial_json(result_text)
+        
+        if isinstance(orders, dict):
+            # A single order returned without the surrounding array
+            orders = [orders]
+        if not isinstance(orders, list):
+            raise ValueError(f"Expected a JSON array of orders, got {type(orders).__name__}")
+        orders = [o for o in orders if isinstance(o, dict)]
+        
+        if complete:
+            return orders
+        if not orders:
+            raise ValueError("Response was cut off before the first order")
+        if resumes_left <= 0:
+            self.last_warnings.append(f"AI response was cut off after {len(orders)} orders - check for missing orders")
+            return orders
+        
+        seen = {self._order_key(o) for o in orders}
+        follow_up = self._build_resume_prompt(orders)
+        self._count_tokens(estimate_tokens(follow_up))
+        try:
+            rest = self._extract_orders(list(contents) + [follow_up], feature, resumes_left - 1, on_order, seen)
         except Exception as e:
-            # Fallback logic could be added here similar to parse_text if needed
-            raise Exception(f"Failed to parse image: {str(e)}")
+            self.last_warnings.append(f"AI response was cut off after {len(orders)} orders and the follow-up failed: {str(e)}")
+            return orders
+        
+        for order in rest:
+            if self._order_key(order) not in seen:
+                seen.add(self._order_key(order))
+                orders.append(order)
+        return orders
+    
+    @staticmethod
+    def _order_key(order: Dict) -> tuple:
+        return (str(order.get('customer_name', '')).strip().lower(), str(order.get('address', '')).strip().lower())
+    
+    @staticmethod
+    def _build_resume_prompt(orders: List[Dict]) -> str:
+        """Follow-up prompt asking only for the orders after those already extracted"""
+        done = '\n'.join(f"{o.get('customer_name', '')} | {o.get('address', '')}" for o in orders)
+        return f"""
+Your previous answer was cut off. These orders (customer | address) were already extracted:
+{done}
+
+Return ONLY a JSON array of the REMAINING orders, with the same keys. Do not repeat the orders above.
+"""
+    
+    @staticmethod
+    def link_pickups(orders: List[Dict]) -> List[str]:
+        """
+        Turn each order's pickup_ref into a pickup_order_id link
+        
+        A reference is matched against the order_id (or the ID it had in an
+        uploaded file), then the customer name, of the Pickup/Exchange orders
+        in the list; order IDs must already be assigned. Resolved references
+        are removed from the orders.
+        
+        Returns:
+            Warnings for references that match no pickup or several
+        """
+        pickups = [o for o in orders if str(o.get('order_type', '')).strip().lower() in ('pickup', 'exchange')]
+        warnings = []
+        for order in orders:
+            ref = str(order.get(PICKUP_REF_FIELD) or '').strip()
+            if not ref or ref.lower() == 'nan':
+                order.pop(PICKUP_REF_FIELD, None)
+                continue
+            
+            matches = [p for p in pickups if ref in (str(p.get('order_id', '')), str(p.get('source_order_id', '')))]
+            if not matches:
+                name = ' '.join(ref.lower().split())
+                matches = [p for p in pickups
+                           if ' '.join(str(p.get('customer_name', '')).lower().split()) == name and p is not order]
+            
+            if len(matches) == 1:
+                order[PICKUP_LINK_FIELD] = matches[0].get('order_id', '')
+                order.pop(PICKUP_REF_FIELD, None)
+            else:
+                found = "several pickups match" if matches else "no pickup matches"
+                warnings.append(f"{order.get('customer_name', 'Order')}: linked pickup '{ref}' not set ({found})")
+        return warnings
     
     def validate_order(self, order: Dict) -> tuple[bool, str]:
         """Validate a single order"""
@@ -0,0 +1,214 @@
+"""
+Prompt Compiler - Compact, token-minimal encoding of orders and drivers for Gemini
+"""
+
+import re
+from typing import List, Dict, Optional
+from utils.time_windows import (
+    parse_order_window, format_window, DAY_START_MIN, DAY_END_MIN,
+    WINDOW_START_FIELD, WINDOW_END_FIELD
+)
+from components.route_simulator import PICKUP_LINK_FIELD
+from components.route_history import USUAL_DRIVER_FIELD, USUAL_ETA_FIELD
+
+# Rough characters-per-token ratio for Gemini on English/tabular text
+CHARS_PER_TOKEN = 4
+
+# Fixed input token cost Gemini charges for one image
+IMAGE_TOKENS = 258
+
+# Longest special note sent to the model (notes can hold gate codes and constraints)
+MAX_NOTE_CHARS = 80
+
+# Order fields copied back onto stops/unassigned orders from the original order
+ORDER_DETAIL_FIELDS = ['customer_name', 'customer_phone', 'address', 'city', 'zip_code',
+                       'order_type', 'items', 'time_window', WINDOW_START_FIELD, WINDOW_END_FIELD,
+                       'special_notes', PICKUP_LINK_FIELD]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a prompt"""
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def compact_text(text: str) -> str:
+    """Collapse runs of spaces and blank lines in pasted text"""
+    if not text:
+        return ''
+    lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in str(text).splitlines()]
+    compacted = []
+    for line in lines:
+        if line or (compacted and compacted[-1]):
+            compacted.append(line)
+    return '\n'.join(compacted).strip()
+
+
+def _cell(value) -> str:
+    """Single table cell - no pipes or newlines"""
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        value = ', '.join(str(v) for v in value)
+    return re.sub(r'\s+', ' ', str(value).replace('|', '/')).strip()
+
+
+def _window_cell(order: Dict) -> str:
+    """24h 'HH:MM-HH:MM' window, empty when unrestricted"""
+    start, end = parse_order_window(order)
+    if start == DAY_START_MIN and end == DAY_END_MIN:
+        return ''
+    return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+
+class PromptCompiler:
+
+    @staticmethod
+    def compile_orders(orders: List[Dict], driver_ids: Optional[Dict[str, str]] = None) -> Dict:
+        """
+        Encode orders as a pipe table with short ids
+
+        Args:
+            orders: Orders to encode
+            driver_ids: Driver name -> short id, used to note each recurring customer's usual driver
+
+        Returns:
+            Dict with 'table' text and 'ids' mapping short id -> original order
+        """
+        rows = ["id|type|address|city|zip|items|window|notes"]
+        ids = {}
+        # Only orders with an id can be a pickup link target
+        short_ids = {str(order.get('order_id') or '').strip(): f"O{i + 1}"
+                     for i, order in enumerate(orders) if str(order.get('order_id') or '').strip()}
+
+        for i, order in enumerate(orders):
+            short_id = f"O{i + 1}"
+            ids[short_id] = order
+
+            notes = _cell(order.get('special_notes', ''))
+            pickup_id = str(order.get(PICKUP_LINK_FIELD) or '').strip()
+            linked = short_ids.get(pickup_id) if pickup_id else None
+            if linked:
+                notes = f"after {linked}; {notes}" if notes else f"after {linked}"
+            usual = (driver_ids or {}).get(order.get(USUAL_DRIVER_FIELD))
+            if usual:
+                eta = order.get(USUAL_ETA_FIELD)
+                usual = f"usual {usual} ~{eta // 60:02d}:{eta % 60:02d}" if isinstance(eta, int) else f"usual {usual}"
+                notes = f"{usual}; {notes}" if notes else usual
+            if len(notes) > MAX_NOTE_CHARS:
+                notes = notes[:MAX_NOTE_CHARS - 1] + '…'
+
+            rows.append('|'.join([
+                short_id,
+                _cell(order.get('order_type', 'Delivery'))[:1].upper() or 'D',
+                _cell(order.get('address', '')),
+                _cell(order.get('city', '')),
+                _cell(order.get('zip_code', '')),
+                _cell(order.get('items', '')),
+                _window_cell(order),
+                notes,
+            ]))
+
+        return {'table': '\n'.join(rows), 'ids': ids}
+
+    @staticmethod
+    def compile_drivers(drivers: List[Dict]) -> Dict:
+        """
+        Encode drivers as a pipe table, sharing identical coverage definitions
+
+        Returns:
+            Dict with 'coverage' and 'table' text and 'ids' mapping short id -> driver name
+        """
+        coverage_refs = {}
+        coverage_rows = ["ref|areas|cities|zip_prefixes"]
+        rows = ["id|start|from|coverage|vehicle"]
+        ids = {}
+
+        for i, driver in enumerate(drivers):
+            short_id = f"D{i + 1}"
+            ids[short_id] = driver.get('driver_name', short_id)
+
+            coverage = (
+                _cell(driver.get('primary_areas', '')),
+                _cell(driver.get('cities_covered', '')),
+                _cell(driver.get('zip_prefixes', '')),
+            )
+            if any(coverage):
+                if coverage not in coverage_refs:
+                    ref = f"C{len(coverage_refs) + 1}"
+                    coverage_refs[coverage] = ref
+                    coverage_rows.append('|'.join((ref,) + coverage))
+                coverage_ref = coverage_refs[coverage]
+            else:
+                coverage_ref = 'any'
+
+            rows.append('|'.join([
+                short_id,
+                _cell(driver.get('start_time', '')),
+                _cell(driver.get('start_location', '')),
+                coverage_ref,
+                _cell(driver.get('vehicle_type', '')),
+            ]))
+
+        return {
+            'coverage': '\n'.join(coverage_rows) if coverage_refs else '',
+            'table': '\n'.join(rows),
+            'ids': ids,
+        }
+
+    @staticmethod
+    def compile_optimization(orders: List[Dict], drivers: List[Dict]) -> Dict:
+        """Compile both tables for AIOptimizer"""
+        compiled_drivers = PromptCompiler.compile_drivers(drivers)
+        driver_ids = {name: short_id for short_id, name in compiled_drivers['ids'].items()}
+        compiled_orders = PromptCompiler.compile_orders(orders, driver_ids)
+        return {
+            'orders': compiled_orders['table'],
+            'order_ids': compiled_orders['ids'],
+            'coverage': compiled_drivers['coverage'],
+            'drivers': compiled_drivers['table'],
+            'driver_ids': compiled_drivers['ids'],
+        }
+
+    @staticmethod
+    def expand_result(result: Dict, compiled: Dict) -> Dict:
+        """
+        Map short ids in a model result back to drivers and orders
+
+        Restores driver names, real order_ids and the order details the model
+        was not asked to repeat.
+        """
+        order_ids = compiled['order_ids']
+        driver_ids = compiled['driver_ids']
+
+        def restore(entry: Dict) -> Dict:
+            short_id = str(entry.get('order_id', '')).strip()
+            order = order_ids.get(short_id)
+            if order is None:
+                return entry
+            restored = {field: order.get(field, '') for field in ORDER_DETAIL_FIELDS}
+            restored.update({k: v for k, v in entry.items() if k != 'order_id'})
+            restored['order_id'] = order.get('order_id') or short_id
+            if not restored.get('time_window'):
+                restored['time_window'] = PromptCompiler.display_window(order)
+            return restored
+
+        routes = {}
+        for key, route_data in (result.get('routes') or {}).items():
+            if not isinstance(route_data, dict):
+                continue
+            name = driver_ids.get(str(key).strip(), key)
+            route_data['stops'] = [restore(s) if isinstance(s, dict) else s for s in route_data.get('stops', [])]
+            routes[name] = route_data
+        result['routes'] = routes
+
+        result['unassigned_orders'] = [
+            restore(o) if isinstance(o, dict) else o for o in result.get('unassigned_orders', [])
+        ]
+        return result
+
+    @staticmethod
+    def display_window(order: Dict) -> str:
+        """Human readable window for orders that only carry start/end fields"""
+        return format_window(*parse_order_window(order))
@@ -0,0 +1,124 @@
+"""
+Result Cache - Content-addressed, disk-backed memoization of optimization results
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import List, Dict, Optional
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'optimization_results')
+DEFAULT_MAX_ENTRIES = 200
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+# Bump when the result format changes so stale entries are never returned
+CACHE_VERSION = 1
+
+# Order fields that change without changing the routing problem
+VOLATILE_ORDER_FIELDS = {
+    'created_at', 'parsed_at', 'updated_at', 'date', 'status', 'assigned_driver',
+    'route_id', 'stop_number', 'eta', 'archived_date',
+    # Derived from the window text at ingest
+    'window_start_min', 'window_end_min',
+}
+
+
+def _canonical(value) -> str:
+    """Stable JSON text for hashing"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+
+
+class ResultCache:
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(orders: List[Dict], drivers: List[Dict], settings: Dict) -> str:
+        """
+        Content hash of an optimization request
+
+        Order list order and volatile bookkeeping fields (timestamps, status,
+        previous assignment) do not affect the key.
+        """
+        clean_orders = sorted(
+            _canonical({k: v for k, v in o.items() if k not in VOLATILE_ORDER_FIELDS})
+            for o in orders
+        )
+        payload = {
+            'version': CACHE_VERSION,
+            'orders': clean_orders,
+            'drivers': [_canonical(d) for d in drivers],
+            'settings': settings,
+        }
+        return hashlib.sha256(_canonical(payload).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached entry ({'created_at', 'settings', 'result'}) or None; marks it recently used"""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self, key: str, result: Dict, settings: Optional[Dict] = None) -> None:
+        """Store a result, then evict least recently used entries over the caps"""
+        entry = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'settings': settings or {},
+            'result': result,
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._path(key) + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f, default=str)
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+        except (IOError, OSError, PermissionError):
+            # Read-only filesystems (e.g., Streamlit Cloud) just skip caching
+            pass
+
+    def _evict(self) -> None:
+        """Drop oldest-used entries until under max_entries and max_bytes"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """Remove every cached result"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
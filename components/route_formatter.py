@@ -4,6 +4,7 @@ Route Formatter - Format optimized routes for display and export
 
 from typing import Dict
 import urllib.parse
+from utils.time_windows import window_text
 
 class RouteFormatter:
     
@@ -27,7 +28,7 @@ class RouteFormatter:
                 output.append(f"### Stop {stop['stop_number']}: {stop['order_type']}\n")
                 output.append(f"📍 {stop['address']}, {stop['city']}\n")
                 output.append(f"📦 {stop['items']}\n")
-                output.append(f"⏰ ETA: {stop['eta']} (Window: {stop['time_window']})\n")
+                output.append(f"⏰ ETA: {stop['eta']} (Window: {window_text(stop)})\n")
                 if stop.get('special_notes'):
                     output.append(f"⚠️ {stop['special_notes']}\n")
                 output.append("\n")
@@ -63,7 +64,7 @@ Finish: {summary.get('estimated_finish', 'TBD')}
    📍 {stop['address']}
    ⏰ ETA: {stop['eta']}
    📦 Items: {stop['items']}
-   🕐 Window: {stop['time_window']}
+   🕐 Window: {window_text(stop)}
    {f"⚠️ {stop['special_notes']}" if stop.get('special_notes') else ''}
    
    Navigate: {nav_url}
@@ -91,7 +92,7 @@ Finish: {summary.get('estimated_finish', 'TBD')}
                     'City': stop['city'],
                     'Items': stop['items'],
                     'ETA': stop['eta'],
-                    'Window': stop['time_window'],
+                    'Window': window_text(stop),
                     'Notes': stop.get('special_notes', '')
                 })
         
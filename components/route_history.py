@@ -0,0 +1,132 @@
+"""
+Route History - Index of past stops by normalized address, used to warm-start optimization
+
+Recurring customers (oxygen refills, rentals) are usually served by the
+same driver at about the same time each week. The index maps each address
+to its recent visits from ORDERS history; matching orders get a usual
+driver and ETA hint that the local solver favours and the prompt
+mentions, so routes converge faster and stay familiar to drivers.
+"""
+
+from datetime import datetime, timedelta
+from statistics import median
+from typing import List, Dict, Optional
+from components.coverage_index import CoverageIndex
+from utils.geo import normalize_address, normalize_city, extract_zip
+from utils.time_windows import parse_clock
+
+# Order fields holding the warm-start hint
+USUAL_DRIVER_FIELD = 'usual_driver'
+USUAL_ETA_FIELD = 'usual_eta_min'
+
+# Only visits this recent count
+HISTORY_DAYS = 56
+
+# Most recent visits kept per address
+MAX_VISITS_PER_ADDRESS = 8
+
+# Statuses that mean the stop was not actually served by the assigned driver
+SKIPPED_STATUSES = ('failed',)
+
+
+def address_key(order: Dict) -> str:
+    """Normalized street plus ZIP (or city when there is no ZIP); '' when there is no street"""
+    street = normalize_address(order.get('address', ''))
+    if not street:
+        return ''
+    area = str(order.get('zip_code', '')).strip()[:5] or extract_zip(order.get('address', ''))
+    return f"{street}|{area or normalize_city(order.get('city', ''))}"
+
+
+class RouteHistory:
+
+    def __init__(self, rows: List[Dict], today: Optional[str] = None, days: int = HISTORY_DAYS):
+        """
+        Args:
+            rows: ORDERS sheet records (date, address, zip_code, assigned_driver, stop_number, eta, status)
+            today: 'YYYY-MM-DD'; visits on or after this day are ignored (default: today)
+            days: How many days back to look
+        """
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        oldest = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=days)).strftime('%Y-%m-%d')
+        self._visits: Dict[str, List[Dict]] = {}
+
+        for row in rows:
+            day = str(row.get('date', ''))
+            driver = str(row.get('assigned_driver', '')).strip()
+            if not driver or not (oldest <= day < today):
+                continue
+            if str(row.get('status', '')).strip().lower() in SKIPPED_STATUSES:
+                continue
+            key = address_key(row)
+            if not key:
+                continue
+            self._visits.setdefault(key, []).append({
+                'date': day,
+                'driver': driver,
+                'eta_min': parse_clock(str(row.get('eta', ''))),
+            })
+
+        for key, visits in self._visits.items():
+            visits.sort(key=lambda v: v['date'], reverse=True)
+            del visits[MAX_VISITS_PER_ADDRESS:]
+
+    @classmethod
+    def from_database(cls, db, today: Optional[str] = None) -> 'RouteHistory':
+        """Index built from the whole ORDERS sheet (one read)"""
+        return cls(db.get_orders(), today)
+
+    def __len__(self) -> int:
+        return len(self._visits)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def visits(self, order: Dict) -> List[Dict]:
+        """Recent visits to the order's address, newest first"""
+        return self._visits.get(address_key(order), [])
+
+    def hint(self, order: Dict, driver_names: set) -> Optional[Dict]:
+        """
+        Usual driver (among today's drivers) and time for the order's address
+
+        Returns:
+            {'driver', 'eta_min', 'visits'} or None when no selected driver has served it
+        """
+        counts = {}
+        for visit in self.visits(order):
+            if visit['driver'] in driver_names:
+                counts[visit['driver']] = counts.get(visit['driver'], 0) + 1
+        if not counts:
+            return None
+
+        # Most visits wins; ties go to the most recent driver (visits are newest first)
+        driver = max(counts, key=counts.get)
+        etas = [v['eta_min'] for v in self.visits(order) if v['driver'] == driver and v['eta_min'] is not None]
+        return {
+            'driver': driver,
+            'eta_min': int(median(etas)) if etas else None,
+            'visits': counts[driver],
+        }
+
+    def annotate(self, orders: List[Dict], drivers: List[Dict]) -> List[Dict]:
+        """
+        Copies of the orders with usual driver/ETA fields where history has them
+
+        Only drivers selected today who cover the order can be its usual driver.
+
+        Returns:
+            New order dicts (the input orders are not modified)
+        """
+        index = CoverageIndex.for_drivers(drivers)
+        annotated = []
+        for order in orders:
+            order = {k: v for k, v in order.items() if k not in (USUAL_DRIVER_FIELD, USUAL_ETA_FIELD)}
+            hint = self.hint(order, index.candidate_names(order))
+            if hint:
+                order[USUAL_DRIVER_FIELD] = hint['driver']
+                if hint['eta_min'] is not None:
+                    order[USUAL_ETA_FIELD] = hint['eta_min']
+            annotated.append(order)
+        return annotated
@@ -0,0 +1,256 @@
+"""
+Route Replanner - Re-plan the unfinished part of the day after stops are completed or fail
+
+Each driver restarts from their last finished stop at the current time.
+Only unfinished stops are re-sequenced or moved to another covering
+driver; finished stops stay exactly as they were. The result is a proposal
+(a list of changes) for the dispatcher to accept, not a new plan.
+"""
+
+import time
+from typing import List, Dict, Optional, Tuple
+from components.route_solver import RouteSolver
+from components.coverage_index import CoverageIndex
+from components.route_simulator import PICKUP_LINK_FIELD
+from utils.time_windows import parse_clock, format_clock
+
+# Order statuses that take a stop out of the plan
+DONE_STATUSES = ('delivered', 'completed')
+FAILED_STATUSES = ('failed',)
+
+# Local search time per re-plan (the page waits for it)
+REPLAN_TIME_LIMIT_SEC = 2.0
+
+# ETA moves smaller than this are not reported as changes
+ETA_CHANGE_MIN = 10
+
+
+class RouteReplanner:
+
+    def __init__(self, time_limit_sec: float = REPLAN_TIME_LIMIT_SEC):
+        """
+        Args:
+            time_limit_sec: Seconds of local search across drivers
+        """
+        self.time_limit_sec = time_limit_sec
+        self.solver = RouteSolver()
+        self.simulator = self.solver.simulator
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def replan(self, routes: Dict, statuses: Dict[str, str], drivers: List[Dict],
+               now_min: Optional[int] = None, retry_failed: bool = False) -> Dict:
+        """
+        Propose a new plan for the stops that are still to do
+
+        Args:
+            routes: Current routes (driver name -> {'stops': [...], 'summary': {...}})
+            statuses: Latest status by order_id (stops missing here use their own 'status')
+            drivers: Prepared driver dicts (see DriverManager.prepare_for_optimization)
+            now_min: Current time in minutes from midnight (None = each driver's last finished stop)
+            retry_failed: Put failed stops back in the plan instead of leaving them for another day
+
+        Returns:
+            {
+                'routes': full proposed routes (finished stops first, then the new remaining sequence);
+                          every driver that had a route is included, with no stops if all moved away,
+                          so the proposal replaces the current routes as a whole,
+                'changes': one dict per moved, re-sequenced or re-timed stop,
+                'finished': {driver name: number of finished stops},
+                'before': {driver name: remaining stops re-timed from now, current sequence},
+                'summary': late stops and last finish before/after (see summarize),
+                'warnings': [...]
+            }
+        """
+        deadline = time.time() + self.time_limit_sec
+        index = CoverageIndex.for_drivers(drivers)
+        warnings = []
+
+        states = []
+        finished = {}
+        current = {}
+        for k, driver in enumerate(drivers):
+            name = driver.get('driver_name', 'Unknown')
+            route_data = routes.get(name) if isinstance(routes, dict) else None
+            stops = [s for s in (route_data or {}).get('stops', []) if isinstance(s, dict)]
+
+            done, todo = self._split(stops, statuses, retry_failed)
+            state = self._restart_state(driver, done, now_min)
+            for stop in todo:
+                node = self.simulator.make_node(len(state['route']), stop)
+                if node['coords'] is None:
+                    node['coords'] = state['start_coords']
+                node['candidates'] = list(index.candidate_indexes(stop)) or [k]
+                state['route'].append(node)
+
+            for order_id in self._pin_loaded_deliveries(state, done, k):
+                warnings.append(f"{name}: delivery {order_id} is linked to a pickup that failed")
+            states.append(state)
+            finished[name] = done
+            current[name] = {self._order_id(n): i for i, n in enumerate(state['route'])}
+
+        for name in (routes or {}):
+            if name not in finished:
+                warnings.append(f"{name}: not a selected driver - route left unchanged")
+
+        before = {s['driver'].get('driver_name', 'Unknown'): self.simulator.render_route(s)
+                  for s in states if s['route']}
+
+        # Fix lateness first, then shorten each route, then move stops between drivers
+        for state in states:
+            self.simulator.repair(state)
+            self.solver._improve_route(state)
+        self.solver._relocate_between_routes(states, deadline)
+
+        proposed = {}
+        for state in states:
+            name = state['driver'].get('driver_name', 'Unknown')
+            if state['route'] or finished[name] or name in (routes or {}):
+                proposed[name] = self._merge(finished[name], self.simulator.render_route(state))
+
+        return {
+            'routes': proposed,
+            'changes': self._diff(before, proposed, current),
+            'finished': {name: len(done) for name, done in finished.items() if done},
+            'before': before,
+            'summary': self.summarize(before, proposed),
+            'warnings': warnings,
+        }
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _order_id(node: Dict) -> str:
+        return str(node['order'].get('order_id', ''))
+
+    @staticmethod
+    def _split(stops: List[Dict], statuses: Dict[str, str], retry_failed: bool) -> Tuple[List[Dict], List[Dict]]:
+        """(finished stops, stops still to do), each in route order"""
+        done, todo = [], []
+        for stop in stops:
+            status = str(statuses.get(str(stop.get('order_id', ''))) or stop.get('status') or '').strip().lower()
+            if status in DONE_STATUSES or (status in FAILED_STATUSES and not retry_failed):
+                done.append(dict(stop, status=status))
+            else:
+                todo.append(stop)
+        return done, todo
+
+    def _restart_state(self, driver: Dict, done: List[Dict], now_min: Optional[int]) -> Dict:
+        """Driver state starting at the last finished stop, at the current time"""
+        state = self.simulator.make_driver_state(driver)
+        if not done:
+            if now_min is not None:
+                state['start_min'] = max(state['start_min'], now_min)
+            return state
+
+        last = max(done, key=lambda s: int(s.get('stop_number') or 0))
+        node = self.simulator.make_node(0, last)
+        if node['coords'] is not None:
+            state['start_coords'] = node['coords']
+
+        eta = parse_clock(str(last.get('eta', '')))
+        free_at = eta + node['duration'] if eta is not None else state['start_min']
+        state['start_min'] = max(free_at, now_min) if now_min is not None else free_at
+        return state
+
+    @staticmethod
+    def _pin_loaded_deliveries(state: Dict, done: List[Dict], k: int) -> List[str]:
+        """
+        Deliveries whose pickup is done already ride in this van: keep them on it
+
+        Returns:
+            Order ids of deliveries whose linked pickup failed
+        """
+        picked_up = {str(s.get('order_id', '')) for s in done if s.get('status') in DONE_STATUSES}
+        failed = {str(s.get('order_id', '')) for s in done if s.get('status') in FAILED_STATUSES}
+        orphaned = []
+        for node in state['route']:
+            if node['after'] and node['after'] in picked_up:
+                node['after'] = None
+                node['board'] = node['drop']
+                node['candidates'] = [k]
+            elif node['after'] and node['after'] in failed:
+                orphaned.append(str(node['order'].get('order_id', '')))
+        return orphaned
+
+    @staticmethod
+    def _merge(done: List[Dict], rendered: Dict) -> Dict:
+        """Finished stops unchanged, followed by the re-planned stops numbered after them"""
+        stops = list(done)
+        offset = max([int(s.get('stop_number') or 0) for s in done] + [0])
+        for i, stop in enumerate(rendered['stops']):
+            stops.append(dict(stop, stop_number=offset + i + 1))
+
+        summary = dict(rendered['summary'])
+        summary['total_stops'] = len(stops)
+        summary['finished_stops'] = len(done)
+        summary['replanned_from'] = summary.pop('start_time', '')
+        return {'stops': stops, 'summary': summary}
+
+    def _diff(self, before: Dict, proposed: Dict, current: Dict) -> List[Dict]:
+        """Stops whose driver, position among remaining stops or ETA would change"""
+        old_stops = {}
+        for name, route_data in before.items():
+            for position, stop in enumerate(route_data['stops']):
+                old_stops[str(stop['order_id'])] = (name, position, stop)
+
+        changes = []
+        for name, route_data in proposed.items():
+            remaining = [s for s in route_data['stops'] if not s.get('status')]
+            for position, stop in enumerate(remaining):
+                order_id = str(stop['order_id'])
+                if order_id not in old_stops:
+                    continue
+                old_name, old_position, old_stop = old_stops[order_id]
+                old_eta = parse_clock(old_stop['eta'])
+                new_eta = parse_clock(stop['eta'])
+                shift = new_eta - old_eta if old_eta is not None and new_eta is not None else 0
+
+                if old_name != name:
+                    kind = 'reassigned'
+                elif old_position != position:
+                    kind = 'resequenced'
+                elif abs(shift) >= ETA_CHANGE_MIN:
+                    kind = 'retimed'
+                else:
+                    continue
+
+                changes.append({
+                    'order_id': order_id,
+                    'customer_name': stop.get('customer_name', ''),
+                    'change': kind,
+                    'from_driver': old_name,
+                    'to_driver': name,
+                    'from_stop': current.get(old_name, {}).get(order_id, old_position) + 1,
+                    'to_stop': position + 1,
+                    'old_eta': old_stop['eta'],
+                    'new_eta': stop['eta'],
+                    'eta_shift_min': shift,
+                    'time_window_ok': stop.get('time_window_ok', True),
+                    PICKUP_LINK_FIELD: stop.get(PICKUP_LINK_FIELD, ''),
+                })
+
+        return changes
+
+    @staticmethod
+    def summarize(before: Dict, proposed: Dict) -> Dict:
+        """Late stops and last finish of the remaining work, before and after"""
+        def late_and_finish(routes: Dict) -> Tuple[int, str]:
+            late = sum(1 for r in routes.values() for s in r['stops']
+                       if not s.get('status') and not s.get('time_window_ok', True))
+            finishes = [parse_clock(r['summary'].get('estimated_finish', '')) for r in routes.values() if r['stops']]
+            finishes = [f for f in finishes if f is not None]
+            return late, format_clock(max(finishes)) if finishes else ''
+
+        late_before, finish_before = late_and_finish(before)
+        late_after, finish_after = late_and_finish(proposed)
+        return {
+            'late_before': late_before,
+            'late_after': late_after,
+            'finish_before': finish_before,
+            'finish_after': finish_after,
+        }
@@ -0,0 +1,364 @@
+"""
+Route Simulator - Recompute ETAs, waits and time window violations locally, and repair small violations
+"""
+
+from typing import List, Dict, Tuple
+from utils.geo import (
+    DEFAULT_CENTER, CITY_COORDINATES, split_list, lookup_location,
+    resolve_coordinates, road_miles, travel_minutes
+)
+from utils.equipment import order_load, vehicle_capacity
+from utils.time_windows import (
+    parse_clock, format_clock, parse_order_window, format_window,
+    WINDOW_START_FIELD, WINDOW_END_FIELD
+)
+
+# Minutes spent at each stop by order type
+STOP_DURATIONS = {
+    'delivery': 45,
+    'pickup': 30,
+    'exchange': 45,
+    'reload': 20,
+}
+DEFAULT_STOP_DURATION = 45
+
+# Order type of the depot stops added to split a route into several loads
+RELOAD_TYPE = 'Reload'
+
+# Delivery field naming the pickup whose equipment it delivers (same van, same load)
+PICKUP_LINK_FIELD = 'pickup_order_id'
+
+# Repair stops after this many full passes without finding an improving move
+MAX_REPAIR_PASSES = 50
+
+
+class RouteSimulator:
+
+    # ------------------------------------------------------------------
+    # Model
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def make_node(index: int, order: Dict) -> Dict:
+        """Precompute everything the simulator needs about an order or stop"""
+        order_type = str(order.get('order_type', '')).strip().lower()
+        duration = STOP_DURATIONS.get(order_type, DEFAULT_STOP_DURATION)
+        if order.get('stop_duration_min'):
+            try:
+                duration = int(order['stop_duration_min'])
+            except (TypeError, ValueError):
+                pass
+
+        # Deliveries ride out from the depot, pickups ride back; exchanges do both.
+        # A delivery linked to a pickup carries that pickup's equipment, so it is not loaded at the depot.
+        reload = order_type == RELOAD_TYPE.lower()
+        load = (0.0, 0.0) if reload else order_load(order)
+        empty = (0.0, 0.0)
+        drop = empty if order_type == 'pickup' else load
+        after = str(order.get(PICKUP_LINK_FIELD) or '').strip() or None
+
+        return {
+            'index': index,
+            'order': order,
+            'coords': resolve_coordinates(order),
+            'window': parse_order_window(order),
+            'duration': duration,
+            'drop': drop,
+            'pick': load if order_type in ('pickup', 'exchange') else empty,
+            'board': empty if after else drop,
+            'after': after,
+            'reload': reload,
+            'candidates': [],
+        }
+
+    @classmethod
+    def make_reload_node(cls, state: Dict) -> Dict:
+        """Stop at the driver's start location to unload pickups and load the next deliveries"""
+        node = cls.make_node(-1, {
+            'order_id': 'RELOAD',
+            'order_type': RELOAD_TYPE,
+            'customer_name': 'Depot reload',
+            'address': state['driver'].get('start_location', ''),
+            'items': '',
+        })
+        node['coords'] = state['start_coords']
+        return node
+
+    @staticmethod
+    def make_driver_state(driver: Dict) -> Dict:
+        """Start time/location, vehicle capacity and an empty route for a driver"""
+        start_min = parse_clock(driver.get('start_time', ''))
+        if start_min is None:
+            start_min = 9 * 60
+
+        start_coords = lookup_location(driver.get('start_location', ''))
+        if start_coords is None:
+            # Fall back to the middle of the driver's covered cities
+            known = [CITY_COORDINATES[c] for c in split_list(driver.get('cities_covered')) if c in CITY_COORDINATES]
+            if known:
+                start_coords = (sum(c[0] for c in known) / len(known), sum(c[1] for c in known) / len(known))
+            else:
+                start_coords = DEFAULT_CENTER
+
+        return {
+            'driver': driver,
+            'start_min': start_min,
+            'start_coords': start_coords,
+            'capacity': vehicle_capacity(driver),
+            'route': [],
+        }
+
+    def states_from_routes(self, routes: Dict, drivers: List[Dict]) -> Dict[str, Dict]:
+        """Driver states (keyed by name) whose routes hold the existing stops in order"""
+        states = {}
+        for driver in drivers:
+            name = driver.get('driver_name', 'Unknown')
+            state = self.make_driver_state(driver)
+            route_data = routes.get(name, {}) if isinstance(routes, dict) else {}
+            stops = route_data.get('stops', []) if isinstance(route_data, dict) else []
+            for i, stop in enumerate(stops):
+                if not isinstance(stop, dict):
+                    continue
+                node = self.make_node(i, stop)
+                if node['coords'] is None:
+                    node['coords'] = state['start_coords']
+                state['route'].append(node)
+            states[name] = state
+        return states
+
+    # ------------------------------------------------------------------
+    # Simulation
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def schedule(state: Dict, route: List[Dict]) -> Tuple[int, float, List[Dict]]:
+        """
+        Walk a stop sequence from the driver's start
+
+        Returns:
+            (number of late stops, total drive minutes, per-stop timing dicts)
+        """
+        clock = state['start_min']
+        position = state['start_coords']
+        total_drive = 0.0
+        late = 0
+        timings = []
+
+        for node in route:
+            drive = travel_minutes(position, node['coords'], clock)
+            arrival = clock + drive
+            service_start = max(arrival, node['window'][0])
+            late_min = max(0.0, service_start - node['window'][1])
+            late += 1 if late_min > 0 else 0
+
+            timings.append({
+                'drive_min': drive,
+                'miles': road_miles(position, node['coords']),
+                'arrival': arrival,
+                'wait_min': service_start - arrival,
+                'service_start': service_start,
+                'late_min': late_min,
+                'on_time': late_min == 0,
+            })
+
+            total_drive += drive
+            clock = service_start + node['duration']
+            position = node['coords']
+
+        return late, total_drive, timings
+
+    def cost(self, state: Dict, route: List[Dict]) -> Tuple[int, float, float]:
+        """Lexicographic route cost: (late stops, late minutes, drive minutes)"""
+        late, drive, timings = self.schedule(state, route)
+        return late, sum(t['late_min'] for t in timings), drive
+
+    def repair(self, state: Dict) -> bool:
+        """
+        Fix time window violations with local moves (relocate, swap, 2-opt)
+
+        Accepts only moves that lower (late stops, late minutes, drive time)
+        and neither overload the vehicle further nor break more linked
+        pickup/delivery pairs than the route already does.
+
+        Returns:
+            True if the route changed
+        """
+        route = state['route']
+        best = self.cost(state, route)
+        if best[0] == 0 or len(route) < 2:
+            return False
+
+        changed = False
+        load_limit = self._load_state(state, route)
+        for _ in range(MAX_REPAIR_PASSES):
+            move = self._first_improving_move(state, route, best, load_limit)
+            if move is None:
+                break
+            route[:], best = move
+            changed = True
+            if best[0] == 0:
+                break
+
+        return changed
+
+    @staticmethod
+    def _load_state(state: Dict, route: List[Dict]) -> Tuple[int, float]:
+        """(broken linked pairs, overload as a fraction of capacity) of a stop sequence"""
+        # capacity_checker imports this module, so its load model is imported here
+        from components.capacity_checker import LoadProfile, RouteLoad
+        load = RouteLoad(route)
+        return len(load.broken_pairs), LoadProfile.excess(load.peak, state['capacity'])
+
+    def _first_improving_move(self, state: Dict, route: List[Dict], best: Tuple,
+                              load_limit: Tuple[int, float]) -> Tuple:
+        """First (route, cost) found by relocate, swap or 2-opt that beats best within load_limit, else None"""
+        n = len(route)
+
+        def allowed(candidate: List[Dict]) -> bool:
+            broken, excess = self._load_state(state, candidate)
+            return broken <= load_limit[0] and excess <= load_limit[1] + 1e-9
+
+        for i in range(n):
+            for j in range(n):
+                if i == j:
+                    continue
+                candidate = route[:i] + route[i + 1:]
+                candidate.insert(j, route[i])
+                cost = self.cost(state, candidate)
+                if cost < best and allowed(candidate):
+                    return candidate, cost
+
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                candidate = list(route)
+                candidate[i], candidate[j] = candidate[j], candidate[i]
+                cost = self.cost(state, candidate)
+                if cost < best and allowed(candidate):
+                    return candidate, cost
+
+                if j - i >= 2:
+                    candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                    cost = self.cost(state, candidate)
+                    if cost < best and allowed(candidate):
+                        return candidate, cost
+
+        return None
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def window_text(node: Dict) -> str:
+        """Display text for an order's time window"""
+        text = node['order'].get('time_window')
+        return text if text else format_window(*node['window'])
+
+    def build_stop(self, stop_number: int, node: Dict, timing: Dict) -> Dict:
+        """Stop dict in the AI result format"""
+        order = node['order']
+        return {
+            'stop_number': stop_number,
+            'order_id': order.get('order_id') or str(node['index']),
+            'customer_name': order.get('customer_name', ''),
+            'customer_phone': order.get('customer_phone', ''),
+            'address': order.get('address', ''),
+            'city': order.get('city', ''),
+            'zip_code': order.get('zip_code', ''),
+            'order_type': order.get('order_type', 'Delivery'),
+            'items': order.get('items', ''),
+            'time_window': self.window_text(node),
+            WINDOW_START_FIELD: node['window'][0],
+            WINDOW_END_FIELD: node['window'][1],
+            'eta': format_clock(timing['service_start']),
+            'drive_time_from_previous_min': round(timing['drive_min']),
+            'stop_duration_min': node['duration'],
+            'wait_min': round(timing['wait_min']),
+            'late_min': round(timing['late_min']),
+            'time_window_ok': timing['on_time'],
+            'coordinates': {'lat': node['coords'][0], 'lng': node['coords'][1]},
+            'special_notes': order.get('special_notes', ''),
+            PICKUP_LINK_FIELD: order.get(PICKUP_LINK_FIELD, ''),
+        }
+
+    def render_route(self, state: Dict) -> Dict:
+        """Stops and summary for one driver's route"""
+        route = state['route']
+        _, total_drive, timings = self.schedule(state, route)
+        stops = [self.build_stop(i + 1, node, timing) for i, (node, timing) in enumerate(zip(route, timings))]
+        finish = timings[-1]['service_start'] + route[-1]['duration'] if route else state['start_min']
+
+        return {
+            'stops': stops,
+            'summary': {
+                'total_stops': len(stops),
+                'total_distance_miles': round(sum(t['miles'] for t in timings), 1),
+                'total_drive_time_min': round(total_drive),
+                'total_stop_time_min': sum(n['duration'] for n in route),
+                'total_wait_min': round(sum(t['wait_min'] for t in timings)),
+                'start_time': format_clock(state['start_min']),
+                'start_location': state['driver'].get('start_location', ''),
+                'estimated_finish': format_clock(finish),
+            }
+        }
+
+    # ------------------------------------------------------------------
+    # Validation of model output
+    # ------------------------------------------------------------------
+
+    def simulate(self, result: Dict, drivers: List[Dict], repair: bool = True) -> Dict:
+        """
+        Recompute every route of an optimization result locally
+
+        ETAs, waits, time window checks and summaries returned by the model
+        are replaced with locally simulated values; routes with violations are
+        repaired by local moves when possible. Each route gets a 'simulation'
+        report, and remaining violations are added to warnings.
+
+        Args:
+            result: Optimization result (routes, unassigned_orders, warnings)
+            drivers: Prepared driver dicts
+            repair: Try to fix time window violations by re-sequencing
+
+        Returns:
+            The same result dict, updated in place
+        """
+        routes = result.get('routes') or {}
+        warnings = result.setdefault('warnings', [])
+        states = self.states_from_routes(routes, drivers)
+
+        for name, route_data in list(routes.items()):
+            state = states.get(name)
+            if state is None or not isinstance(route_data, dict):
+                warnings.append(f"{name}: not a selected driver - route could not be validated")
+                continue
+            if not state['route']:
+                continue
+
+            model_etas = [parse_clock(s.get('eta', '')) for s in route_data.get('stops', []) if isinstance(s, dict)]
+            late_before = self.cost(state, state['route'])[0]
+            repaired = repair and self.repair(state)
+
+            rendered = self.render_route(state)
+            late_after = sum(1 for s in rendered['stops'] if not s['time_window_ok'])
+
+            # How far the model's ETAs were from the simulation (same sequence only)
+            drift = None
+            if not repaired:
+                diffs = [abs(parse_clock(s['eta']) - m) for s, m in zip(rendered['stops'], model_etas) if m is not None]
+                drift = max(diffs) if diffs else None
+
+            rendered['simulation'] = {
+                'late_stops_before': late_before,
+                'late_stops_after': late_after,
+                'repaired': repaired,
+                'max_eta_drift_min': drift,
+            }
+            routes[name] = rendered
+
+            if repaired:
+                warnings.append(f"{name}: re-sequenced locally to fix {late_before - late_after} time window violation(s)")
+            if late_after:
+                warnings.append(f"{name}: {late_after} stop(s) still miss their time window")
+
+        return result
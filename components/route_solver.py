@@ -0,0 +1,422 @@
+"""
+Route Solver - Deterministic local assignment and sequencing (no AI calls)
+"""
+
+import random
+import time
+from typing import List, Dict, Optional, Tuple
+from components.route_simulator import RouteSimulator
+from components.capacity_checker import CapacityChecker, LoadProfile, RouteLoad, MAX_RELOADS
+from components.coverage_index import CoverageIndex
+from components.route_history import USUAL_DRIVER_FIELD
+from utils.time_windows import parse_clock
+
+# Human readable text for each unassigned reason code
+UNASSIGNED_REASONS = {
+    'no_location': "Could not locate the address (missing or unknown city/ZIP)",
+    'no_coverage': "Outside all selected drivers' coverage areas",
+    'time_window': "Time window cannot be met by any covering driver's schedule",
+    'capacity': "All covering drivers are at their maximum number of stops",
+    'vehicle_load': "Equipment does not fit in any covering driver's vehicle",
+    'precedence': "Its linked pickup is not on any route",
+    'time_budget': "The search ran out of time before a place was found for it",
+}
+
+# Drive minutes a recurring customer's usual driver may cost extra and still get the order
+HISTORY_WEIGHT = 30.0
+
+
+class RouteSolver:
+
+    def __init__(self, max_stops_per_driver: Optional[int] = None, balance_weight: float = 10.0,
+                 rng: Optional[random.Random] = None, history_weight: float = HISTORY_WEIGHT):
+        """
+        Args:
+            max_stops_per_driver: Hard cap on stops per route (None = no cap)
+            balance_weight: Extra minutes charged per existing stop, spreads work across drivers
+            rng: Randomizes the insertion order (for multi-start search); None = deterministic
+            history_weight: Minutes credited for giving an order to its usual driver (see RouteHistory)
+        """
+        self.max_stops_per_driver = max_stops_per_driver
+        self.balance_weight = balance_weight
+        self.history_weight = history_weight
+        self.rng = rng
+        self.simulator = RouteSimulator()
+        self.capacity = CapacityChecker(self.simulator)
+
+    def solve(self, orders: List[Dict], drivers: List[Dict], deadline: Optional[float] = None) -> Dict:
+        """
+        Assign and sequence orders locally
+
+        Args:
+            orders: List of order dicts
+            drivers: Prepared driver dicts (see DriverManager.prepare_for_optimization)
+            deadline: time.time() after which the search wraps up (None = until no improvement).
+                      Orders still to be placed then only try the end of each route,
+                      and route improvement is skipped
+
+        Returns:
+            Dict in the same shape as AIOptimizer.optimize_routes
+            (routes, unassigned_orders, warnings)
+        """
+        nodes = [self.simulator.make_node(i, order) for i, order in enumerate(orders)]
+        states = [self.simulator.make_driver_state(d) for d in drivers]
+        index = CoverageIndex.for_drivers(drivers)
+        usual = {d.get('driver_name', ''): k for k, d in enumerate(drivers)}
+
+        unassigned = []
+        routable = []
+        for node in nodes:
+            if node['coords'] is None:
+                unassigned.append((node, 'no_location'))
+                continue
+            node['candidates'] = list(index.candidate_indexes(node['order']))
+            node['usual'] = usual.get(node['order'].get(USUAL_DRIVER_FIELD))
+            if not node['candidates']:
+                unassigned.append((node, 'no_coverage'))
+                continue
+            routable.append(node)
+
+        # Tightest windows first so they get the best positions
+        if self.rng is None:
+            routable.sort(key=lambda n: (n['window'][1] - n['window'][0], n['window'][1]))
+        else:
+            routable.sort(key=lambda n: (n['window'][1] - n['window'][0]) * self.rng.uniform(0.5, 1.5))
+
+        # Linked deliveries ride with their pickup, so they go in after every pickup is placed
+        routable = [n for n in routable if not n['after']] + [n for n in routable if n['after']]
+        placed = {}
+
+        for node in routable:
+            out_of_time = self._expired(deadline)
+            if node['after']:
+                if node['after'] not in placed:
+                    unassigned.append((node, 'precedence'))
+                    continue
+                node['candidates'] = [placed[node['after']]]
+
+            best = None
+            capped = 0
+            for k in node['candidates']:
+                state = states[k]
+                if self.max_stops_per_driver and len(state['route']) >= self.max_stops_per_driver:
+                    capped += 1
+                    continue
+                insertion = self._best_insertion(state, node, append_only=out_of_time)
+                if insertion:
+                    cost = insertion[1] - self._history_credit(node, k)
+                    if best is None or cost < best[1]:
+                        best = (k, cost, insertion[0])
+
+            if best is None and out_of_time:
+                unassigned.append((node, 'time_budget'))
+                continue
+
+            if best is None:
+                # The van may be full: try going back to the depot for another load first
+                for k in node['candidates']:
+                    if self.max_stops_per_driver and len(states[k]['route']) >= self.max_stops_per_driver:
+                        continue
+                    reloaded = self._best_reload_insertion(states[k], node)
+                    if reloaded and (best is None or reloaded[1] < best[1]):
+                        best = (k, reloaded[1], reloaded[0])
+                if best is not None:
+                    states[best[0]]['route'][:] = best[2]
+                    placed[str(node['order'].get('order_id', ''))] = best[0]
+                    continue
+
+                reason = 'capacity' if capped == len(node['candidates']) else 'time_window'
+                if not any(LoadProfile.fits(LoadProfile([node]).peak, states[k]['capacity']) for k in node['candidates']):
+                    reason = 'vehicle_load'
+                unassigned.append((node, reason))
+                continue
+
+            k, _, position = best
+            states[k]['route'].insert(position, node)
+            placed[str(node['order'].get('order_id', ''))] = k
+
+        for state in states:
+            self._improve_route(state, deadline)
+        self._relocate_between_routes(states, deadline)
+        for state in states:
+            self.capacity.drop_reloads(state)
+
+        return self._build_result(states, unassigned)
+
+    def rebalance(self, result: Dict, drivers: List[Dict]) -> Dict:
+        """
+        Try to place unassigned orders into any driver's existing route
+
+        Used after routes were built separately (e.g. per geographic cluster).
+        Only routes that receive an order are re-timed locally.
+
+        Args:
+            result: Optimization result (routes, unassigned_orders, warnings)
+            drivers: Prepared driver dicts for every driver in the result
+
+        Returns:
+            The same result dict, updated in place
+        """
+        states = self.simulator.states_from_routes(result.get('routes', {}), drivers)
+        index = CoverageIndex.for_drivers(drivers)
+        changed = set()
+        still_unassigned = []
+
+        for entry in result.get('unassigned_orders', []):
+            if not isinstance(entry, dict):
+                still_unassigned.append(entry)
+                continue
+            node = self.simulator.make_node(len(still_unassigned), entry)
+            if node['coords'] is None:
+                still_unassigned.append(entry)
+                continue
+
+            best = self._cheapest_insertion(states, node, index.candidate_names(entry))
+            if best is None:
+                still_unassigned.append(entry)
+                continue
+
+            name, position = best
+            states[name]['route'].insert(position, node)
+            changed.add(name)
+
+        for name in changed:
+            result['routes'][name] = self.simulator.render_route(states[name])
+            result.setdefault('warnings', []).append(f"{name}: route re-timed locally after adding rebalanced orders")
+
+        result['unassigned_orders'] = still_unassigned
+        return result
+
+    def insert_order(self, routes: Dict, order: Dict, drivers: List[Dict]) -> Optional[str]:
+        """
+        Insert one late order at the cheapest position of any driver's route
+
+        Every position in every route is evaluated with locally computed
+        travel times and time windows; covering drivers are preferred, other
+        drivers are only used when no covering driver can take it. Only the
+        chosen driver's route is replaced (stops renumbered, ETAs re-timed).
+
+        Args:
+            routes: Optimized routes dict (driver_name -> {stops, summary}), updated in place
+            order: The new order
+            drivers: Prepared driver dicts
+
+        Returns:
+            Name of the driver that received the order, or None if nothing fits
+        """
+        node = self.simulator.make_node(0, order)
+        if node['coords'] is None:
+            return None
+
+        states = self.simulator.states_from_routes(routes, drivers)
+        best = self._cheapest_insertion(states, node, CoverageIndex.for_drivers(drivers).candidate_names(order))
+        if best is None:
+            best = self._cheapest_insertion(states, node, None)
+        if best is None:
+            return None
+
+        name, position = best
+        states[name]['route'].insert(position, node)
+        routes[name] = self.simulator.render_route(states[name])
+        return name
+
+    def _cheapest_insertion(self, states: Dict[str, Dict], node: Dict,
+                            allowed: Optional[set]) -> Optional[Tuple[str, int]]:
+        """
+        (driver name, position) of the cheapest insertion across drivers
+
+        Args:
+            allowed: Only consider these driver names (None = all drivers)
+        """
+        best = None
+        for name, state in states.items():
+            if allowed is not None and name not in allowed:
+                continue
+            if self.max_stops_per_driver and len(state['route']) >= self.max_stops_per_driver:
+                continue
+            insertion = self._best_insertion(state, node)
+            if insertion and (best is None or insertion[1] < best[2]):
+                best = (name, insertion[0], insertion[1])
+        return (best[0], best[1]) if best else None
+
+    # ------------------------------------------------------------------
+    # Coverage
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def covers(driver: Dict, order: Dict) -> bool:
+        """Whether a driver's coverage areas include the order (no coverage data = covers all)"""
+        return CoverageIndex([driver]).covers(0, order)
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _history_credit(self, node: Dict, k: int) -> float:
+        """Cost credit for routing a recurring customer with their usual driver"""
+        return self.history_weight if node.get('usual') == k else 0.0
+
+    @staticmethod
+    def _expired(deadline: Optional[float]) -> bool:
+        return deadline is not None and time.time() >= deadline
+
+    def _best_insertion(self, state: Dict, node: Dict, append_only: bool = False) -> Optional[Tuple[int, float]]:
+        """
+        Cheapest (position, cost) for a node that makes no stop late, fits the vehicle and keeps linked pairs
+
+        Args:
+            append_only: Only try the end of the route (quick placement once time is up)
+        """
+        route = state['route']
+        base_late, base_drive, _ = self.simulator.schedule(state, route)
+        load = RouteLoad(route)
+        best = None
+
+        for position in range(len(route) if append_only else 0, len(route) + 1):
+            if not LoadProfile.fits(load.after_insert(node, position), state['capacity']):
+                continue
+            candidate = route[:position] + [node] + route[position:]
+            late, drive, _ = self.simulator.schedule(state, candidate)
+            if late > base_late:
+                continue
+            cost = (drive - base_drive) + self.balance_weight * len(route)
+            if best is None or cost < best[1]:
+                best = (position, cost)
+
+        return best
+
+    def _best_reload_insertion(self, state: Dict, node: Dict) -> Optional[Tuple[List[Dict], float]]:
+        """Cheapest (route, cost) with the node placed right after a new depot reload"""
+        route = state['route']
+        if not route or not LoadProfile.fits(LoadProfile([node]).peak, state['capacity']):
+            return None
+        if len(RouteLoad(route).reloads) >= MAX_RELOADS:
+            return None
+
+        base_late, base_drive, _ = self.simulator.schedule(state, route)
+        reload = self.simulator.make_reload_node(state)
+        best = None
+
+        for position in range(1, len(route) + 1):
+            if route[position - 1].get('reload') or (position < len(route) and route[position].get('reload')):
+                continue
+            candidate = route[:position] + [reload, node] + route[position:]
+            load = RouteLoad(candidate)
+            if load.broken_pairs or not LoadProfile.fits(load.peak, state['capacity']):
+                continue
+            late, drive, _ = self.simulator.schedule(state, candidate)
+            if late > base_late:
+                continue
+            cost = (drive - base_drive) + self.balance_weight * len(route)
+            if best is None or cost < best[1]:
+                best = (candidate, cost)
+
+        return best
+
+    def _improve_route(self, state: Dict, deadline: Optional[float] = None) -> None:
+        """Relocate single stops within a route while total drive time drops (or until the deadline)"""
+        route = state['route']
+        if len(route) < 3:
+            return
+
+        best_late, best_drive, _ = self.simulator.schedule(state, route)
+        improved = True
+        while improved:
+            improved = False
+            load = RouteLoad(route)
+            for i in range(len(route)):
+                if self._expired(deadline):
+                    return
+                for j in range(len(route)):
+                    if i == j or not LoadProfile.fits(load.after_relocate(i, j), state['capacity']):
+                        continue
+                    candidate = route[:i] + route[i + 1:]
+                    candidate.insert(j, route[i])
+                    late, drive, _ = self.simulator.schedule(state, candidate)
+                    if late <= best_late and drive < best_drive - 0.01:
+                        route[:] = candidate
+                        best_late, best_drive = late, drive
+                        improved = True
+                        break
+                if improved:
+                    break
+
+    def _relocate_between_routes(self, states: List[Dict], deadline: Optional[float] = None) -> None:
+        """
+        Move single stops to another covering driver while the insertion cost drops
+
+        Uses the same drive time + balance cost as construction and never
+        increases the number of late stops.
+        """
+        improved = True
+        while improved:
+            improved = False
+            for a, source in enumerate(states):
+                route = source['route']
+                load = RouteLoad(route)
+                for i, node in enumerate(route):
+                    if self._expired(deadline):
+                        return
+                    # Reloads and linked pickup/delivery pairs stay on their route
+                    if node['after'] or load.after_remove(i) is None:
+                        continue
+                    base_late, base_drive, _ = self.simulator.schedule(source, route)
+                    without = route[:i] + route[i + 1:]
+                    late, drive, _ = self.simulator.schedule(source, without)
+                    saved = (base_drive - drive) + self.balance_weight * len(without) - self._history_credit(node, a)
+
+                    for b in node['candidates']:
+                        target = states[b]
+                        if b == a or (self.max_stops_per_driver and len(target['route']) >= self.max_stops_per_driver):
+                            continue
+                        insertion = self._best_insertion(target, node)
+                        if insertion is None:
+                            continue
+                        if late <= base_late and insertion[1] - self._history_credit(node, b) < saved - 0.01:
+                            route[:] = without
+                            target['route'].insert(insertion[0], node)
+                            improved = True
+                            break
+                    if improved:
+                        break
+                if improved:
+                    break
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    def _build_result(self, states: List[Dict], unassigned: List[Tuple[Dict, str]]) -> Dict:
+        """Assemble routes, unassigned orders and warnings"""
+        routes = {}
+        warnings = []
+
+        for state in states:
+            if not state['route']:
+                continue
+
+            name = state['driver'].get('driver_name', 'Unknown')
+            routes[name] = self.simulator.render_route(state)
+
+            finish = parse_clock(routes[name]['summary']['estimated_finish'])
+            if finish is not None and finish > 18 * 60:
+                warnings.append(f"{name} finishes late ({routes[name]['summary']['estimated_finish']})")
+
+        unassigned_orders = []
+        for node, reason in sorted(unassigned, key=lambda item: item[0]['index']):
+            # Keep the whole order (phone, notes, window minutes, pickup link): rebalance,
+            # the anytime search and Smart Insert rebuild nodes from these entries
+            order = node['order']
+            unassigned_orders.append(dict(
+                order,
+                order_id=order.get('order_id') or str(node['index']),
+                time_window=self.simulator.window_text(node),
+                reason_code=reason,
+                unassigned_reason=UNASSIGNED_REASONS[reason],
+            ))
+
+        return {
+            'routes': routes,
+            'unassigned_orders': unassigned_orders,
+            'warnings': warnings,
+        }
@@ -0,0 +1,122 @@
+"""
+Scenario Runner - Compare what-if driver sets and start times with the local solver, in parallel
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Optional, Callable
+from components.route_solver import RouteSolver
+from components.driver_manager import DriverManager
+from components.multi_start import WORKDAY_END_MIN
+from utils.time_windows import parse_clock, format_clock
+
+# Scenarios compared at once on the Select Drivers page
+MAX_SCENARIOS = 6
+
+# Local search per scenario stops after this many seconds (construction always completes)
+SCENARIO_TIME_LIMIT_SEC = 3.0
+
+
+def build_scenario(name: str, drivers: List[Dict], config: Dict, start_time: Optional[str] = None) -> Dict:
+    """
+    One what-if scenario
+
+    Args:
+        name: Label shown in the comparison
+        drivers: DRIVERS rows to bring in
+        config: Per-driver configuration from the Select Drivers page
+        start_time: Same start time for every driver (None = each driver's configured time)
+    """
+    prepared = DriverManager.prepare_for_optimization(drivers, config)
+    if start_time:
+        for driver in prepared:
+            driver['start_time'] = start_time
+    return {'name': name, 'drivers': prepared, 'start_time': start_time}
+
+
+def summarize(result: Dict, drivers: List[Dict]) -> Dict:
+    """Comparison metrics of one solved scenario"""
+    routes = result.get('routes') or {}
+    finishes = {}
+    late_stops = 0
+    late_min = 0
+    overtime = 0
+    for name, route_data in routes.items():
+        stops = route_data.get('stops', [])
+        late_stops += sum(1 for s in stops if not s.get('time_window_ok', True))
+        late_min += sum(s.get('late_min', 0) or 0 for s in stops)
+        finish = parse_clock(route_data.get('summary', {}).get('estimated_finish', ''))
+        if finish is not None:
+            finishes[name] = finish
+            overtime += max(0, finish - WORKDAY_END_MIN)
+
+    return {
+        'drivers': len(drivers),
+        'drivers_used': len(routes),
+        'total_miles': round(sum(r.get('summary', {}).get('total_distance_miles', 0) or 0 for r in routes.values()), 1),
+        'total_drive_min': sum(r.get('summary', {}).get('total_drive_time_min', 0) or 0 for r in routes.values()),
+        'latest_finish': format_clock(max(finishes.values())) if finishes else '',
+        'finishes': {name: format_clock(minute) for name, minute in finishes.items()},
+        'late_stops': late_stops,
+        'late_min': late_min,
+        'overtime_min': overtime,
+        'unassigned': len(result.get('unassigned_orders') or []),
+    }
+
+
+def run_scenario(orders: List[Dict], scenario: Dict, time_limit_sec: float = SCENARIO_TIME_LIMIT_SEC) -> Dict:
+    """Solve one scenario with the deterministic local solver (runs in a worker process)"""
+    started = time.time()
+    result = RouteSolver().solve(orders, scenario['drivers'], deadline=started + time_limit_sec)
+    summary = summarize(result, scenario['drivers'])
+    summary['name'] = scenario['name']
+    summary['solve_sec'] = round(time.time() - started, 2)
+    return summary
+
+
+class ScenarioRunner:
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: Worker processes (None = one per CPU core, 1 = run in this process)
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def compare(self, orders: List[Dict], scenarios: List[Dict],
+                on_progress: Optional[Callable[[int, int], None]] = None) -> List[Dict]:
+        """
+        Solve every scenario and return their metrics in scenario order
+
+        Args:
+            orders: Orders to route
+            scenarios: Dicts from build_scenario
+            on_progress: Called with (done, total) as scenarios finish
+
+        Returns:
+            One summary dict per scenario (see summarize), with 'name' and 'solve_sec'
+        """
+        total = len(scenarios)
+        results: List[Optional[Dict]] = [None] * total
+        workers = min(self.max_workers, total)
+
+        if workers <= 1:
+            for i, scenario in enumerate(scenarios):
+                results[i] = run_scenario(orders, scenario)
+                if on_progress:
+                    on_progress(i + 1, total)
+            return results
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_scenario, orders, scenario): i for i, scenario in enumerate(scenarios)}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = {'name': scenarios[i]['name'], 'error': str(e)}
+                if on_progress:
+                    on_progress(done, total)
+
+        return results
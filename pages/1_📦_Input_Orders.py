@@ -13,6 +13,9 @@ from datetime import date
 from components.order_input import OrderInput
 from components.user_session import UserSession
 from utils.validators import validate_order
+from utils.time_windows import normalize_order_window, window_text
+from components.coverage_index import CoverageIndex
+from components.route_simulator import PICKUP_LINK_FIELD
 import pandas as pd
 
 st.set_page_config(page_title="Input Orders", page_icon="📦", layout="wide")
@@ -97,6 +100,28 @@ st.session_state.selected_input_method = selected_method
 
 st.divider()
 
+
+def stream_orders_to(placeholder):
+    """Callback that shows orders in the placeholder as the AI streams them in"""
+    received = []
+    
+    def on_order(order):
+        received.append(order)
+        placeholder.dataframe(
+            [{
+                'Customer': o.get('customer_name', ''),
+                'Address': o.get('address', ''),
+                'City': o.get('city', ''),
+                'Items': o.get('items', ''),
+                'Window': window_text(o),
+            } for o in received],
+            use_container_width=True,
+            hide_index=True,
+        )
+    
+    return on_order
+
+
 # Display selected input method
 if selected_method == "📝 Paste Text":
     st.subheader("Paste Order Text")
@@ -108,6 +133,22 @@ if selected_method == "📝 Paste Text":
         placeholder="Example:\nDelivery to John Smith, 123 Main St, Long Beach, CA 90805\nItems: Hospital Bed, Oxygen Concentrator\nTime: 10 AM - 2 PM"
     )
     
+    use_rules = st.checkbox(
+        "⚡ Parse known formats instantly (AI only for the rest)",
+        value=True,
+        help="Orders written like 'Delivery to NAME, PHONE, ADDRESS / Items: / Time:' are read locally"
+    )
+    
+    if text_input:
+        tokens = OrderInput.estimate_text_tokens(text_input, use_rules)
+        if tokens:
+            st.caption(f"📏 Estimated prompt size: ~{tokens:,} tokens")
+        else:
+            st.caption("⚡ Every order is in a known format - no AI call needed")
+    
+    # Orders appear here as they are extracted
+    live_orders = st.empty()
+    
     col1, col2 = st.columns([1, 3])
     with col1:
         if st.button("🤖 Parse with AI", type="primary", use_container_width=True):
@@ -115,11 +156,11 @@ if selected_method == "📝 Paste Text":
                 try:
                     with st.spinner("Parsing with AI..."):
                         parser = OrderInput()
-                        parsed_orders = parser.parse_text(text_input)
+                        parsed_orders = parser.parse_text(text_input, on_order=stream_orders_to(live_orders), use_rules=use_rules)
                         
                         # Validate and add
                         added = 0
-                        errors = []
+                        errors = list(parser.last_warnings)
                         for order in parsed_orders:
                             is_valid, msg = validate_order(order)
                             if is_valid:
@@ -138,8 +179,12 @@ if selected_method == "📝 Paste Text":
                             else:
                                 errors.append(f"Invalid order: {msg}")
                         
+                        # Deliveries that name a pickup are linked to its order ID
+                        errors.extend(OrderInput.link_pickups(st.session_state.orders))
                         if added > 0:
-                            st.success(f"✅ Added {added} orders!")
+                            stats = parser.last_parse_stats
+                            st.success(f"✅ Added {added} orders! (⚡ {stats.get('local', 0)} parsed locally, "
+                                       f"{stats.get('ai_blocks', 0)} block(s) sent to AI)")
                             # Save to Google Sheets (Unified ORDERS Tab)
                             date_str = today.strftime('%Y-%m-%d')
                             try:
@@ -213,6 +258,8 @@ elif selected_method == "📄 Upload File":
                 progress_bar.empty()
                 status_text.empty()
                 
+                # Deliveries that name a pickup are linked to its order ID
+                errors.extend(OrderInput.link_pickups(st.session_state.orders))
                 if added > 0:
                     st.success(f"✅ Added {added} orders!")
                     # Save to Google Sheets (Unified ORDERS Tab)
@@ -253,11 +300,11 @@ elif selected_method == "📸 Upload Image":
                 try:
                     with st.spinner("Analyzing image... (This relies on Gemini Vision)"):
                         parser = OrderInput()
-                        parsed_orders = parser.parse_image(uploaded_image)
+                        parsed_orders = parser.parse_image(uploaded_image, on_order=stream_orders_to(st.empty()))
                         
                         # Validate and add with progress
                         added = 0
-                        errors = []
+                        errors = list(parser.last_warnings)
                         progress_bar = st.progress(0)
                         
                         total = len(parsed_orders)
@@ -283,6 +330,8 @@ elif selected_method == "📸 Upload Image":
                         
                         progress_bar.empty()
                         
+                        # Deliveries that name a pickup are linked to its order ID
+                        errors.extend(OrderInput.link_pickups(st.session_state.orders))
                         if added > 0:
                             st.success(f"✅ Extracted {added} orders from image!")
                             # Save to Google Sheets (Unified ORDERS Tab)
@@ -326,6 +375,18 @@ elif selected_method == "✍️ Manual Entry":
         with col2:
             time_end = st.text_input("Time Window End (optional)", placeholder="2:00 PM")
         
+        # A delivery can carry equipment collected at one of today's pickups (same van, after the pickup)
+        pickup_options = {"": "None"}
+        for o in st.session_state.get('orders', []):
+            if str(o.get('order_type', '')).lower() in ('pickup', 'exchange') and o.get('order_id'):
+                pickup_options[o['order_id']] = f"{o.get('customer_name', '')} - {o.get('city', '')} ({o['order_id']})"
+        linked_pickup = st.selectbox(
+            "Linked Pickup (optional)",
+            list(pickup_options),
+            format_func=pickup_options.get,
+            help="For a delivery of equipment collected at a pickup today"
+        )
+        
         submitted = st.form_submit_button("➕ Add Order", type="primary", use_container_width=True)
         
         if submitted:
@@ -339,12 +400,15 @@ elif selected_method == "✍️ Manual Entry":
                 'items': items,
                 'time_window_start': time_start,
                 'time_window_end': time_end,
-                'special_notes': special_notes
+                'special_notes': special_notes,
+                PICKUP_LINK_FIELD: linked_pickup if order_type != "Pickup" else ''
             }
             
             is_valid, msg = validate_order(order)
             
             if is_valid:
+                normalize_order_window(order)
+                
                 # Add date to order
                 order['date'] = today.strftime('%Y-%m-%d')
                 from datetime import datetime
@@ -385,13 +449,16 @@ if st.session_state.orders:
     df['status'] = df['status'].fillna('pending')
 
     # Ensure other essential columns exist to prevent display errors
-    essential_cols = ['customer_name', 'customer_phone', 'time_window', 'special_notes', 'order_type', 'zip_code', 'city', 'items', 'address', 'assigned_driver']
+    essential_cols = ['customer_name', 'customer_phone', 'time_window', 'special_notes', 'order_type', 'zip_code', 'city', 'items', 'address', 'assigned_driver', PICKUP_LINK_FIELD]
     for col in essential_cols:
         if col not in df.columns:
             df[col] = ""
         # Clean up 'nan' or None values
         df[col] = df[col].replace('nan', '').fillna('')
     
+    # Orders loaded from the sheet only carry start/end columns
+    df['time_window'] = [window_text(o) for o in st.session_state.orders]
+    
     # Add 'Select' column for checkboxes
     if 'selected_rows' not in st.session_state:
         st.session_state.selected_rows = [False] * len(df)
@@ -426,9 +493,18 @@ if st.session_state.orders:
         driver_names = [d.get('name', '') for d in all_drivers if d.get('name')]
         driver_options = ["Unassigned"] + driver_names
     except Exception as e:
+        all_drivers = []
         driver_options = ["Unassigned"]
         st.warning(f"Could not load drivers: {str(e)}")
 
+    # Coverage check against every active driver (instant, no AI)
+    if all_drivers:
+        pending_orders = [o for o in st.session_state.orders if str(o.get('status', 'pending')).lower() == 'pending']
+        uncovered = CoverageIndex.for_drivers(all_drivers).uncovered(pending_orders)
+        if uncovered:
+            places = ", ".join(sorted({f"{o.get('city', '?')} {o.get('zip_code', '')}".strip() for o in uncovered}))
+            st.warning(f"🗺️ {len(uncovered)} pending order(s) are outside every active driver's coverage: {places}")
+
     # Data Editor with column configurations
     edited_df = st.data_editor(
         df,
@@ -476,12 +552,16 @@ if st.session_state.orders:
             "date": None,
             "selected": None, # Hide duplicate boolean column if exists
             "original_text": None,
-            "order_id": None
+            "order_id": None,
+            PICKUP_LINK_FIELD: st.column_config.TextColumn(
+                "🔗 Linked Pickup",
+                help="Order ID of the pickup whose equipment this delivery carries"
+            ),
         },
         column_order=[
             "Selected", "status", "assigned_driver", "parsed_at", "order_type", 
             "customer_name", "customer_phone", "address", "city", "zip_code", 
-            "items", "time_window", "special_notes"
+            "items", "time_window", "special_notes", PICKUP_LINK_FIELD
         ],
         disabled=[c for c in df.columns if c not in ["Selected", "status", "assigned_driver"]], # Allow editing driver assignment
         hide_index=True,
@@ -8,9 +8,12 @@ import os
 # Add project root to path for proper imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import time
 import streamlit as st
 import pandas as pd
 from components.database import Database
+from components.scenario_runner import ScenarioRunner, build_scenario, MAX_SCENARIOS
+from utils.validators import validate_time_format
 from components.session_manager import SessionManager
 from components.user_session import UserSession
 
@@ -146,6 +149,93 @@ if all_drivers:
              if st.button("🤖 Optimize Routes →", type="primary", use_container_width=True):
                 st.switch_page("pages/3_🤖_Optimize_Routes.py")
 
+    # 3. What-if comparison (local solver, no Gemini calls)
+    with st.expander("🔮 What-if: Compare Driver Sets"):
+        st.caption("Solve several driver sets and start times locally in parallel and compare them before committing to one")
+
+        scenario_count = st.number_input("Scenarios", min_value=2, max_value=MAX_SCENARIOS, value=2, key="scenario_count")
+        scenarios = []
+        scenario_names = {}
+        for i in range(int(scenario_count)):
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                names = st.multiselect(
+                    f"Scenario {i + 1} drivers",
+                    options=driver_names,
+                    default=selected_names,
+                    key=f"scenario_drivers_{i}"
+                )
+            with col2:
+                start_override = st.text_input(
+                    "Start time (all drivers)",
+                    value="",
+                    placeholder="As configured",
+                    key=f"scenario_start_{i}"
+                ).strip()
+
+            if start_override and not validate_time_format(start_override):
+                st.error(f"❌ Scenario {i + 1}: invalid start time '{start_override}'")
+                continue
+            if names:
+                label = f"#{i + 1}: {len(names)} driver(s)" + (f" from {start_override}" if start_override else "")
+                scenario_drivers = [d for d in all_drivers if d.get('driver_name') in names]
+                scenarios.append(build_scenario(label, scenario_drivers, st.session_state.driver_config, start_override or None))
+                scenario_names[label] = (names, start_override)
+
+        if st.button("🔮 Compare Scenarios", use_container_width=True, disabled=not scenarios):
+            progress = st.progress(0.0, text="Solving scenarios...")
+            started = time.time()
+            rows = ScenarioRunner().compare(
+                st.session_state.orders_for_routing,
+                scenarios,
+                on_progress=lambda done, total: progress.progress(done / total, text=f"{done}/{total} scenarios solved")
+            )
+            st.session_state.scenario_results = {
+                'rows': rows,
+                'scenarios': scenario_names,
+                'elapsed_sec': round(time.time() - started, 1),
+            }
+
+        comparison = st.session_state.get('scenario_results')
+        if comparison:
+            table = []
+            for row in comparison['rows']:
+                if 'error' in row:
+                    table.append({'Scenario': row['name'], 'Unassigned': None, 'Error': row['error']})
+                    continue
+                table.append({
+                    'Scenario': row['name'],
+                    'Drivers used': f"{row['drivers_used']}/{row['drivers']}",
+                    'Unassigned': row['unassigned'],
+                    'Miles': row['total_miles'],
+                    'Drive (min)': row['total_drive_min'],
+                    'Latest finish': row['latest_finish'],
+                    'Late stops': row['late_stops'],
+                    'Overtime (min)': row['overtime_min'],
+                    'Finish by driver': ', '.join(f"{n.split()[0]} {t}" for n, t in row['finishes'].items()),
+                })
+            st.dataframe(table, use_container_width=True, hide_index=True)
+            st.caption(f"⚡ {len(comparison['rows'])} scenarios compared in {comparison['elapsed_sec']}s")
+
+            choices = [r['name'] for r in comparison['rows'] if 'error' not in r and r['name'] in comparison['scenarios']]
+            if choices:
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    chosen = st.selectbox("Scenario to use", choices, key="scenario_choice")
+                with col2:
+                    st.write("")
+                    if st.button("✅ Use This Driver Set", use_container_width=True):
+                        names, start_override = comparison['scenarios'][chosen]
+                        st.session_state.selected_drivers = [d for d in all_drivers if d.get('driver_name') in names]
+                        if start_override:
+                            for d in st.session_state.selected_drivers:
+                                conf = st.session_state.driver_config.setdefault(d.get('driver_id', ''), {})
+                                conf['start_time'] = start_override
+                                # Text inputs keep their own state; reset so the new time shows
+                                st.session_state.pop(f"time_{d.get('driver_id', '')}", None)
+                        SessionManager.save_state()
+                        st.rerun()
+
 else:
     st.warning("No active drivers found. Please add drivers in the database.")
 
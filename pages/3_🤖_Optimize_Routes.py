@@ -5,14 +5,22 @@ Use AI to optimize routes and assign orders to drivers
 
 import sys
 import os
+import time
 # Add project root to path for proper imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
 from datetime import date
 from components.ai_optimizer import AIOptimizer
+from components.route_solver import RouteSolver
+from components.order_clustering import DEFAULT_MAX_ORDERS_PER_CLUSTER
+from components.result_cache import ResultCache
+from components.job_runner import JobRunner, ACTIVE_STATUSES
+from components.optimization_jobs import run_optimization
+from components.multi_start import DEFAULT_TIME_BUDGET_SEC, MAX_TIME_BUDGET_SEC
 from components.driver_manager import DriverManager
 from components.route_formatter import RouteFormatter
+from components.route_history import RouteHistory, USUAL_DRIVER_FIELD
 from components.database import Database
 from components.user_session import UserSession
 import os
@@ -123,115 +131,380 @@ with st.expander("📋 Driver Configuration"):
 
 st.divider()
 
-# Optimize button
-if st.button("🚀 Run AI Optimization", type="primary", use_container_width=True):
+# Optimization mode
+OPTIMIZATION_MODES = {
+    "🤖 Full AI (Gemini)": 'ai',
+    "⚡ Hybrid (Local Solver + AI)": 'hybrid',
+    "🧮 Multi-start (Local, all CPU cores)": 'multistart',
+    "♾️ Anytime (Live best-so-far)": 'anytime',
+    "🧱 LNS (Large days, 300+ orders)": 'lns',
+}
+SEARCH_MODES = ('multistart', 'anytime', 'lns')
+optimization_mode = st.radio(
+    "Optimization Mode",
+    list(OPTIMIZATION_MODES),
+    horizontal=True,
+    key="optimization_mode",
+    help="Hybrid builds assignments and stop order locally (well under a second for a typical day of up to ~60 orders, longer on big days); AI only explains unassigned orders"
+)
+mode_key = OPTIMIZATION_MODES[optimization_mode]
+is_hybrid = mode_key == 'hybrid'
+is_full_ai = mode_key == 'ai'
+if len(orders_to_route) >= 300 and mode_key != 'lns':
+    st.caption(f"💡 {len(orders_to_route)} orders - 🧱 LNS is built for days this large")
+
+use_ai_explanations = True
+if is_hybrid:
+    use_ai_explanations = st.checkbox(
+        "🧠 Use AI to explain unassigned orders",
+        value=True,
+        key="use_ai_explanations",
+        help="Turn off to skip Gemini entirely"
+    )
+
+time_budget = DEFAULT_TIME_BUDGET_SEC
+if mode_key in SEARCH_MODES:
+    time_budget = st.slider(
+        "⏱️ Time budget (seconds)",
+        min_value=2,
+        max_value=MAX_TIME_BUDGET_SEC,
+        value=DEFAULT_TIME_BUDGET_SEC,
+        key="time_budget",
+        help="Longer budgets search more; the best solution found is kept"
+    )
+
+ai_start = False
+if mode_key == 'anytime':
+    ai_start = st.checkbox(
+        "🤖 Start from the Gemini plan",
+        value=False,
+        key="anytime_ai_start",
+        help="Off = start from an instant local plan; you can accept the current best at any time"
+    )
+
+# Gemini is only called in these cases
+needs_gemini = is_full_ai or (is_hybrid and use_ai_explanations) or ai_start
+
+use_clusters = False
+if is_full_ai and len(orders_to_route) > DEFAULT_MAX_ORDERS_PER_CLUSTER:
+    use_clusters = st.checkbox(
+        "🧩 Split into geographic clusters (parallel AI calls)",
+        value=True,
+        key="use_clusters",
+        help=f"Large days are solved as areas of up to {DEFAULT_MAX_ORDERS_PER_CLUSTER} orders at once, then merged"
+    )
+
+validate_routes = False
+if is_full_ai:
+    validate_routes = st.checkbox(
+        "🧪 Validate & repair AI routes locally",
+        value=True,
+        key="validate_routes",
+        help="Recompute ETAs with local travel times and re-sequence stops that miss their time window"
+    )
+
+if is_full_ai:
+    estimated_tokens = AIOptimizer.estimate_prompt_tokens(orders_to_route, prepared_drivers)
+    st.caption(f"📏 Estimated prompt size: ~{estimated_tokens:,} tokens (compact tables, short ids)")
+
+@st.cache_resource(ttl=600, show_spinner=False)
+def load_route_history(today):
+    """Past stops indexed by normalized address (one ORDERS read, refreshed every 10 minutes)"""
+    return RouteHistory.from_database(Database(), today)
+
+
+use_history = st.checkbox(
+    "📚 Warm start from recent routes",
+    value=True,
+    key="use_route_history",
+    help="Recurring customers start on the driver who usually serves them, at their usual time"
+)
+if use_history:
+    try:
+        route_history = load_route_history(date.today().strftime('%Y-%m-%d'))
+        orders_to_route = route_history.annotate(orders_to_route, prepared_drivers)
+        recurring = sum(1 for o in orders_to_route if o.get(USUAL_DRIVER_FIELD))
+        if recurring:
+            st.caption(f"📚 {recurring} recurring customer(s) found in the last weeks' routes")
+    except Exception as e:
+        st.caption(f"📚 Route history unavailable: {str(e)}")
+
+# Result cache (identical orders + drivers + settings = identical result)
+result_cache = ResultCache()
+cache_settings = {
+    'mode': mode_key,
+    'explain': use_ai_explanations,
+    'clusters': use_clusters,
+    'validate': validate_routes,
+}
+if mode_key in SEARCH_MODES:
+    cache_settings['time_budget'] = time_budget
+if ai_start:
+    cache_settings['ai_start'] = True
+cache_key = ResultCache.make_key(orders_to_route, prepared_drivers, cache_settings)
+
+force_fresh = st.checkbox("🔄 Ignore cached results (force a fresh run)", value=False, key="force_fresh_optimization")
+
+# Offer to restore a cached result (e.g. after a crash or refresh before saving)
+if not st.session_state.optimized_routes and not force_fresh:
+    restorable = result_cache.get(cache_key)
+    if restorable:
+        st.info(f"♻️ A saved result exists for these exact orders and drivers (from {restorable['created_at']})")
+        if st.button("♻️ Restore Cached Result", use_container_width=True):
+            st.session_state.optimized_routes = restorable['result'].get('routes', {})
+            st.session_state.unassigned_orders = restorable['result'].get('unassigned_orders', [])
+            st.session_state.optimization_search = restorable['result'].get('search')
+            st.session_state.optimization_cache_status = f"⚡ Restored cached result from {restorable['created_at']}"
+            UserSession._auto_save_session()
+            st.rerun()
+
+
+def show_search_history(history):
+    """Improvement-over-time chart for local search modes"""
+    if not history:
+        return
+    st.line_chart(
+        {
+            'Seconds': [h['elapsed_sec'] for h in history],
+            'Drive time (min)': [h['drive_min'] for h in history],
+            'Unassigned orders': [h['unassigned'] for h in history],
+        },
+        x='Seconds',
+    )
+    first, last = history[0], history[-1]
+    st.caption(
+        f"📈 {len(history)} improvement(s): drive time {first['drive_min']} → {last['drive_min']} min, "
+        f"unassigned {first['unassigned']} → {last['unassigned']}"
+    )
+
+
+def show_route_preview(result):
+    """Compact per-driver view of a best-so-far solution"""
+    rows = []
+    for driver_name, route_data in (result.get('routes') or {}).items():
+        summary = route_data.get('summary', {})
+        rows.append({
+            'Driver': driver_name,
+            'Stops': summary.get('total_stops', 0),
+            'Drive (min)': summary.get('total_drive_time_min', 0),
+            'Finish': summary.get('estimated_finish', ''),
+            'Sequence': ' → '.join(s.get('city', '') for s in route_data.get('stops', [])),
+        })
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    unassigned = result.get('unassigned_orders') or []
+    if unassigned:
+        st.caption(f"⚠️ {len(unassigned)} order(s) currently unassigned")
+
+
+def apply_optimization_result(result):
+    """Store an optimization result in the session and sync it to Google Sheets"""
+    st.session_state.optimized_routes = result.get('routes', {})
+    st.session_state.optimization_search = result.get('search')
+    warnings = result.get('warnings', [])
+    unassigned = result.get('unassigned_orders', [])
+
+    st.success("✅ Routes optimized successfully!")
+
+    # UPDATE Assigned Driver in Session State automatically
+    routes_to_process = st.session_state.optimized_routes if isinstance(st.session_state.optimized_routes, dict) else {}
+    for driver_name, route_data in routes_to_process.items():
+        # route_data is a dict containing 'stops' and 'summary'
+        stops = route_data.get('stops', [])
+        for route_order in stops:
+            # Find matching order in session to update driver
+            for session_order in st.session_state.orders:
+                # Match by customer + address for more reliability
+                address_match = session_order.get('address', '').strip().lower() == route_order.get('address', '').strip().lower()
+                customer_match = session_order.get('customer_name', '').strip().lower() == route_order.get('customer_name', '').strip().lower()
+
+                if address_match and customer_match:
+                    session_order['assigned_driver'] = driver_name
+                    session_order['stop_number'] = route_order.get('stop_number', '')
+                    session_order['eta'] = route_order.get('eta', '')
+                    session_order['status'] = 'sent_to_driver'  # Update status!
+                    break  # Found match, move to next route_order
+
+    # Trigger session save
+    from components.user_session import UserSession
+    UserSession._auto_save_session()
+
+    # AUTO-SAVE to database to prevent data loss on refresh!
+    try:
+        today = date.today().strftime('%Y-%m-%d')
+        db = Database()
+
+        # Save routes
+        db.save_routes(st.session_state.optimized_routes, today)
+
+        # UPDATE existing orders instead of creating duplicates
+        update_count = 0
+        routes_to_save = st.session_state.optimized_routes if isinstance(st.session_state.optimized_routes, dict) else {}
+        for driver_name, route_data in routes_to_save.items():
+            route_id = Database.make_route_id(driver_name, today)
+            stops = route_data.get('stops', [])
+
+            for stop in stops:
+                # Try to find order_id
+                order_id = stop.get('order_id')
+
+                # If order_id is not available, try to find it from orders_to_route
+                if not order_id or order_id == 'MANUAL':
+                    # Match by address
+                    for order in orders_to_route:
+                        if order.get('address') == stop.get('address'):
+                            order_id = order.get('order_id')
+                            break
+
+                # Update the order in Google Sheets
+                if order_id:
+                    try:
+                        success = db.update_order_driver_and_route(
+                            order_id=order_id,
+                            driver_name=driver_name,
+                            route_id=route_id,
+                            stop_number=str(stop.get('stop_number', '')),
+                            eta=stop.get('eta', ''),
+                            status='sent_to_driver'
+                        )
+                        if success:
+                            update_count += 1
+                    except Exception as update_err:
+                        st.warning(f"⚠️ Could not update order {order_id}: {str(update_err)}")
+
+        st.success(f"💾 Routes saved! Updated {update_count} orders in Google Sheets")
+
+    except Exception as save_error:
+        st.warning(f"⚠️ Routes generated but couldn't auto-save: {str(save_error)}")
+        st.info("💡 Use 'Save Routes to Database' button below to save manually")
+
+    # Save unassigned to session for persistence
+    st.session_state.unassigned_orders = unassigned
+
+
+# Optimize button (disabled while a background job is attached)
+job_in_progress = bool(st.session_state.get('optimization_job_id') or st.query_params.get('job'))
+if st.button("🚀 Run AI Optimization", type="primary", use_container_width=True, disabled=job_in_progress):
+    
+    cached_entry = None if force_fresh else result_cache.get(cache_key)
     
-    # Check API key
-    if not os.getenv('GEMINI_API_KEY'):
+    # Check API key (only needed when Gemini is called)
+    if needs_gemini and not cached_entry and not os.getenv('GEMINI_API_KEY'):
         st.error("❌ GEMINI_API_KEY not found. Please configure your .env file.")
         st.stop()
     
-    try:
-        with st.spinner("🤖 AI is optimizing routes... This may take 10-30 seconds..."):
-            optimizer = AIOptimizer()
-            result = optimizer.optimize_routes(
-                orders_to_route,  # Use selected orders only!
-                prepared_drivers
-            )
-            
-            # Extract routes
-            st.session_state.optimized_routes = result.get('routes', {})
-            warnings = result.get('warnings', [])
-            unassigned = result.get('unassigned_orders', [])
-            
-            st.success("✅ Routes optimized successfully!")
-            
-            # UPDATE Assigned Driver in Session State automatically
-            routes_to_process = st.session_state.optimized_routes if isinstance(st.session_state.optimized_routes, dict) else {}
-            for driver_name, route_data in routes_to_process.items():
-                # route_data is a dict containing 'stops' and 'summary'
-                stops = route_data.get('stops', [])
-                for route_order in stops:
-                    # Find matching order in session to update driver
-                    for session_order in st.session_state.orders:
-                        # Match by customer + address for more reliability
-                        address_match = session_order.get('address', '').strip().lower() == route_order.get('address', '').strip().lower()
-                        customer_match = session_order.get('customer_name', '').strip().lower() == route_order.get('customer_name', '').strip().lower()
-                        
-                        if address_match and customer_match:
-                            session_order['assigned_driver'] = driver_name
-                            session_order['stop_number'] = route_order.get('stop_number', '')
-                            session_order['eta'] = route_order.get('eta', '')
-                            session_order['status'] = 'sent_to_driver'  # Update status!
-                            break  # Found match, move to next route_order
-                            
-            # Trigger session save
-            from components.user_session import UserSession
-            UserSession._auto_save_session()
-            
-            # AUTO-SAVE to database to prevent data loss on refresh!
-            try:
-                today = date.today().strftime('%Y-%m-%d')
-                db = Database()
-                
-                # Save routes
-                db.save_routes(st.session_state.optimized_routes, today)
-                
-                # UPDATE existing orders instead of creating duplicates
-                update_count = 0
-                routes_to_save = st.session_state.optimized_routes if isinstance(st.session_state.optimized_routes, dict) else {}
-                for driver_name, route_data in routes_to_save.items():
-                    route_id = f"ROUTE-{today.replace('-', '')}-{driver_name.split()[0].upper()}"
-                    stops = route_data.get('stops', [])
-                    
-                    for stop in stops:
-                        # Try to find order_id
-                        order_id = stop.get('order_id')
-                        
-                        # If order_id is not available, try to find it from orders_to_route
-                        if not order_id or order_id == 'MANUAL':
-                            # Match by address
-                            for order in orders_to_route:
-                                if order.get('address') == stop.get('address'):
-                                    order_id = order.get('order_id')
-                                    break
-                        
-                        # Update the order in Google Sheets
-                        if order_id:
-                            try:
-                                success = db.update_order_driver_and_route(
-                                    order_id=order_id,
-                                    driver_name=driver_name,
-                                    route_id=route_id,
-                                    stop_number=str(stop.get('stop_number', '')),
-                                    eta=stop.get('eta', ''),
-                                    status='sent_to_driver'
-                                )
-                                if success:
-                                    update_count += 1
-                            except Exception as update_err:
-                                st.warning(f"⚠️ Could not update order {order_id}: {str(update_err)}")
-                
-                st.success(f"💾 Routes saved! Updated {update_count} orders in Google Sheets")
-                
-            except Exception as save_error:
-                st.warning(f"⚠️ Routes generated but couldn't auto-save: {str(save_error)}")
-                st.info("💡 Use 'Save Routes to Database' button below to save manually")
-            
-            # Save unassigned to session for persistence
-            st.session_state.unassigned_orders = unassigned
-            
+    if cached_entry:
+        st.session_state.optimization_cache_status = f"⚡ Cache hit - identical request already optimized at {cached_entry['created_at']}"
+        apply_optimization_result(cached_entry['result'])
+        st.rerun()
+    
+    # Run in the background so the session stays responsive (and survives a refresh)
+    job_id = JobRunner().submit(
+        'optimize', run_optimization,
+        list(orders_to_route), prepared_drivers, cache_settings, cache_key
+    )
+    st.session_state.optimization_job_id = job_id
+    st.query_params['job'] = job_id
+    st.rerun()
+
+
+def clear_optimization_job():
+    """Detach the page from the current background job"""
+    st.session_state.pop('optimization_job_id', None)
+    if 'job' in st.query_params:
+        del st.query_params['job']
+
+
+def show_optimization_job(job_id):
+    """Progress panel for a background optimization job; applies the result when done"""
+    job = JobRunner().get(job_id)
+    if not job:
+        clear_optimization_job()
+        return
+    
+    status = job.get('status')
+    
+    if status in ACTIVE_STATUSES:
+        st.info(f"⏳ Optimization running in the background (job `{job_id}`) - you can keep editing orders on other pages")
+        st.progress(min(float(job.get('progress') or 0), 1.0), text=job.get('message', ''))
+        
+        if status != 'cancelling' and st.button("⏹️ Cancel Optimization", key=f"cancel_{job_id}"):
+            JobRunner().cancel(job_id)
             st.rerun()
-            
-    except Exception as e:
-        st.error(f"❌ Optimization failed: {str(e)}")
+        
+        show_search_history(job.get('search_history'))
+        
+        streamed_result = job.get('streamed_result')
+        if streamed_result:
+            st.caption("📡 Routes received so far - the full plan is applied when the answer is complete")
+            show_route_preview(streamed_result)
+        
+        best_result = job.get('best_result')
+        if best_result:
+            show_route_preview(best_result)
+            if st.button("✅ Accept Current Solution", key=f"accept_{job_id}", type="primary"):
+                JobRunner().cancel(job_id)
+                clear_optimization_job()
+                st.session_state.optimization_cache_status = "♾️ Accepted the best-so-far solution (search stopped early)"
+                apply_optimization_result(best_result)
+                st.rerun()
+        
+        with st.expander("📜 Progress Events"):
+            for event in job.get('events', []):
+                st.caption(f"{event['at']} - {event['message']}")
+    
+    elif status == 'done':
+        clear_optimization_job()
+        st.session_state.optimization_cache_status = "🆕 Cache miss - fresh optimization (result cached for identical re-runs)"
+        apply_optimization_result(job.get('result') or {})
+        st.rerun()
+    
+    elif status == 'cancelled':
+        clear_optimization_job()
+        st.warning("⏹️ Optimization cancelled")
+    
+    else:
+        clear_optimization_job()
+        st.error(f"❌ Optimization failed: {job.get('error', 'Unknown error')}")
         st.info("Check that your GEMINI_API_KEY is valid and you have credits.")
+        if job.get('traceback'):
+            with st.expander("🐞 Error Details"):
+                st.code(job['traceback'])
+
+
+# Attach to a running job (the ?job= query param survives a browser refresh)
+active_job_id = st.session_state.get('optimization_job_id') or st.query_params.get('job')
+if active_job_id:
+    st.session_state.optimization_job_id = active_job_id
+    if hasattr(st, 'fragment'):
+        # Poll only this panel, not the whole page
+        st.fragment(run_every=2)(show_optimization_job)(active_job_id)
+    else:
+        show_optimization_job(active_job_id)
+        job_state = JobRunner().get(active_job_id)
+        if job_state and job_state.get('status') in ACTIVE_STATUSES:
+            time.sleep(2)
+            st.rerun()
 
 # Display optimized routes
 if st.session_state.optimized_routes:
     st.divider()
     st.subheader("📋 Optimized Routes")
     
+    if st.session_state.get('optimization_cache_status'):
+        st.caption(st.session_state.optimization_cache_status)
+    
+    search = st.session_state.get('optimization_search')
+    if search:
+        if search.get('mode') == 'multistart':
+            search_label = f"🧮 Search: {search['starts']} starts on {search['workers']} cores in {search['elapsed_sec']}s"
+        elif search.get('mode') == 'lns':
+            search_label = f"🧱 Search: {search.get('iterations', 0)} destroy/repair iterations on {search.get('orders', 0)} orders in {search.get('elapsed_sec', 0)}s"
+        else:
+            search_label = f"♾️ Search: {search.get('iterations', 0)} iterations in {search.get('elapsed_sec', 0)}s"
+        with st.expander(search_label):
+            show_search_history(search.get('history'))
+    
     # Display formatted routes
     formatter = RouteFormatter()
     
@@ -255,6 +528,23 @@ if st.session_state.optimized_routes:
             
             st.write(f"**Start:** {summary.get('start_time', 'TBD')} from {summary.get('start_location', 'TBD')}")
             
+            simulation = route_data.get('simulation')
+            if simulation:
+                drift = simulation.get('max_eta_drift_min')
+                drift_text = f", AI ETAs off by up to {round(drift)} min" if drift is not None else ""
+                if simulation.get('repaired'):
+                    st.caption(f"🧪 Re-sequenced locally: late stops {simulation['late_stops_before']} → {simulation['late_stops_after']}")
+                else:
+                    st.caption(f"🧪 Validated locally: {simulation['late_stops_after']} late stop(s){drift_text}")
+
+            if 'peak_load_cuft' in summary:
+                over = summary['peak_load_cuft'] > summary['vehicle_capacity_cuft'] or summary['peak_load_lb'] > summary['vehicle_capacity_lb']
+                st.caption(
+                    f"{'⚠️' if over else '📦'} Peak load: {summary['peak_load_cuft']} / {summary['vehicle_capacity_cuft']:.0f} cu ft, "
+                    f"{summary['peak_load_lb']} / {summary['vehicle_capacity_lb']:.0f} lb"
+                    + (f" - {summary['reloads']} depot reload(s)" if summary.get('reloads') else "")
+                )
+
             st.divider()
             
             # Stops table
@@ -266,13 +556,16 @@ if st.session_state.optimized_routes:
                     st.write(f"📍 **{stop['address']}, {stop['city']}**")
                     st.write(f"📦 {stop['items']}")
                     st.write(f"⏰ ETA: **{stop['eta']}** (Window: {stop['time_window']})")
+                    if stop.get('wait_min'):
+                        st.caption(f"⏳ Waits {stop['wait_min']} min for the window to open")
                     
                     if stop.get('special_notes'):
                         st.info(f"ℹ️ {stop['special_notes']}")
                     
                     # Time window validation
                     if not stop.get('time_window_ok', True):
-                        st.error("⚠️ Time window conflict!")
+                        late_text = f" ({stop['late_min']} min late)" if stop.get('late_min') else ""
+                        st.error(f"⚠️ Time window conflict!{late_text}")
                 
                 with col2:
                     # Navigation button
@@ -338,6 +631,48 @@ if st.session_state.optimized_routes:
                 
                 st.divider()
                     
+                # Incremental insertion: best position across all routes, only that route re-timed
+                if isinstance(order, dict):
+                    if st.button("⚡ Smart Insert (best driver & position)", key=f"smart_insert_{key_suffix}", use_container_width=True):
+                        # Insert the full session order (phone, notes, pickup link), not the display entry
+                        full_order = next(
+                            (o for o in st.session_state.orders
+                             if order.get('order_id') and str(o.get('order_id')) == str(order.get('order_id'))),
+                            order
+                        )
+                        started = time.perf_counter()
+                        chosen_driver = RouteSolver().insert_order(
+                            st.session_state.optimized_routes, full_order, prepared_drivers
+                        )
+                        elapsed_ms = (time.perf_counter() - started) * 1000
+                        
+                        if chosen_driver:
+                            # Keep session orders in sync with the re-timed route
+                            for stop in st.session_state.optimized_routes[chosen_driver].get('stops', []):
+                                for session_order in st.session_state.orders:
+                                    if stop.get('order_id') and session_order.get('order_id') == stop.get('order_id'):
+                                        session_order['assigned_driver'] = chosen_driver
+                                        session_order['stop_number'] = stop.get('stop_number', '')
+                                        session_order['eta'] = stop.get('eta', '')
+                                        session_order['status'] = 'sent_to_driver'
+                            
+                            st.session_state.unassigned_orders.pop(i)
+                            UserSession._auto_save_session()
+                            
+                            # Persist only this driver's route
+                            try:
+                                today = date.today().strftime('%Y-%m-%d')
+                                Database().save_driver_route(
+                                    chosen_driver, st.session_state.optimized_routes[chosen_driver], today
+                                )
+                            except Exception as save_err:
+                                st.warning(f"⚠️ Inserted but couldn't save: {str(save_err)}")
+                            
+                            st.success(f"⚡ Inserted into {chosen_driver}'s route in {elapsed_ms:.0f} ms")
+                            st.rerun()
+                        else:
+                            st.error("❌ No driver can take this order without breaking a time window")
+                
                 col1, col2 = st.columns([2, 1])
                 with col1:
                     target_driver = st.selectbox(
@@ -417,7 +752,7 @@ if st.session_state.optimized_routes:
                 update_count = 0
                 routes_to_manual_save = st.session_state.optimized_routes if isinstance(st.session_state.optimized_routes, dict) else {}
                 for driver_name, route_data in routes_to_manual_save.items():
-                    route_id = f"ROUTE-{today.replace('-', '')}-{driver_name.split()[0].upper()}"
+                    route_id = Database.make_route_id(driver_name, today)
                     stops = route_data.get('stops', [])
                     
                     for stop in stops:
@@ -471,6 +806,15 @@ with col2:
 with st.sidebar:
     st.header("💡 How It Works")
     st.write("""
+    **Modes:**
+    - 🤖 **Full AI**: Gemini assigns, sequences and times every stop
+    - 🧩 **Clusters**: Large days are split by area and solved in parallel
+    - ⚡ **Hybrid**: Local solver builds routes instantly; Gemini only explains unassigned orders
+    - 🧪 **Validation**: AI routes are re-timed locally and re-sequenced when windows are missed
+    - 🧮 **Multi-start**: Many randomized local solutions in parallel; the best within the time budget wins
+    - ♾️ **Anytime**: A plan in about a second that keeps improving live; accept it whenever it is good enough
+    - 🧱 **LNS**: Removes and re-inserts groups of related stops; built for days with hundreds of orders
+    
     **AI Optimization:**
     1. Analyzes driver coverage areas
     2. Assigns orders geographically
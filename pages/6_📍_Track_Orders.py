@@ -11,6 +11,9 @@ import streamlit as st
 from datetime import date, datetime
 from components.database import Database
 from components.user_session import UserSession
+from components.session_manager import SessionManager
+from components.driver_manager import DriverManager
+from components.route_replanner import RouteReplanner
 import pandas as pd
 
 st.set_page_config(page_title="Track Orders", page_icon="📍", layout="wide")
@@ -59,7 +62,7 @@ def load_orders_smart(date_str):
                     'city': stop.get('city', ''),
                     'assigned_driver': driver_name,
                     'stop_number': stop.get('stop_number', ''),
-                    'status': 'pending',  # Default, can be updated
+                    'status': stop.get('status', 'pending'),  # Set for finished stops after a re-plan
                     'order_type': stop.get('order_type', ''),
                     'items': stop.get('items', ''),
                     'time_window': stop.get('time_window', ''),
@@ -80,6 +83,7 @@ def load_orders_smart(date_str):
 # Load orders from database
 try:
     date_str = selected_date.strftime('%Y-%m-%d')
+    db = Database()
     
     all_orders, data_source = load_orders_smart(date_str)
     
@@ -122,6 +126,105 @@ try:
         
         st.divider()
         
+        # Re-plan the rest of the day from delivered/failed stops
+        if data_source == "session_optimized" and st.session_state.get('selected_drivers'):
+            with st.expander("🔁 Re-plan Remaining Stops", expanded='replan_proposal' in st.session_state):
+                st.caption("Restarts each driver from their last finished stop and re-sequences or reassigns only unfinished stops. Nothing changes until you apply it.")
+                
+                retry_failed = st.checkbox("Retry failed stops today", value=False, key="replan_retry_failed")
+                
+                if st.button("🔁 Propose Re-plan", use_container_width=True):
+                    # Latest statuses come from the sheet (where status updates are saved)
+                    statuses = {}
+                    try:
+                        for db_order in db.get_orders(date=date_str):
+                            statuses[str(db_order.get('order_id', ''))] = db_order.get('status', '')
+                    except Exception as e:
+                        st.warning(f"⚠️ Could not load latest statuses: {str(e)}")
+                    
+                    prepared_drivers = DriverManager.prepare_for_optimization(
+                        st.session_state.selected_drivers,
+                        st.session_state.get('driver_config', {})
+                    )
+                    now = datetime.now()
+                    now_min = now.hour * 60 + now.minute if selected_date == date.today() else None
+                    
+                    with st.spinner("Re-planning remaining stops..."):
+                        st.session_state.replan_proposal = RouteReplanner().replan(
+                            st.session_state.optimized_routes,
+                            statuses,
+                            prepared_drivers,
+                            now_min=now_min,
+                            retry_failed=retry_failed
+                        )
+                    st.rerun()
+                
+                proposal = st.session_state.get('replan_proposal')
+                if proposal:
+                    summary = proposal['summary']
+                    col_a, col_b, col_c = st.columns(3)
+                    with col_a:
+                        st.metric("✅ Finished Stops", sum(proposal['finished'].values()))
+                    with col_b:
+                        st.metric("⏰ Late Stops", summary['late_after'], delta=summary['late_after'] - summary['late_before'], delta_color="inverse")
+                    with col_c:
+                        st.metric("🏁 Last Finish", summary['finish_after'] or "—", delta=f"was {summary['finish_before']}" if summary['finish_before'] else None, delta_color="off")
+                    
+                    for warning in proposal['warnings']:
+                        st.warning(f"⚠️ {warning}")
+                    
+                    if proposal['changes']:
+                        change_labels = {'reassigned': '🔀 Reassigned', 'resequenced': '↕️ Re-sequenced', 'retimed': '🕒 New ETA'}
+                        st.dataframe(
+                            pd.DataFrame([{
+                                'Order': c['order_id'],
+                                'Customer': c['customer_name'],
+                                'Change': change_labels.get(c['change'], c['change']),
+                                'From': f"{c['from_driver']} #{c['from_stop']}",
+                                'To': f"{c['to_driver']} #{c['to_stop']}",
+                                'ETA': f"{c['old_eta']} → {c['new_eta']}",
+                                'On Time': '✅' if c['time_window_ok'] else '⚠️',
+                            } for c in proposal['changes']]),
+                            hide_index=True,
+                            use_container_width=True
+                        )
+                    else:
+                        st.success("✅ Current plan is still the best for the remaining stops - no changes proposed.")
+                    
+                    col_apply, col_discard = st.columns(2)
+                    with col_apply:
+                        if proposal['changes'] and st.button("✅ Apply Re-plan", type="primary", use_container_width=True):
+                            # Replace routes as a whole: a driver whose stops all moved away has none left
+                            for driver_name, route_data in proposal['routes'].items():
+                                if route_data['stops']:
+                                    st.session_state.optimized_routes[driver_name] = route_data
+                                else:
+                                    st.session_state.optimized_routes.pop(driver_name, None)
+                            
+                            # Save every route that lost, gained or re-timed a stop (ROUTES row + its orders'
+                            # driver, route_id, stop and ETA); order statuses are left as they are
+                            touched = {c['from_driver'] for c in proposal['changes']} | {c['to_driver'] for c in proposal['changes']}
+                            update_count = 0
+                            for driver_name in sorted(touched):
+                                try:
+                                    update_count += db.save_driver_route(
+                                        driver_name, proposal['routes'][driver_name], date_str,
+                                        order_status=None, route_status='replanned'
+                                    )
+                                except Exception as update_err:
+                                    st.warning(f"⚠️ Could not save {driver_name}'s route: {str(update_err)}")
+                            
+                            SessionManager.save_state()
+                            del st.session_state.replan_proposal
+                            st.success(f"✅ Re-plan applied ({len(touched)} route(s), {update_count} orders updated)")
+                            st.rerun()
+                    with col_discard:
+                        if st.button("❌ Discard", use_container_width=True):
+                            del st.session_state.replan_proposal
+                            st.rerun()
+            
+            st.divider()
+        
         # Display orders by driver
         if 'assigned_driver' in df.columns:
             drivers = df['assigned_driver'].unique()
@@ -261,6 +364,7 @@ with st.sidebar:
     - Update status in real-time
     - Quick "Delivered" checkbox
     - Filter by status or date
+    - Re-plan remaining stops after deliveries or failures
     
     **Status Options:**
     - 🟡 **Pending**: لسه ماتوزعش على driver
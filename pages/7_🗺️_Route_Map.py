@@ -11,6 +11,8 @@ import streamlit as st
 from datetime import date
 from components.database import Database
 from components.user_session import UserSession
+from utils.geo import travel_minutes
+from utils.time_windows import parse_clock
 import pandas as pd
 import folium
 from streamlit_folium import st_folium
@@ -316,11 +318,18 @@ if drivers:
         distance_km = 0
         sorted_orders = sorted(driver_orders, key=lambda x: int(x.get('stop_number', 0)) if x.get('stop_number') else 999)
         
+        # Drive time follows time-of-day traffic, starting from the first stop's ETA (9 AM if unknown)
+        clock = parse_clock(str(sorted_orders[0].get('eta', ''))) if sorted_orders else None
+        clock = clock if clock is not None else 9 * 60
+        start_clock = clock
+        
         for i in range(len(sorted_orders) - 1):
             try:
                 lat1, lng1 = sorted_orders[i]['lat'], sorted_orders[i]['lng']
                 lat2, lng2 = sorted_orders[i + 1]['lat'], sorted_orders[i + 1]['lng']
                 
+                clock += 30 + travel_minutes((float(lat1), float(lng1)), (float(lat2), float(lng2)), clock + 30)
+                
                 # Haversine formula for distance
                 from math import radians, cos, sin, asin, sqrt
                 
@@ -334,11 +343,8 @@ if drivers:
             except:
                 pass
         
-        # Estimate time (assume 30 min per stop + travel time)
-        # Average speed: 40 km/h in city
-        travel_time_hours = distance_km / 40 if distance_km > 0 else 0
-        stop_time_hours = (total_stops * 30) / 60  # 30 min per stop
-        total_time_hours = travel_time_hours + stop_time_hours
+        # Estimate time (assume 30 min per stop + traffic-aware travel time)
+        total_time_hours = (clock - start_clock + 30) / 60 if sorted_orders else 0
         
         # Get first and last stops
         first_stop = sorted_orders[0].get('customer_name', 'N/A') if sorted_orders else 'N/A'
@@ -0,0 +1,104 @@
+"""
+Page 8: AI Metrics
+Gemini latency, token usage and estimated spend per feature
+"""
+
+import sys
+import os
+# Add project root to path for proper imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import streamlit as st
+import pandas as pd
+from components.llm_metrics import LLMMetrics, percentile
+from components.model_client import ModelClient
+from components.user_session import UserSession
+
+st.set_page_config(page_title="AI Metrics", page_icon="📈", layout="wide")
+
+# Require authentication
+UserSession.require_auth()
+
+st.title("📈 AI Metrics")
+st.caption("Latency, tokens and estimated spend of every Gemini call made by this server")
+
+st.divider()
+
+period = st.selectbox("Period", [1, 7, 30, 90], index=1, format_func=lambda d: "Today" if d == 1 else f"Last {d} days")
+calls = LLMMetrics().calls(days=period)
+
+if not calls:
+    st.info("No AI calls recorded in this period yet. Parse orders or run an AI optimization to see metrics here.")
+else:
+    ok_latencies = [c['latency_ms'] / 1000 for c in calls if c['outcome'] == 'ok']
+    p50 = percentile(ok_latencies, 50)
+    p95 = percentile(ok_latencies, 95)
+
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Calls", len(calls))
+    col2.metric("Succeeded", f"{round(100 * len(ok_latencies) / len(calls))}%")
+    col3.metric("p50 latency", f"{p50:.1f}s" if p50 is not None else "-")
+    col4.metric("p95 latency", f"{p95:.1f}s" if p95 is not None else "-")
+    col5.metric("Estimated spend", f"${sum(c['cost_usd'] for c in calls):.2f}")
+
+    # Latency per feature
+    st.subheader("⏱️ Latency by Feature")
+    latency_df = pd.DataFrame(LLMMetrics.latency_by_feature(calls))
+    st.dataframe(
+        latency_df.rename(columns={
+            'feature': 'Feature', 'model': 'Model', 'calls': 'Calls', 'ok_pct': 'OK %',
+            'p50_sec': 'p50 (s)', 'p95_sec': 'p95 (s)', 'retries': 'Retries', 'hedged': 'Hedged',
+        }),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    # Daily tokens and spend
+    st.subheader("💰 Daily Token Spend")
+    spend_df = pd.DataFrame(LLMMetrics.daily_spend(calls))
+    st.bar_chart(spend_df.pivot_table(index='day', columns='feature', values='cost_usd', aggfunc='sum', fill_value=0))
+    st.caption("Estimated from the usage Gemini reports and MODEL_PRICES (USD per million tokens)")
+
+    daily_totals = spend_df.groupby('day', as_index=False)[['calls', 'input_tokens', 'output_tokens', 'cost_usd']].sum()
+    daily_totals['cost_usd'] = daily_totals['cost_usd'].round(4)
+    st.dataframe(
+        daily_totals.sort_values('day', ascending=False).rename(columns={
+            'day': 'Day', 'calls': 'Calls', 'input_tokens': 'Input tokens',
+            'output_tokens': 'Output tokens', 'cost_usd': 'Cost (USD)',
+        }),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    # Failures
+    failures = [c for c in calls if c['outcome'] != 'ok']
+    if failures:
+        with st.expander(f"⚠️ Failed Calls ({len(failures)})"):
+            st.dataframe(
+                pd.DataFrame(failures)[['at', 'feature', 'model', 'outcome', 'retries', 'error']],
+                use_container_width=True,
+                hide_index=True,
+            )
+
+# Circuit breakers live in this server process only
+breakers = ModelClient.breaker_status()
+if breakers:
+    st.subheader("🔌 Model Circuit Breakers")
+    for model, state in breakers.items():
+        if state['open_for_sec'] > 0:
+            st.warning(f"**{model}** is skipped for another {state['open_for_sec']}s after {state['failures']} failure(s)")
+        else:
+            st.caption(f"{model}: {state['failures']} recent failure(s), available")
+
+# Sidebar
+with st.sidebar:
+    st.header("💡 Tips")
+    st.write("""
+    **Reading the numbers:**
+    - p95 is also when a slow call gets hedged to the next model
+    - Retries count hedges and replacements for failed requests
+    - Spend is an estimate; check Google AI Studio for billing
+    """)
+
+# Show user info at the bottom of the sidebar
+UserSession.show_user_info_sidebar()
@@ -0,0 +1,53 @@
+"""
+Run the optimizer benchmark suite and append results to a CSV
+
+Examples:
+    python run_benchmarks.py
+    python run_benchmarks.py --sizes 50x5 200x12 --seeds 1 2 3 --backends local lns --budget 20
+    python run_benchmarks.py --backends gemini --label prompt-v7    (needs GEMINI_API_KEY)
+"""
+
+import argparse
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from components.benchmark import BenchmarkRunner, BACKENDS
+
+
+def parse_size(text):
+    orders, _, drivers = text.lower().partition('x')
+    return int(orders), int(drivers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark route optimizers on synthetic LA/OC/IE days")
+    parser.add_argument('--sizes', nargs='+', default=['40x4', '120x8', '300x15'],
+                        help="Instance sizes as ORDERSxDRIVERS")
+    parser.add_argument('--seeds', nargs='+', type=int, default=[1, 2, 3])
+    parser.add_argument('--backends', nargs='+', default=['local', 'multistart', 'anytime', 'lns'],
+                        choices=sorted(BACKENDS))
+    parser.add_argument('--budget', type=float, default=10.0, help="Seconds per search backend run")
+    parser.add_argument('--out', default=os.path.join('benchmarks', 'results.csv'))
+    parser.add_argument('--label', default=None, help="Release or prompt label stored with each row")
+    args = parser.parse_args()
+
+    runner = BenchmarkRunner(args.out, args.label)
+    sizes = [parse_size(s) for s in args.sizes]
+
+    def show(row):
+        if row.get('error'):
+            print(f"{row['instance']:<22} {row['backend']:<11} ERROR: {row['error']}")
+            return
+        print(f"{row['instance']:<22} {row['backend']:<11} {row['solve_sec']:>7.2f}s "
+              f"{row['total_miles']:>8.1f} mi  late {row['late_stops']:>3} ({row['late_min']} min)  "
+              f"unassigned {row['unassigned']:>3}  mem {row.get('peak_mem_mb', '')} MB")
+
+    print(f"Writing results to {args.out}")
+    runner.run(args.backends, sizes, args.seeds, args.budget, on_row=show)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Equipment catalog - Approximate volume/weight of DME items and load capacity of each vehicle type
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+# (cubic feet, pounds) per item as loaded (folded/boxed where that is how it travels)
+# Keys are lowercase; the longest key found in an item name wins
+EQUIPMENT_CATALOG = {
+    # Beds and bedroom
+    'hospital bed': (40.0, 250.0),
+    'bariatric bed': (55.0, 400.0),
+    'semi-electric bed': (40.0, 250.0),
+    'full-electric bed': (40.0, 270.0),
+    'mattress': (15.0, 40.0),
+    'alternating pressure pad': (2.0, 10.0),
+    'overbed table': (5.0, 25.0),
+    'bedside table': (5.0, 25.0),
+    'bedside commode': (4.0, 20.0),
+    'commode': (4.0, 20.0),
+    'trapeze': (10.0, 60.0),
+    'bed rail': (2.0, 10.0),
+    # Transfer
+    'patient lift': (12.0, 80.0),
+    'hoyer lift': (12.0, 80.0),
+    'sling': (1.0, 4.0),
+    # Mobility
+    'power wheelchair': (25.0, 250.0),
+    'bariatric wheelchair': (14.0, 60.0),
+    'wheelchair': (10.0, 40.0),
+    'transport chair': (6.0, 20.0),
+    'mobility scooter': (20.0, 150.0),
+    'knee scooter': (4.0, 20.0),
+    'rollator': (4.0, 15.0),
+    'walker': (3.0, 7.0),
+    'cane': (0.5, 1.0),
+    'crutches': (1.0, 5.0),
+    'portable ramp': (8.0, 60.0),
+    'ramp': (8.0, 60.0),
+    # Bathroom
+    'shower chair': (3.0, 10.0),
+    'transfer bench': (4.0, 15.0),
+    'raised toilet seat': (2.0, 6.0),
+    # Respiratory
+    'oxygen concentrator': (3.0, 45.0),
+    'portable oxygen concentrator': (1.0, 6.0),
+    'oxygen tank': (1.0, 15.0),
+    'oxygen cylinder': (1.0, 15.0),
+    'cpap machine': (0.5, 3.0),
+    'bipap machine': (0.5, 4.0),
+    'cpap': (0.5, 3.0),
+    'bipap': (0.5, 4.0),
+    'nebulizer': (0.3, 2.0),
+    'heated humidifier': (0.3, 2.0),
+    'humidifier': (0.3, 2.0),
+    'full face mask': (0.1, 0.5),
+    'mask': (0.1, 0.5),
+    'suction machine': (0.5, 5.0),
+    # Therapy
+    'ice machine': (1.0, 8.0),
+    'cold therapy': (1.0, 8.0),
+    'cpm machine': (3.0, 25.0),
+    'tens unit': (0.1, 0.5),
+}
+
+# Anything not in the catalog
+DEFAULT_ITEM_LOAD = (3.0, 20.0)
+
+# Usable cargo space and payload by vehicle type (cubic feet, pounds)
+VEHICLE_CAPACITIES = {
+    'box truck': (800.0, 5000.0),
+    'sprinter': (500.0, 3500.0),
+    'cargo van': (250.0, 3000.0),
+    'van': (250.0, 3000.0),
+    'pickup': (60.0, 1500.0),
+    'truck': (60.0, 1500.0),
+    'suv': (60.0, 1000.0),
+    'minivan': (100.0, 1200.0),
+    'car': (15.0, 500.0),
+}
+DEFAULT_VEHICLE_TYPE = 'van'
+
+# "2x Wheelchair", "Wheelchair x2", "2 Walkers", "Walker (2)"
+_QUANTITY_PATTERNS = (
+    re.compile(r'^(\d+)\s*x?\s+(.+)$', re.IGNORECASE),
+    re.compile(r'^(\d+)x(.+)$', re.IGNORECASE),
+    re.compile(r'^(.+?)\s*(?:x\s*(\d+)|\((\d+)\))$', re.IGNORECASE),
+)
+
+# Catalog keys, longest first, so "power wheelchair" wins over "wheelchair"
+_CATALOG_KEYS = sorted(EQUIPMENT_CATALOG, key=len, reverse=True)
+
+
+def split_items(items) -> List[str]:
+    """Item names from a list or a comma/semicolon/pipe/newline separated string"""
+    if isinstance(items, list):
+        return [str(i).strip() for i in items if str(i).strip()]
+    return [i.strip() for i in re.split(r'[,;|\n]', str(items or '')) if i.strip()]
+
+
+def _quantity(item: str) -> Tuple[int, str]:
+    """(quantity, name) of one item entry"""
+    for pattern in _QUANTITY_PATTERNS[:2]:
+        match = pattern.match(item)
+        if match:
+            return max(int(match.group(1)), 1), match.group(2).strip()
+    match = _QUANTITY_PATTERNS[2].match(item)
+    if match and (match.group(2) or match.group(3)):
+        return max(int(match.group(2) or match.group(3)), 1), match.group(1).strip()
+    return 1, item
+
+
+def item_load(name: str) -> Tuple[float, float]:
+    """(cubic feet, pounds) of one item by catalog lookup"""
+    text = name.lower().replace('/', ' ')
+    for key in _CATALOG_KEYS:
+        if key in text:
+            return EQUIPMENT_CATALOG[key]
+    # Plural names ("Walkers", "Hospital Beds")
+    singular = re.sub(r's\b', '', text)
+    for key in _CATALOG_KEYS:
+        if key in singular:
+            return EQUIPMENT_CATALOG[key]
+    return DEFAULT_ITEM_LOAD
+
+
+def order_load(order: Dict) -> Tuple[float, float]:
+    """Total (cubic feet, pounds) of an order's items"""
+    volume = 0.0
+    weight = 0.0
+    for entry in split_items(order.get('items', '')):
+        quantity, name = _quantity(entry)
+        item_volume, item_weight = item_load(name)
+        volume += quantity * item_volume
+        weight += quantity * item_weight
+    return volume, weight
+
+
+def vehicle_capacity(driver: Dict) -> Tuple[float, float]:
+    """(cubic feet, pounds) a driver's vehicle can carry"""
+    vehicle = str(driver.get('vehicle_type') or DEFAULT_VEHICLE_TYPE).strip().lower()
+    for key in sorted(VEHICLE_CAPACITIES, key=len, reverse=True):
+        if key in vehicle:
+            return VEHICLE_CAPACITIES[key]
+    return VEHICLE_CAPACITIES[DEFAULT_VEHICLE_TYPE]
@@ -0,0 +1,386 @@
+"""
+Offline geography helpers - approximate coordinates and drive times for Southern California
+"""
+
+import re
+from array import array
+from math import radians, cos, sin, asin, sqrt
+from typing import Dict, List, Optional, Tuple
+
+# Default map center used across the app (Los Angeles)
+DEFAULT_CENTER = (34.0522, -118.2437)
+
+# Road distance is longer than the straight line between two points
+ROAD_CIRCUITY = 1.3
+
+# Average door-to-door speed for DME vans (mph)
+AVERAGE_SPEED_MPH = 30.0
+
+# Region buckets for traffic (index into SPEED_PROFILES)
+REGION_LA_CORE, REGION_LA_OUTER, REGION_ORANGE_COUNTY, REGION_INLAND_EMPIRE = range(4)
+REGION_NAMES = ('LA core', 'LA outer', 'Orange County', 'Inland Empire')
+
+# Multiplier of AVERAGE_SPEED_MPH for each hour of the day (0-23), one row per region bucket.
+# Midday runs at about the flat average; rush hours are slower and nights faster.
+_HOURLY_SPEED = (
+    # 0    1    2    3    4    5    6    7    8    9    10   11   12   13   14   15   16   17   18   19   20   21   22   23
+    (1.5, 1.5, 1.5, 1.5, 1.4, 1.3, 1.0, 0.7, 0.7, 0.9, 1.05, 1.05, 1.0, 1.05, 1.0, 0.8, 0.65, 0.65, 0.8, 1.1, 1.3, 1.4, 1.5, 1.5),   # LA core
+    (1.5, 1.5, 1.5, 1.5, 1.4, 1.3, 1.05, 0.8, 0.8, 0.95, 1.1, 1.1, 1.05, 1.1, 1.05, 0.85, 0.75, 0.75, 0.9, 1.15, 1.35, 1.45, 1.5, 1.5),  # LA outer
+    (1.5, 1.5, 1.5, 1.5, 1.4, 1.3, 1.05, 0.8, 0.8, 1.0, 1.1, 1.1, 1.05, 1.1, 1.05, 0.85, 0.75, 0.75, 0.9, 1.15, 1.35, 1.45, 1.5, 1.5),   # Orange County
+    (1.5, 1.5, 1.5, 1.5, 1.35, 1.2, 0.95, 0.8, 0.85, 1.05, 1.15, 1.15, 1.1, 1.1, 1.05, 0.85, 0.75, 0.8, 0.95, 1.2, 1.4, 1.45, 1.5, 1.5),  # Inland Empire
+)
+
+# Flat copy for O(1) lookup: SPEED_PROFILES[region * 24 + hour]
+SPEED_PROFILES = array('f', (factor for row in _HOURLY_SPEED for factor in row))
+
+# Slowest multiplier of each region over the day (rush hour)
+SLOWEST_SPEED = tuple(min(row) for row in _HOURLY_SPEED)
+
+# Approximate city centers (lowercase names)
+CITY_COORDINATES = {
+    # Los Angeles County
+    'los angeles': (34.0522, -118.2437),
+    'long beach': (33.7701, -118.1937),
+    'pasadena': (34.1478, -118.1445),
+    'glendale': (34.1425, -118.2551),
+    'burbank': (34.1808, -118.3090),
+    'santa monica': (34.0195, -118.4912),
+    'torrance': (33.8358, -118.3406),
+    'inglewood': (33.9617, -118.3531),
+    'compton': (33.8958, -118.2201),
+    'carson': (33.8317, -118.2820),
+    'downey': (33.9401, -118.1332),
+    'norwalk': (33.9022, -118.0817),
+    'whittier': (33.9792, -118.0328),
+    'lakewood': (33.8536, -118.1340),
+    'bellflower': (33.8817, -118.1170),
+    'cerritos': (33.8583, -118.0648),
+    'lancaster': (34.6868, -118.1542),
+    'palmdale': (34.5794, -118.1165),
+    'santa clarita': (34.3917, -118.5426),
+    'valencia': (34.4439, -118.6095),
+    'pomona': (34.0551, -117.7500),
+    'west covina': (34.0686, -117.9390),
+    'covina': (34.0900, -117.8903),
+    'el monte': (34.0686, -118.0276),
+    'alhambra': (34.0953, -118.1270),
+    'arcadia': (34.1397, -118.0353),
+    'monrovia': (34.1442, -118.0019),
+    'san gabriel': (34.0961, -118.1058),
+    'rosemead': (34.0806, -118.0728),
+    'montebello': (34.0165, -118.1138),
+    'pico rivera': (33.9831, -118.0967),
+    'hawthorne': (33.9164, -118.3526),
+    'gardena': (33.8883, -118.3090),
+    'redondo beach': (33.8492, -118.3884),
+    'manhattan beach': (33.8847, -118.4109),
+    'culver city': (34.0211, -118.3965),
+    'beverly hills': (34.0736, -118.4004),
+    'west hollywood': (34.0900, -118.3617),
+    'hollywood': (34.0928, -118.3287),
+    'san pedro': (33.7361, -118.2923),
+    'wilmington': (33.7800, -118.2620),
+    'van nuys': (34.1899, -118.4514),
+    'north hollywood': (34.1870, -118.3813),
+    'sherman oaks': (34.1508, -118.4490),
+    'encino': (34.1592, -118.5012),
+    'northridge': (34.2283, -118.5368),
+    'chatsworth': (34.2572, -118.6012),
+    'reseda': (34.2011, -118.5365),
+    'woodland hills': (34.1683, -118.6059),
+    'sylmar': (34.3078, -118.4492),
+    'san fernando': (34.2819, -118.4390),
+    'diamond bar': (34.0286, -117.8103),
+    'walnut': (34.0203, -117.8654),
+    'la puente': (34.0200, -117.9495),
+    'claremont': (34.0967, -117.7198),
+    'la verne': (34.1008, -117.7678),
+    'azusa': (34.1336, -117.9076),
+    'glendora': (34.1361, -117.8653),
+    'south gate': (33.9547, -118.2120),
+    'lynwood': (33.9303, -118.2115),
+    'paramount': (33.8895, -118.1598),
+    'signal hill': (33.8044, -118.1678),
+    'el segundo': (33.9192, -118.4165),
+    # Orange County
+    'anaheim': (33.8366, -117.9143),
+    'santa ana': (33.7455, -117.8677),
+    'irvine': (33.6846, -117.8265),
+    'huntington beach': (33.6595, -117.9988),
+    'garden grove': (33.7743, -117.9380),
+    'orange': (33.7879, -117.8531),
+    'fullerton': (33.8704, -117.9242),
+    'costa mesa': (33.6411, -117.9187),
+    'mission viejo': (33.6000, -117.6720),
+    'westminster': (33.7513, -117.9940),
+    'newport beach': (33.6189, -117.9298),
+    'buena park': (33.8675, -117.9981),
+    'lake forest': (33.6470, -117.6892),
+    'tustin': (33.7458, -117.8262),
+    'yorba linda': (33.8886, -117.8131),
+    'san clemente': (33.4270, -117.6120),
+    'laguna niguel': (33.5225, -117.7076),
+    'laguna hills': (33.6125, -117.7122),
+    'laguna beach': (33.5427, -117.7854),
+    'la habra': (33.9319, -117.9462),
+    'fountain valley': (33.7092, -117.9537),
+    'placentia': (33.8722, -117.8703),
+    'cypress': (33.8170, -118.0373),
+    'brea': (33.9167, -117.9001),
+    'seal beach': (33.7414, -118.1048),
+    'dana point': (33.4672, -117.6981),
+    'rancho santa margarita': (33.6409, -117.6031),
+    'aliso viejo': (33.5676, -117.7256),
+    # Inland Empire
+    'riverside': (33.9806, -117.3755),
+    'san bernardino': (34.1083, -117.2898),
+    'fontana': (34.0922, -117.4350),
+    'moreno valley': (33.9425, -117.2297),
+    'rancho cucamonga': (34.1064, -117.5931),
+    'ontario': (34.0633, -117.6509),
+    'corona': (33.8753, -117.5664),
+    'temecula': (33.4936, -117.1484),
+    'murrieta': (33.5539, -117.2139),
+    'victorville': (34.5362, -117.2928),
+    'hesperia': (34.4264, -117.3009),
+    'apple valley': (34.5008, -117.1859),
+    'chino': (34.0122, -117.6889),
+    'chino hills': (33.9898, -117.7326),
+    'upland': (34.0975, -117.6484),
+    'rialto': (34.1064, -117.3703),
+    'redlands': (34.0556, -117.1825),
+    'highland': (34.1283, -117.2086),
+    'loma linda': (34.0483, -117.2612),
+    'colton': (34.0739, -117.3137),
+    'hemet': (33.7476, -116.9720),
+    'perris': (33.7825, -117.2286),
+    'lake elsinore': (33.6681, -117.3273),
+    'menifee': (33.6971, -117.1853),
+    'jurupa valley': (33.9972, -117.4855),
+    'eastvale': (33.9639, -117.5644),
+    'norco': (33.9311, -117.5487),
+    'beaumont': (33.9295, -116.9773),
+    'banning': (33.9256, -116.8764),
+    # Coachella Valley / Desert
+    'palm springs': (33.8303, -116.5453),
+    'palm desert': (33.7222, -116.3745),
+    'cathedral city': (33.7797, -116.4653),
+    'rancho mirage': (33.7397, -116.4128),
+    'indio': (33.7206, -116.2156),
+    'la quinta': (33.6634, -116.3100),
+    'indian wells': (33.7178, -116.3411),
+    'bermuda dunes': (33.7428, -116.2891),
+    'coachella': (33.6803, -116.1739),
+    'desert hot springs': (33.9611, -116.5017),
+    # San Diego County
+    'san diego': (32.7157, -117.1611),
+    'chula vista': (32.6401, -117.0842),
+    'oceanside': (33.1959, -117.3795),
+    'escondido': (33.1192, -117.0864),
+    'carlsbad': (33.1581, -117.3506),
+    'el cajon': (32.7948, -116.9625),
+    'vista': (33.2000, -117.2425),
+    'san marcos': (33.1434, -117.1661),
+    # Ventura County
+    'oxnard': (34.1975, -119.1771),
+    'ventura': (34.2746, -119.2290),
+    'thousand oaks': (34.1706, -118.8376),
+    'simi valley': (34.2694, -118.7815),
+    'camarillo': (34.2164, -119.0376),
+    'moorpark': (34.2856, -118.8820),
+}
+
+# Approximate centers of 3-digit ZIP prefixes used when the city is unknown
+ZIP3_COORDINATES = {
+    '900': (34.0500, -118.2800),
+    '902': (33.9700, -118.3000),
+    '903': (33.9600, -118.3500),
+    '904': (34.0200, -118.4900),
+    '905': (33.8300, -118.3300),
+    '906': (33.9500, -118.0300),
+    '907': (33.8500, -118.1500),
+    '908': (33.8000, -118.1600),
+    '910': (34.1500, -118.1000),
+    '911': (34.1500, -118.1400),
+    '912': (34.1600, -118.2500),
+    '913': (34.2700, -118.5500),
+    '914': (34.1700, -118.4500),
+    '915': (34.1800, -118.3100),
+    '916': (34.1700, -118.3800),
+    '917': (34.0500, -117.7500),
+    '918': (34.0900, -118.1300),
+    '919': (32.6500, -117.0500),
+    '920': (33.1000, -117.1500),
+    '921': (32.7800, -117.1500),
+    '922': (33.7500, -116.3500),
+    '923': (34.2000, -117.3500),
+    '924': (34.1100, -117.2900),
+    '925': (33.8500, -117.2500),
+    '926': (33.6200, -117.8000),
+    '927': (33.7400, -117.8700),
+    '928': (33.8400, -117.9100),
+    '930': (34.2500, -119.1500),
+    '931': (34.4200, -119.7000),
+    '935': (34.6500, -118.1500),
+}
+
+_ZIP_PATTERN = re.compile(r'\b(9\d{4})(?:-\d{4})?\b')
+
+# Street words shortened so "123 North Main Street" and "123 N Main St." match
+STREET_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'av': 'ave', 'boulevard': 'blvd', 'drive': 'dr', 'road': 'rd',
+    'lane': 'ln', 'court': 'ct', 'place': 'pl', 'circle': 'cir', 'parkway': 'pkwy', 'highway': 'hwy',
+    'terrace': 'ter', 'way': 'way', 'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+}
+
+# Unit designators; the unit itself is dropped ("Apt 4B", "Unit 12", "#7")
+_UNIT_PATTERN = re.compile(r'\b(?:apt|apartment|unit|suite|ste|spc|space|rm|room)\b\.?\s*(?:[\w-]*\d[\w-]*|[a-z]\b)|#\s*\S+')
+
+
+def split_list(value) -> List[str]:
+    """Split a comma/pipe separated sheet cell (e.g. cities_covered) into clean lowercase parts"""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        parts = value
+    else:
+        parts = re.split(r'[,|;/]', str(value))
+    return [str(p).strip().lower() for p in parts if str(p).strip()]
+
+
+def normalize_city(city: str) -> str:
+    """Normalize a city name for lookups ("Long Beach, CA" -> "long beach")"""
+    if not city:
+        return ''
+    clean = str(city).split(',')[0].strip().lower()
+    return re.sub(r'\s+', ' ', clean)
+
+
+def normalize_address(address: str) -> str:
+    """Street address reduced to a stable key ("123 N. Main Street, Apt 4" -> "123 n main st")"""
+    if not address:
+        return ''
+    street = str(address).split(',')[0].lower()
+    street = _UNIT_PATTERN.sub(' ', street)
+    words = re.sub(r'[^a-z0-9 ]', ' ', street).split()
+    return ' '.join(STREET_ABBREVIATIONS.get(w, w) for w in words)
+
+
+def extract_zip(text: str) -> str:
+    """Find a Southern California ZIP code inside free text"""
+    if not text:
+        return ''
+    match = _ZIP_PATTERN.search(str(text))
+    return match.group(1) if match else ''
+
+
+def haversine_miles(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in miles"""
+    lat1, lng1, lat2, lng2 = map(radians, [lat1, lng1, lat2, lng2])
+    dlng = lng2 - lng1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlng / 2) ** 2
+    return 3958.8 * 2 * asin(sqrt(a))
+
+
+def road_miles(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Estimated road distance between two (lat, lng) points"""
+    return haversine_miles(a[0], a[1], b[0], b[1]) * ROAD_CIRCUITY
+
+
+def drive_minutes(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Estimated drive time between two (lat, lng) points (all-day average speed)"""
+    return road_miles(a, b) / AVERAGE_SPEED_MPH * 60
+
+
+def region_bucket(lat: float, lng: float) -> int:
+    """Traffic region of a point (REGION_* constant)"""
+    if lat < 33.95 and lng > -118.10:
+        # South of the 60/91: Orange County west of the Santa Ana Mountains, Inland Empire east of them
+        return REGION_ORANGE_COUNTY if lng < -117.66 + (33.95 - lat) * 0.2 else REGION_INLAND_EMPIRE
+    if lng > -117.72:
+        return REGION_INLAND_EMPIRE
+    if 33.90 <= lat <= 34.15 and -118.45 <= lng <= -118.10:
+        return REGION_LA_CORE
+    return REGION_LA_OUTER
+
+
+def speed_factor(region: int, minute_of_day: float) -> float:
+    """Speed multiplier for a region at a time of day (minutes from midnight)"""
+    return SPEED_PROFILES[region * 24 + int(minute_of_day // 60) % 24]
+
+
+def travel_minutes(a: Tuple[float, float], b: Tuple[float, float], depart_min: float) -> float:
+    """
+    Estimated drive time leaving at a given time of day
+
+    Uses the speed profile of the region around the middle of the trip at
+    the departure hour, so a 7 AM or 4 PM departure takes longer than midday.
+    """
+    region = region_bucket((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+    return drive_minutes(a, b) / speed_factor(region, depart_min)
+
+
+def slowest_travel_minutes(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Drive time at the slowest hour of the trip's region - an upper bound on travel_minutes at any hour"""
+    region = region_bucket((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+    return drive_minutes(a, b) / SLOWEST_SPEED[region]
+
+
+def _coords_from_fields(record: Dict) -> Optional[Tuple[float, float]]:
+    """Read explicit coordinates from an order/stop dict"""
+    coords = record.get('coordinates')
+    if isinstance(coords, dict):
+        lat, lng = coords.get('lat'), coords.get('lng')
+    else:
+        lat, lng = record.get('lat'), record.get('lng')
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not lat or not lng:
+        return None
+    return lat, lng
+
+
+def lookup_location(text: str) -> Optional[Tuple[float, float]]:
+    """Approximate coordinates for a free-text place (city name, address or ZIP)"""
+    if not text:
+        return None
+
+    city = normalize_city(text)
+    if city in CITY_COORDINATES:
+        return CITY_COORDINATES[city]
+
+    zip_code = extract_zip(text)
+    if zip_code and zip_code[:3] in ZIP3_COORDINATES:
+        return ZIP3_COORDINATES[zip_code[:3]]
+
+    # Look for a known city name anywhere in the text (longest names first)
+    lowered = str(text).lower()
+    for name in sorted(CITY_COORDINATES, key=len, reverse=True):
+        if re.search(rf'\b{re.escape(name)}\b', lowered):
+            return CITY_COORDINATES[name]
+
+    return None
+
+
+def resolve_coordinates(order: Dict) -> Optional[Tuple[float, float]]:
+    """
+    Best available coordinates for an order
+
+    Priority: explicit lat/lng, city center, ZIP prefix center, address text.
+    """
+    coords = _coords_from_fields(order)
+    if coords:
+        return coords
+
+    city = normalize_city(order.get('city', ''))
+    if city in CITY_COORDINATES:
+        return CITY_COORDINATES[city]
+
+    zip_code = str(order.get('zip_code', '')).strip()[:5]
+    if zip_code[:3] in ZIP3_COORDINATES:
+        return ZIP3_COORDINATES[zip_code[:3]]
+
+    return lookup_location(order.get('address', ''))
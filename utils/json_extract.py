@@ -0,0 +1,301 @@
+"""
+Tolerant JSON extraction for model responses - markdown fences, chatter, trailing commas and cut-off output
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_LITERALS = {'true': True, 'false': False, 'null': None, 'True': True, 'False': False, 'None': None}
+_WHITESPACE = ' \t\r\n'
+
+
+class _Truncated(Exception):
+    """Input ended inside a value; carries what was parsed so far"""
+
+    def __init__(self, partial: Any = None):
+        super().__init__('truncated')
+        self.partial = partial
+
+
+def _json_start(text: str) -> int:
+    """Index of the first '{' or '[' of the payload (after an opening ``` fence if there is one)"""
+    fence = text.find('```')
+    bracket = min((i for i in (text.find('{'), text.find('[')) if i >= 0), default=-1)
+    if fence >= 0 and (bracket < 0 or fence < bracket):
+        line_end = text.find('\n', fence)
+        if line_end < 0:
+            return -1
+        rest = _json_start(text[line_end + 1:])
+        return rest + line_end + 1 if rest >= 0 else -1
+    return bracket
+
+
+class _Parser:
+    """
+    Recursive descent parser that keeps going where json.loads gives up
+
+    Trailing commas and missing commas between values are accepted. When the
+    input ends early, array elements and scalars cut off mid-way are dropped,
+    while objects and arrays cut off mid-way keep their complete members.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.i = 0
+
+    def _skip(self) -> None:
+        while self.i < len(self.text) and self.text[self.i] in _WHITESPACE:
+            self.i += 1
+
+    def _peek(self) -> str:
+        self._skip()
+        if self.i >= len(self.text):
+            raise _Truncated()
+        return self.text[self.i]
+
+    def value(self) -> Any:
+        char = self._peek()
+        if char == '{':
+            return self._object()
+        if char == '[':
+            return self._array()
+        if char == '"':
+            return self._string()
+        return self._scalar()
+
+    def _object(self) -> Dict:
+        self.i += 1
+        result = {}
+        while True:
+            try:
+                char = self._peek()
+            except _Truncated:
+                raise _Truncated(result)
+            if char == '}':
+                self.i += 1
+                return result
+            if char == ',':
+                self.i += 1
+                continue
+            if char != '"':
+                raise ValueError(f"Expected a key at position {self.i}")
+            try:
+                key = self._string()
+                if self._peek() != ':':
+                    raise ValueError(f"Expected ':' at position {self.i}")
+                self.i += 1
+                result[key] = self.value()
+            except _Truncated as cut:
+                if isinstance(cut.partial, (dict, list)):
+                    result[key] = cut.partial
+                raise _Truncated(result)
+
+    def _array(self) -> List:
+        self.i += 1
+        result = []
+        while True:
+            try:
+                char = self._peek()
+            except _Truncated:
+                raise _Truncated(result)
+            if char == ']':
+                self.i += 1
+                return result
+            if char == ',':
+                self.i += 1
+                continue
+            try:
+                result.append(self.value())
+            except _Truncated:
+                raise _Truncated(result)
+
+    def _string(self) -> str:
+        start = self.i
+        self.i += 1
+        while self.i < len(self.text):
+            char = self.text[self.i]
+            if char == '\\':
+                self.i += 2
+                continue
+            if char == '"':
+                self.i += 1
+                return json.loads(self.text[start:self.i], strict=False)
+            self.i += 1
+        raise _Truncated()
+
+    def _scalar(self) -> Any:
+        match = _NUMBER.match(self.text, self.i)
+        if match:
+            self.i = match.end()
+            if self.i >= len(self.text):
+                # "12" at the very end may have been "125"
+                raise _Truncated()
+            number = match.group()
+            return float(number) if any(c in number for c in '.eE') else int(number)
+        for literal, value in _LITERALS.items():
+            if self.text.startswith(literal, self.i):
+                self.i += len(literal)
+                return value
+            if literal.startswith(self.text[self.i:]):
+                raise _Truncated()
+        raise ValueError(f"Unexpected character {self.text[self.i]!r} at position {self.i}")
+
+
+def parse_partial_json(text: str) -> Tuple[Any, bool]:
+    """
+    JSON value in a model response, salvaging as much as possible
+
+    Handles ```json fences, text before/after the JSON, trailing commas,
+    double-encoded JSON strings and responses cut off mid-way.
+
+    Returns:
+        (value, complete) - complete is False when the response was cut off
+        and value only holds the members that were fully received
+
+    Raises:
+        ValueError: No JSON in the text, or JSON too broken to read
+    """
+    text = text or ''
+    stripped = text.strip()
+    if stripped.startswith('"'):
+        # Double-encoded: the whole payload is a JSON string
+        try:
+            inner = json.loads(stripped)
+            if isinstance(inner, str):
+                return parse_partial_json(inner)
+        except ValueError:
+            pass
+
+    start = _json_start(text)
+    if start < 0:
+        raise ValueError(f"No JSON found in response: {stripped[:100]}")
+
+    parser = _Parser(text[start:])
+    try:
+        return parser.value(), True
+    except _Truncated as cut:
+        return cut.partial, False
+
+
+class JSONStream:
+    """
+    Incremental scanner that reports objects as soon as they are complete
+
+    Feed it response chunks as they arrive; every object or array closing at
+    the chosen nesting depth is parsed and returned with its path (the keys
+    and array indexes leading to it). Each character is scanned once.
+
+    Depth 1 = elements of a top-level array (orders); the routes in
+    {"routes": {"D1": {...}}} are at depth 2.
+    """
+
+    def __init__(self, depth: int = 1):
+        """
+        Args:
+            depth: Nesting depth of the objects to report (top-level value = 0)
+        """
+        self.depth = depth
+        self.text = ''
+        self._pos = 0
+        self._start = -1
+        self._stack: List[Dict] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._done = False
+
+    def feed(self, chunk: str) -> List[Tuple[List, Any]]:
+        """
+        Add the next piece of the response
+
+        Returns:
+            (path, value) for each object/array at the chosen depth completed by this chunk
+        """
+        self.text += chunk or ''
+        completed = []
+
+        if self._start < 0:
+            self._start = _json_start(self.text)
+            if self._start < 0:
+                return completed
+            self._pos = self._start
+
+        text = self.text
+        while self._pos < len(text) and not self._done:
+            i = self._pos
+            char = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    frame = self._stack[-1] if self._stack else None
+                    if frame and frame['open'] == '{' and frame['expect_key']:
+                        frame['key'] = json.loads(text[self._string_start:i + 1], strict=False)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in '{[':
+                parent = self._stack[-1] if self._stack else None
+                if parent is None:
+                    name = None
+                elif parent['open'] == '{':
+                    name = parent['key']
+                else:
+                    name = parent['index']
+                # name = key/index in the parent, key = key of the member being read
+                self._stack.append({'open': char, 'start': i, 'name': name, 'key': None, 'index': 0,
+                                    'expect_key': char == '{'})
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                frame = self._stack.pop()
+                if len(self._stack) == self.depth:
+                    path = [f['name'] for f in self._stack[1:]] + ([frame['name']] if self._stack else [])
+                    value, complete = parse_partial_json(text[frame['start']:i + 1])
+                    if complete:
+                        completed.append((path, value))
+                if not self._stack:
+                    self._done = True
+            elif char == ':' and self._stack and self._stack[-1]['open'] == '{':
+                self._stack[-1]['expect_key'] = False
+            elif char == ',' and self._stack:
+                frame = self._stack[-1]
+                if frame['open'] == '{':
+                    frame['expect_key'] = True
+                else:
+                    frame['index'] += 1
+
+        return completed
+
+    def result(self) -> Tuple[Optional[Any], bool]:
+        """(value, complete) of everything fed so far, see parse_partial_json"""
+        try:
+            return parse_partial_json(self.text)
+        except ValueError:
+            return None, False
+
+
+def stream_handler(depth: int, on_item: Callable[[List, Any], None]) -> Callable[[str], None]:
+    """
+    Chunk callback for a streamed model response (see ModelClient.generate)
+
+    Args:
+        depth: Nesting depth of the objects to report (see JSONStream)
+        on_item: Called with (path, value) for each object as soon as it is complete
+    """
+    stream = JSONStream(depth)
+
+    def on_chunk(text: str) -> None:
+        for path, value in stream.feed(text):
+            on_item(path, value)
+
+    return on_chunk
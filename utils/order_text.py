@@ -0,0 +1,245 @@
+"""
+Order text helpers - split pasted text into order blocks and parse the usual templates locally
+
+Most pasted orders follow the dispatch template (see TEST_ORDERS.txt):
+
+    Delivery to NAME, PHONE[, ADDRESS, CITY, CA ZIP]
+    [ADDRESS, CITY, CA ZIP]
+    Items: ...
+    Time: 10:00 AM - 2:00 PM
+    Notes: ...   (or an unlabeled line)
+    Linked pickup: NAME or ORDER ID   (a delivery carrying that pickup's equipment)
+
+Blocks in that shape are parsed with precompiled patterns and get a
+confidence score; anything else is left for the AI parser.
+"""
+
+import re
+from typing import Dict, List, Tuple
+from utils.geo import CITY_COORDINATES, normalize_city
+from utils.time_windows import parse_range, format_window
+
+# Parsed order field naming the pickup (customer name or order ID) a delivery carries equipment from;
+# resolved to the pickup's order ID by OrderInput.link_pickups
+PICKUP_REF_FIELD = 'pickup_ref'
+
+# Blocks scoring below this go to the AI parser
+MIN_CONFIDENCE = 0.8
+
+# Confidence lost for each missing or doubtful field
+FIELD_PENALTIES = {
+    'order_type': 0.15,
+    'customer_name': 0.2,
+    'address': 0.5,
+    'city': 0.2,
+    'zip_code': 0.1,
+    'unknown_city': 0.1,
+    'customer_phone': 0.05,
+    'items': 0.1,
+    'time_window': 0.3,
+}
+
+ORDER_TYPES = {
+    'delivery': 'Delivery', 'deliver': 'Delivery', 'drop off': 'Delivery', 'drop-off': 'Delivery',
+    'pickup': 'Pickup', 'pick up': 'Pickup', 'pick-up': 'Pickup',
+    'exchange': 'Exchange', 'swap': 'Exchange',
+}
+
+_TYPE_LINE = re.compile(
+    r'^\s*(delivery|deliver|drop[ -]off|pickup|pick[ -]up|exchange|swap)\s*(?:\s(?:to|from|for|at)\s|[:\-])\s*(.*)$',
+    re.IGNORECASE
+)
+_HEADER_LINE = re.compile(r'^\s*order\s*#?\s*\d+\s*(?:[-:–]\s*(.*))?$', re.IGNORECASE)
+_SEPARATOR_LINE = re.compile(r'^\s*[=\-_*#~]{3,}\s*$')
+_LABEL_LINE = re.compile(
+    r'^\s*(items?|equipment|time(?:\s*window)?|window|notes?|instructions?|phone|address|name|customer|linked\s*pickup)\s*:\s*(.*)$',
+    re.IGNORECASE
+)
+_ORDER_SIGNAL = re.compile(
+    r'\b(?:deliver(?:y)?|pick[ -]?up|exchange|swap)\b|\b\d+[A-Za-z]?\s+[A-Za-z]|\b9\d{4}\b',
+    re.IGNORECASE
+)
+_PHONE = re.compile(r'(?<!\d)\(?(\d{3})\)?[\s.\-]?(\d{3})[\s.\-]?(\d{4})(?!\d)')
+_ADDRESS = re.compile(
+    r'(?P<street>\d+[A-Za-z]?\s+[^,]+?)\s*,\s*(?:(?:apt|unit|suite|ste|#)\.?\s*[\w-]+\s*,\s*)?'
+    r'(?P<city>[A-Za-z][A-Za-z .\'-]+?)\s*,?\s*(?:CA|Calif\.?|California)\.?\s*(?P<zip>\d{5})?(?:-\d{4})?\b',
+    re.IGNORECASE
+)
+
+LABEL_FIELDS = {
+    'item': 'items', 'items': 'items', 'equipment': 'items',
+    'time': 'time_window', 'timewindow': 'time_window', 'window': 'time_window',
+    'note': 'special_notes', 'notes': 'special_notes', 'instruction': 'special_notes', 'instructions': 'special_notes',
+    'phone': 'customer_phone', 'address': 'address', 'name': 'customer_name', 'customer': 'customer_name',
+    'linkedpickup': PICKUP_REF_FIELD,
+}
+
+
+# ----------------------------------------------------------------------
+# Block boundaries
+# ----------------------------------------------------------------------
+
+def _starts_order(line: str) -> bool:
+    # A type line must carry contact details too, so "Deliver to back door" in notes does not split
+    if _HEADER_LINE.match(line):
+        return True
+    return bool(_TYPE_LINE.match(line) and (_PHONE.search(line) or _ADDRESS.search(line)))
+
+
+def split_order_blocks(text: str) -> List[str]:
+    """
+    Split pasted text into one block per order
+
+    A block ends at a blank line, and a new one starts at an "Order N" header
+    or a "Delivery to / Pickup from / Exchange for" line with a phone or
+    address. A header followed by its type line stays one block. Separator
+    lines (=====) are dropped.
+    """
+    blocks, current = [], []
+    header_only = False
+
+    for line in str(text or '').splitlines():
+        if not line.strip() or _SEPARATOR_LINE.match(line):
+            if current:
+                blocks.append(current)
+            current, header_only = [], False
+            continue
+
+        if current and _starts_order(line) and not header_only:
+            blocks.append(current)
+            current = []
+        header_only = bool(_HEADER_LINE.match(line)) and not current
+        current.append(line.strip())
+
+    if current:
+        blocks.append(current)
+    return ['\n'.join(block) for block in blocks]
+
+
+def has_order_signal(block: str) -> bool:
+    """Whether a block could hold an order at all (type word, street number, phone or ZIP)"""
+    return bool(_ORDER_SIGNAL.search(block) or _PHONE.search(block))
+
+
+# ----------------------------------------------------------------------
+# Template parser
+# ----------------------------------------------------------------------
+
+def _format_phone(match: re.Match) -> str:
+    return f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
+
+
+def _clean_name(text: str) -> str:
+    name = text.strip(' ,;-')
+    if name.isupper() or name.islower():
+        name = name.title()
+    return name
+
+
+def parse_order_block(block: str) -> Tuple[Dict, float]:
+    """
+    Parse one order block written in a known template
+
+    Returns:
+        (order dict with the OrderInput fields, confidence 0.0 - 1.0)
+    """
+    order = {
+        'order_type': '', 'customer_name': '', 'customer_phone': '', 'address': '', 'city': '',
+        'zip_code': '', 'items': '', 'time_window': '', 'special_notes': '', PICKUP_REF_FIELD: '',
+    }
+    notes = []
+    time_text = ''
+
+    for line in block.splitlines():
+        header = _HEADER_LINE.match(line)
+        if header:
+            if header.group(1):
+                notes.append(header.group(1).strip())
+            continue
+
+        label = _LABEL_LINE.match(line)
+        if label:
+            field = LABEL_FIELDS.get(re.sub(r'\s+', '', label.group(1).lower()), 'special_notes')
+            value = label.group(2).strip()
+            if field == 'address':
+                # Parsed below like an unlabeled address line
+                line = value
+            else:
+                if field == 'time_window':
+                    time_text = value
+                elif field == 'special_notes':
+                    notes.append(value)
+                elif field == 'customer_phone':
+                    phone = _PHONE.search(value)
+                    order[field] = order[field] or (_format_phone(phone) if phone else value)
+                elif not order[field]:
+                    order[field] = _clean_name(value) if field == 'customer_name' else value
+                continue
+
+        type_line = _TYPE_LINE.match(line) if not order['order_type'] else None
+        if type_line:
+            order['order_type'] = ORDER_TYPES[type_line.group(1).lower()]
+            line = type_line.group(2)
+
+        phone = _PHONE.search(line)
+        address = _ADDRESS.search(line)
+        if not (type_line or phone or address):
+            notes.append(line.strip())
+            continue
+
+        if address and not order['address']:
+            order['address'] = address.group('street').strip()
+            order['city'] = address.group('city').strip()
+            order['zip_code'] = address.group('zip') or ''
+        if phone and not order['customer_phone']:
+            order['customer_phone'] = _format_phone(phone)
+        if type_line and not order['customer_name']:
+            # The name comes first: "Delivery to NAME, PHONE, ADDRESS..."
+            cut = min([m.start() for m in (phone, address) if m] + [len(line)])
+            order['customer_name'] = _clean_name(line[:cut].split(',')[0])
+
+    confidence = 1.0
+    if not order['order_type']:
+        order['order_type'] = 'Delivery'
+        confidence -= FIELD_PENALTIES['order_type']
+    for field in ('customer_name', 'address', 'city', 'zip_code', 'customer_phone', 'items'):
+        if not order[field]:
+            confidence -= FIELD_PENALTIES[field]
+    if order['city'] and normalize_city(order['city']) not in CITY_COORDINATES:
+        confidence -= FIELD_PENALTIES['unknown_city']
+
+    if time_text:
+        start, end = parse_range(time_text)
+        if start is None or end is None:
+            # Keep the text for the reader, but let the AI interpret it
+            order['time_window'] = time_text
+            confidence -= FIELD_PENALTIES['time_window']
+        else:
+            order['time_window'] = format_window(start, end)
+
+    order['special_notes'] = '; '.join(n for n in notes if n)
+    return order, round(max(confidence, 0.0), 2)
+
+
+def parse_order_text(text: str, min_confidence: float = MIN_CONFIDENCE) -> Dict:
+    """
+    Parse every confident block locally and collect the rest for the AI
+
+    Returns:
+        {
+            'blocks': [{'text', 'order' (None when left for the AI), 'confidence'}] in paste order,
+            'uncertain': texts of the blocks the AI should parse,
+            'skipped': texts of blocks with nothing order-like in them (titles, separators)
+        }
+    """
+    result = {'blocks': [], 'uncertain': [], 'skipped': []}
+    for block in split_order_blocks(text):
+        if not has_order_signal(block):
+            result['skipped'].append(block)
+            continue
+        order, confidence = parse_order_block(block)
+        confident = confidence >= min_confidence
+        result['blocks'].append({'text': block, 'order': order if confident else None, 'confidence': confidence})
+        if not confident:
+            result['uncertain'].append(block)
+    return result
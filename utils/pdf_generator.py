@@ -9,6 +9,7 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.units import inch
 from typing import Dict
 import io
+from utils.time_windows import window_text
 
 def generate_route_pdf(driver_name: str, route_data: Dict, date: str) -> bytes:
     """
@@ -57,7 +58,7 @@ def generate_route_pdf(driver_name: str, route_data: Dict, date: str) -> bytes:
             f"{stop['address']}, {stop['city']}",
             stop['items'][:30] + '...' if len(stop['items']) > 30 else stop['items'],
             stop['eta'],
-            stop['time_window']
+            window_text(stop)
         ])
     
     table = Table(table_data, colWidths=[0.4*inch, 0.8*inch, 2.5*inch, 1.5*inch, 0.8*inch, 1.2*inch])
@@ -0,0 +1,255 @@
+"""
+Time window helpers - convert clock strings to minutes of the day and back
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Full-day window used when an order has no time restriction
+DAY_START_MIN = 0
+DAY_END_MIN = 24 * 60 - 1
+
+# Order fields holding the parsed window as integer minutes of the day
+WINDOW_START_FIELD = 'window_start_min'
+WINDOW_END_FIELD = 'window_end_min'
+
+# Text fields a window can arrive in, by bound (first non-empty wins)
+START_TEXT_FIELDS = ('time_window_start', 'time_start')
+END_TEXT_FIELDS = ('time_window_end', 'time_end')
+
+_CLOCK_PATTERN = re.compile(r'^\s*(\d{1,2})(?::(\d{2}))?\s*([ap])\.?\s*m?\.?\s*$', re.IGNORECASE)
+_SERIES_CLOCK_PATTERN = r'^(\d{1,2})(?::(\d{2}))?(?:\s*([aApP])\.?\s*[mM]?\.?)?$'
+_RANGE_PATTERN = re.compile(
+    r'(\d{1,2}(?::\d{2})?\s*(?:[ap]\.?\s*m?\.?)?)\s*(?:-|–|to)\s*(\d{1,2}(?::\d{2})?\s*(?:[ap]\.?\s*m?\.?)?)',
+    re.IGNORECASE
+)
+
+
+def parse_clock(time_str: str) -> Optional[int]:
+    """Parse '10:00 AM', '2 PM' or '14:30' into minutes after midnight"""
+    if not time_str:
+        return None
+    text = str(time_str).strip()
+
+    match = _CLOCK_PATTERN.match(text)
+    if match:
+        hour = int(match.group(1))
+        minute = int(match.group(2) or 0)
+        if hour > 12 or minute > 59:
+            return None
+        hour = hour % 12
+        if match.group(3).lower() == 'p':
+            hour += 12
+        return hour * 60 + minute
+
+    match = re.match(r'^\s*(\d{1,2}):(\d{2})\s*$', text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if hour > 23 or minute > 59:
+            return None
+        return hour * 60 + minute
+
+    return None
+
+
+def format_clock(minutes: Optional[float]) -> str:
+    """Format minutes after midnight as 'HH:MM AM/PM'"""
+    if minutes is None:
+        return ''
+    total = int(round(minutes)) % (24 * 60)
+    hour, minute = divmod(total, 60)
+    suffix = 'AM' if hour < 12 else 'PM'
+    hour = hour % 12 or 12
+    return f"{hour}:{minute:02d} {suffix}"
+
+
+def parse_range(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """Parse a free-text range like '10:00 AM - 2:00 PM' or '9-11am'"""
+    if not text:
+        return None, None
+
+    match = _RANGE_PATTERN.search(str(text))
+    if not match:
+        return None, None
+
+    start_text, end_text = match.group(1).strip(), match.group(2).strip()
+    end = parse_clock(end_text)
+    start = parse_clock(start_text)
+
+    # "9-11am" - borrow the end's meridiem for a bare start hour
+    if start is None and end is not None:
+        suffix = 'PM' if end >= 12 * 60 else 'AM'
+        start = parse_clock(f"{start_text} {suffix}")
+        if start is not None and start > end:
+            start = parse_clock(f"{start_text} AM")
+
+    return start, end
+
+
+def _first_text(order: Dict, fields: Tuple[str, ...]) -> str:
+    """First non-empty value among fields"""
+    for field in fields:
+        value = order.get(field)
+        if value and str(value).strip().lower() != 'nan':
+            return str(value)
+    return ''
+
+
+def parse_window_bounds(order: Dict) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Raw (start_min, end_min) from an order's text fields
+
+    Reads the combined 'time_window' text first, then the separate
+    start/end fields. Bounds that are missing or unreadable are None.
+    """
+    start, end = parse_range(order.get('time_window', ''))
+
+    if start is None:
+        start = parse_clock(_first_text(order, START_TEXT_FIELDS))
+    if end is None:
+        end = parse_clock(_first_text(order, END_TEXT_FIELDS))
+
+    return start, end
+
+
+def _stored_window(order: Dict) -> Optional[Tuple[int, int]]:
+    """The window saved on the order at ingest, if any"""
+    start, end = order.get(WINDOW_START_FIELD), order.get(WINDOW_END_FIELD)
+    if start is None or end is None or start == '' or end == '':
+        return None
+    try:
+        return int(start), int(end)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_order_window(order: Dict) -> Tuple[int, int]:
+    """
+    Time window of an order as (start_min, end_min)
+
+    Uses the minutes stored by normalize_order_window when present,
+    otherwise parses the text fields. Missing bounds default to the whole day.
+    """
+    stored = _stored_window(order)
+    if stored is not None:
+        return stored
+
+    start, end = parse_window_bounds(order)
+    if start is None:
+        start = DAY_START_MIN
+    if end is None or end < start:
+        end = DAY_END_MIN
+
+    return start, end
+
+
+def normalize_order_window(order: Dict) -> Dict:
+    """Parse an order's window text once and store it as integer minutes (in place)"""
+    order.pop(WINDOW_START_FIELD, None)
+    order.pop(WINDOW_END_FIELD, None)
+    start, end = parse_order_window(order)
+    order[WINDOW_START_FIELD] = start
+    order[WINDOW_END_FIELD] = end
+    return order
+
+
+def normalize_order_windows(orders: List[Dict]) -> List[Dict]:
+    """normalize_order_window for a list of orders (non-dict entries are left alone)"""
+    for order in orders:
+        if isinstance(order, dict):
+            normalize_order_window(order)
+    return orders
+
+
+def format_window(start: int, end: int) -> str:
+    """'10:00 AM - 2:00 PM' for a minute window ('' for the whole day)"""
+    if start == DAY_START_MIN and end == DAY_END_MIN:
+        return ''
+    if end == DAY_END_MIN:
+        return f"After {format_clock(start)}"
+    if start == DAY_START_MIN:
+        return f"Before {format_clock(end)}"
+    return f"{format_clock(start)} - {format_clock(end)}"
+
+
+def window_text(order: Dict) -> str:
+    """Display text for an order's window (original text when available)"""
+    text = order.get('time_window')
+    if text and str(text).strip().lower() != 'nan':
+        return str(text)
+    return format_window(*parse_order_window(order))
+
+
+# ----------------------------------------------------------------------
+# Vectorized parsing for DataFrames
+# ----------------------------------------------------------------------
+
+def parse_clock_series(series):
+    """parse_clock for a whole pandas Series (nullable Int64 minutes)"""
+    import pandas as pd
+
+    text = series.fillna('').astype(str).str.strip()
+    parts = text.str.extract(_SERIES_CLOCK_PATTERN)
+    hour = pd.to_numeric(parts[0], errors='coerce')
+    minute = pd.to_numeric(parts[1], errors='coerce').fillna(0)
+    meridiem = parts[2].str.lower()
+    has_meridiem = meridiem.notna()
+
+    # 12-hour times need a meridiem; 24-hour times need explicit minutes
+    valid = hour.notna() & (minute <= 59) & (
+        (has_meridiem & (hour <= 12)) | (~has_meridiem & parts[1].notna() & (hour <= 23))
+    )
+    hour = hour.where(~has_meridiem, hour % 12 + (meridiem == 'p') * 12)
+    return (hour * 60 + minute).where(valid).astype('Int64')
+
+
+def parse_range_series(series):
+    """parse_range for a whole pandas Series, returns (start, end) Int64 Series"""
+    text = series.fillna('').astype(str)
+    parts = text.str.extract(_RANGE_PATTERN)
+    start_text = parts[0].fillna('').str.strip()
+    end_text = parts[1].fillna('').str.strip()
+
+    end = parse_clock_series(end_text)
+    start = parse_clock_series(start_text)
+
+    # "9-11am" - borrow the end's meridiem for a bare start hour
+    borrow = start.isna() & end.notna()
+    if borrow.any():
+        suffix = (end >= 12 * 60).map({True: ' PM', False: ' AM'}).astype(object)
+        borrowed = parse_clock_series(start_text + suffix.fillna(' AM'))
+        morning = parse_clock_series(start_text + ' AM')
+        borrowed = borrowed.where(~(borrowed > end).fillna(False), morning)
+        start = start.where(~borrow, borrowed)
+
+    return start, end
+
+
+def add_window_columns(df):
+    """
+    Vectorized normalize_order_window for a DataFrame of orders
+
+    Adds integer WINDOW_START_FIELD / WINDOW_END_FIELD columns (in place)
+    and returns the DataFrame.
+    """
+    import pandas as pd
+
+    empty = pd.Series(pd.NA, index=df.index, dtype='Int64')
+    if 'time_window' in df.columns:
+        start, end = parse_range_series(df['time_window'])
+    else:
+        start, end = empty.copy(), empty.copy()
+
+    for column in START_TEXT_FIELDS:
+        if column in df.columns:
+            start = start.fillna(parse_clock_series(df[column]))
+    for column in END_TEXT_FIELDS:
+        if column in df.columns:
+            end = end.fillna(parse_clock_series(df[column]))
+
+    start = start.fillna(DAY_START_MIN)
+    end = end.where((end >= start).fillna(False), DAY_END_MIN)
+
+    df[WINDOW_START_FIELD] = start.astype(int)
+    df[WINDOW_END_FIELD] = end.astype(int)
+    return df
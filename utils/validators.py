@@ -4,6 +4,7 @@ Validators for orders, addresses, and time windows
 
 import re
 from typing import Dict, Tuple
+from utils.time_windows import parse_clock, parse_window_bounds
 
 def validate_phone(phone: str) -> bool:
     """Validate phone number format"""
@@ -36,12 +37,11 @@ def validate_address(address: str) -> bool:
     return bool(re.search(r'\d', address))
 
 def validate_time_format(time_str: str) -> bool:
-    """Validate time format (HH:MM AM/PM)"""
+    """Validate time format (HH:MM AM/PM, 2 PM or 14:30)"""
     if not time_str:
         return True  # Optional
     
-    pattern = r'^\d{1,2}:\d{2}\s?(AM|PM|am|pm)$'
-    return bool(re.match(pattern, time_str.strip()))
+    return parse_clock(time_str) is not None
 
 def validate_order(order: Dict) -> Tuple[bool, str]:
     """
@@ -73,4 +73,8 @@ def validate_order(order: Dict) -> Tuple[bool, str]:
     if order.get('time_window_end') and not validate_time_format(order['time_window_end']):
         return False, "Invalid end time format (use HH:MM AM/PM)"
     
+    start, end = parse_window_bounds(order)
+    if start is not None and end is not None and end < start:
+        return False, "Time window ends before it starts"
+    
     return True, "Valid"
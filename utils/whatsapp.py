@@ -4,6 +4,7 @@ WhatsApp Integration - Generate click-to-send URLs
 
 import urllib.parse
 from typing import Dict
+from utils.time_windows import window_text
 
 def format_route_message(driver_name: str, route_data: Dict, date: str) -> str:
     """Format route as a clean, simple WhatsApp message with basic emojis only"""
@@ -62,7 +63,7 @@ def format_route_message(driver_name: str, route_data: Dict, date: str) -> str:
         stop_lines.append(f"Items: {items_text}")
         
         # Time window if important
-        time_window = stop.get('time_window', '')
+        time_window = window_text(stop)
         if time_window and time_window not in ['Anytime', 'N/A', '']:
             stop_lines.append(f"Window: {time_window}")
         